@@ -0,0 +1,133 @@
+"""
+Benchmark: admission control under overload.
+
+Drives POST /api/analyze/anomalies in-process with a few clients sending
+small batches in a loop while heavy clients send very large ones, first
+without admission control and then with it. Reports the small requests'
+latency percentiles, how many rows each kind of client got scored and how
+many requests were shed with 429.
+
+    python benchmarks/bench_admission.py [--seconds 10] [--heavy-rows 100000] [--max-rows 50000]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MODEL_DIR", tempfile.mkdtemp(prefix="spotter-models-"))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="spotter-data-"))
+os.environ.setdefault("COMPLIANCE_MAX_RETRIES", "0")
+os.environ.setdefault("SPOTTER_MODEL_POLL_SECONDS", "3600")
+
+import httpx
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from common import make_transaction_dicts, make_transactions
+
+import spotter
+from spotter_admission import AdmissionController
+from spotter_features import extract_feature_matrix
+
+logging.disable(logging.ERROR)
+
+
+async def client_loop(client, name: str, body: bytes, rows: int, deadline: float, record: Dict[str, List]):
+    headers = {"content-type": "application/json", "x-client-id": name}
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.post("/api/analyze/anomalies", content=body, headers=headers)
+        elapsed = time.perf_counter() - start
+        if response.status_code == 200:
+            record["latency"].append(elapsed)
+            record["rows"].append(rows)
+        elif response.status_code == 429:
+            record["shed"].append(elapsed)
+            await asyncio.sleep(float(response.headers.get("retry-after", "1")))
+        else:
+            record["errors"].append(response.status_code)
+        # Cached small batches can complete without suspending; let the other clients run
+        await asyncio.sleep(0)
+
+
+async def run(args, controller) -> Dict[str, Dict[str, List]]:
+    spotter.admission = controller
+    small_body = json.dumps({"transactions": make_transaction_dicts(args.small_rows, seed=1)}).encode("utf-8")
+    heavy_body = json.dumps({"transactions": make_transaction_dicts(args.heavy_rows, seed=2)}).encode("utf-8")
+    records = {kind: {"latency": [], "rows": [], "shed": [], "errors": []} for kind in ("small", "heavy")}
+
+    transport = httpx.ASGITransport(app=spotter.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://spotter", timeout=None) as client:
+        deadline = time.perf_counter() + args.seconds
+        loops = [
+            client_loop(client, f"small-{i}", small_body, args.small_rows, deadline, records["small"])
+            for i in range(args.small_clients)
+        ] + [
+            client_loop(client, "heavy", heavy_body, args.heavy_rows, deadline, records["heavy"])
+            for _ in range(args.heavy_clients)
+        ]
+        await asyncio.gather(*loops)
+    return records
+
+
+async def main_async(args):
+    model = IsolationForest(random_state=0).fit(
+        extract_feature_matrix(make_transactions(20000, seed=3), spotter.entity_encoder)
+    )
+    version = spotter.model_registry.publish_model("anomaly_model", model, {"source": "benchmark"})
+    spotter.model_registry.activate("anomaly_model", version)
+
+    async with spotter.app.router.lifespan_context(spotter.app):
+        transport = httpx.ASGITransport(app=spotter.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://spotter") as client:
+            while (await client.get("/ready")).status_code != 200:
+                await asyncio.sleep(0.05)
+
+        print(
+            f"{'admission':>10} {'small p50 (ms)':>15} {'small p99 (ms)':>15} {'small rows/s':>13} "
+            f"{'heavy rows/s':>13} {'shed small':>11} {'shed heavy':>11}"
+        )
+        for label, controller in (
+            ("off", None),
+            ("on", AdmissionController(
+                args.max_rows,
+                client_concurrency=args.client_concurrency,
+                chunk_rows=args.chunk_rows,
+                slo=args.slo_ms / 1000,
+            )),
+        ):
+            records = await run(args, controller)
+            small, heavy = records["small"], records["heavy"]
+            p50, p99 = np.percentile(small["latency"], [50, 99]) * 1000 if small["latency"] else (np.nan, np.nan)
+            print(
+                f"{label:>10} {p50:>15.1f} {p99:>15.1f} {sum(small['rows']) / args.seconds:>13.0f} "
+                f"{sum(heavy['rows']) / args.seconds:>13.0f} {len(small['shed']):>11} {len(heavy['shed']):>11}"
+            )
+            if small["errors"] or heavy["errors"]:
+                print(f"{'':>10} unexpected status codes: {sorted(set(small['errors'] + heavy['errors']))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--small-clients", type=int, default=8)
+    parser.add_argument("--small-rows", type=int, default=50)
+    parser.add_argument("--heavy-clients", type=int, default=4)
+    parser.add_argument("--heavy-rows", type=int, default=100000)
+    parser.add_argument("--max-rows", type=int, default=50000)
+    parser.add_argument("--chunk-rows", type=int, default=10000)
+    parser.add_argument("--client-concurrency", type=int, default=1)
+    parser.add_argument("--slo-ms", type=float, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark: bulk scoring jobs.
+
+Writes a synthetic dataset, then scores it once per worker count through
+the bulk job runner and once by reading the whole file and scoring it in
+one process, checking that the part files hold the same scores. Reports
+rows per second for each path, including process start-up, and the peak
+memory of the job process. Bulk jobs run first: a child process inherits
+its parent's peak RSS on Linux.
+
+    python benchmarks/bench_bulk.py [--rows 500000] [--workers 1 2 4] [--chunk-rows 50000]
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+from common import make_transaction_dicts
+from spotter_bulk import output_format, run_bulk_job
+from spotter_datasets import frame_features
+from spotter_encoding import EntityEncoder
+
+
+def read_scores(output_dir: str, fmt: str) -> np.ndarray:
+    parts = sorted(name for name in os.listdir(output_dir) if name.startswith("part-"))
+    if fmt == "parquet":
+        return np.concatenate([
+            pd.read_parquet(os.path.join(output_dir, name))["anomaly_score"].to_numpy() for name in parts
+        ])
+    return np.concatenate([np.load(os.path.join(output_dir, name))["anomaly_score"] for name in parts])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--chunk-rows", type=int, default=50000)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_bulk_")
+    try:
+        dataset = os.path.join(root, "transactions.csv")
+        for start in range(0, args.rows, 100000):
+            chunk = pd.DataFrame(make_transaction_dicts(min(100000, args.rows - start), seed=start))
+            chunk["id"] = [f"tx-{start + i}" for i in range(len(chunk))]
+            chunk.to_csv(dataset, mode="a", header=start == 0, index=False)
+        model_path = os.path.join(root, "anomaly_model.joblib")
+        _, features = frame_features(pd.read_csv(dataset, nrows=50000), EntityEncoder())
+        joblib.dump(IsolationForest(random_state=0).fit(features), model_path)
+
+        print(f"{'path':>16} {'rows/s':>10} {'peak MB':>8}")
+        fmt = output_format()
+        results = {}
+        for workers in args.workers:
+            output_dir = os.path.join(root, f"scores-{workers}")
+            os.makedirs(output_dir)
+            spec = {
+                "path": dataset,
+                "parameters": {"chunk_rows": args.chunk_rows},
+                "model_path": model_path,
+                "output_dir": output_dir,
+                "output_format": fmt,
+                "workers": workers,
+                "velocity_windows": [],
+            }
+            context = multiprocessing.get_context("spawn")
+            progress = context.Queue()
+            process = context.Process(target=run_bulk_job, args=(spec, progress))
+            start = time.perf_counter()
+            process.start()
+            while True:
+                result = progress.get()
+                if result["event"] in ("completed", "failed"):
+                    break
+            elapsed = time.perf_counter() - start
+            process.join()
+            assert result["event"] == "completed", result.get("error")
+            results[workers] = read_scores(output_dir, fmt)
+            print(f"{f'{workers} workers':>16} {args.rows / elapsed:>10.0f} {result['peak_memory_mb']:>8.0f}")
+
+        start = time.perf_counter()
+        _, features = frame_features(pd.read_csv(dataset), EntityEncoder())
+        expected = joblib.load(model_path).decision_function(features)
+        single = time.perf_counter() - start
+        print(f"{'single process':>16} {args.rows / single:>10.0f} {'-':>8}")
+        for scores in results.values():
+            assert np.allclose(scores, expected), "bulk scores differ"
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
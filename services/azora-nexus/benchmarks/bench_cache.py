@@ -0,0 +1,71 @@
+"""
+Benchmark: result cache hits vs feature extraction plus scoring.
+
+Times the uncached path (extract_feature_matrix + decision_function) against
+the cached one (cache keys + lookup) for each batch size, with every row
+already in the cache, and reports the cost of storing a batch of misses.
+
+    python benchmarks/bench_cache.py [--sizes 100 1000 10000] [--path /dev/shm/spotter-results.bin]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MODEL_DIR", tempfile.mkdtemp(prefix="spotter-models-"))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="spotter-data-"))
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from common import best_of, make_transactions
+from spotter import entity_encoder
+from spotter_cache import ResultCache, transaction_keys
+from spotter_features import extract_feature_matrix
+
+
+def keys_of(transactions, version: str) -> np.ndarray:
+    return transaction_keys(
+        version,
+        (tx.id for tx in transactions),
+        (tx.amount for tx in transactions),
+        (tx.timestamp for tx in transactions),
+        (tx.sender for tx in transactions),
+        (tx.recipient for tx in transactions),
+        (tx.features for tx in transactions),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--capacity", type=int, default=1_000_000)
+    parser.add_argument("--path", help="use a file-backed cache at this path")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    training = extract_feature_matrix(make_transactions(20000, seed=1), entity_encoder)
+    model = IsolationForest(n_estimators=100, contamination=0.01, random_state=42).fit(training)
+    cache = ResultCache(args.capacity, path=args.path)
+
+    print(f"{'batch':>8} {'uncached (ms)':>14} {'hits (ms)':>10} {'store (ms)':>11} {'speedup':>8}")
+    for size in args.sizes:
+        transactions = make_transactions(size, seed=size)
+        keys = keys_of(transactions, "v1")
+        scores = model.decision_function(extract_feature_matrix(transactions, entity_encoder))
+        store = best_of(lambda: cache.store(keys, scores), args.repeat)
+
+        cached, hit = cache.lookup(keys_of(transactions, "v1"))
+        assert hit.all() and np.array_equal(cached, scores), "cache lost entries"
+
+        uncached = best_of(
+            lambda: model.decision_function(extract_feature_matrix(transactions, entity_encoder)), args.repeat
+        )
+        hits = best_of(lambda: cache.lookup(keys_of(transactions, "v1")), args.repeat)
+        print(f"{size:>8} {uncached * 1000:>14.3f} {hits * 1000:>10.3f} {store * 1000:>11.3f} {uncached / hits:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark: cost of the drift sketches and how quickly they see a shift.
+
+Builds a baseline from a training sample, then times DriftMonitor.observe
+per batch size against scoring the batch with the compiled forest. Then
+feeds fresh sketches 50000 rows of normal traffic, and others the same
+traffic with amounts --shift times larger, and reports the PSI of amounts
+and scores for each, along with the bytes held by the sketches. Sender and
+recipient codes are hash buckets, so their PSI also moves when the set of
+busy accounts changes between generator seeds.
+
+    python benchmarks/bench_drift.py [--sizes 1 100 10000 100000] [--shift 3]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MODEL_DIR", tempfile.mkdtemp(prefix="spotter-models-"))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="spotter-data-"))
+
+from sklearn.ensemble import IsolationForest
+
+from common import best_of, make_transactions
+from spotter import entity_encoder
+from spotter_drift import DriftMonitor, build_baseline
+from spotter_features import FEATURE_NAMES, extract_feature_matrix
+from spotter_iforest import compile_isolation_forest
+
+
+def sketch_bytes(monitor: DriftMonitor) -> int:
+    sketches = monitor._features + [monitor._score]
+    return sum(sketch.counts.nbytes + sketch.edges.nbytes + 16 for sketch in sketches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10000, 100000])
+    parser.add_argument("--shift", type=float, default=3.0)
+    parser.add_argument("--sample-rows", type=int, default=4096)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    training = extract_feature_matrix(make_transactions(20000, seed=1), entity_encoder)
+    model = IsolationForest(contamination=0.01, random_state=42).fit(training)
+    compiled = compile_isolation_forest(model)
+    baseline = build_baseline(training, model.decision_function(training), FEATURE_NAMES)
+    monitor = DriftMonitor(halflife=3600, sample_rows=args.sample_rows)
+    monitor.reset("benchmark", baseline)
+
+    print(f"{'batch':>8} {'score (ms)':>11} {'observe (ms)':>13} {'overhead':>9}")
+    for size in args.sizes:
+        features = extract_feature_matrix(make_transactions(size, seed=7), entity_encoder)
+        scores = compiled.decision_function(features)
+        score_time = best_of(lambda: compiled.decision_function(features), args.repeat)
+        observe_time = best_of(lambda: monitor.observe(features, scores, "benchmark"), args.repeat)
+        print(f"{size:>8} {score_time * 1000:>11.3f} {observe_time * 1000:>13.3f} {observe_time / score_time:>8.1%}")
+
+    print(f"\n{'traffic':>8} {'rows':>8} {'amount PSI':>11} {'score PSI':>10}  drifted")
+    for label, scale in (("normal", 1.0), ("shifted", args.shift)):
+        monitor.reset("benchmark", baseline)
+        for seed in range(10):
+            features = extract_feature_matrix(make_transactions(5000, seed=100 + seed), entity_encoder)
+            features[:, FEATURE_NAMES.index("amount")] *= scale
+            monitor.observe(features, compiled.decision_function(features), "benchmark")
+        stats = monitor.stats()
+        amount = next(feature for feature in stats["features"] if feature["name"] == "amount")
+        print(f"{label:>8} {stats['rows_observed']:>8} {amount['psi']:>11.3f} {stats['score']['psi']:>10.3f}  "
+              f"{', '.join(stats['drifted']) or '-'}")
+    print(f"\nsketch memory: {sketch_bytes(monitor)} bytes for {len(FEATURE_NAMES)} features and the score")
+
+
+if __name__ == "__main__":
+    main()
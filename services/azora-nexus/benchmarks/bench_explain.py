@@ -0,0 +1,61 @@
+"""
+Benchmark: cost of ?explain= feature contributions on top of scoring.
+
+Scores each batch, selects its flagged rows like the endpoint does (capped
+at --max-rows) and times feature_contributions for them, reporting the
+per-row cost and the overhead relative to scoring the whole batch.
+
+    python benchmarks/bench_explain.py [--sizes 100 1000 10000] [--max-rows 256]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MODEL_DIR", tempfile.mkdtemp(prefix="spotter-models-"))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="spotter-data-"))
+
+from sklearn.ensemble import IsolationForest
+
+from common import best_of, make_transactions
+from spotter import entity_encoder
+from spotter_explain import EXPLAIN_ANOMALIES, select_rows
+from spotter_features import extract_feature_matrix, risk_levels
+from spotter_iforest import compile_isolation_forest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--max-rows", type=int, default=256)
+    parser.add_argument("--anomaly-rate", type=float, default=0.01)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    training = extract_feature_matrix(make_transactions(20000, seed=1), entity_encoder)
+    model = IsolationForest(n_estimators=args.trees, contamination=0.01, random_state=42).fit(training)
+    compiled = compile_isolation_forest(model)
+
+    print(f"{'batch':>8} {'explained':>10} {'score (ms)':>11} {'explain (ms)':>13} {'us/row':>8} {'overhead':>9}")
+    for size in args.sizes:
+        features = extract_feature_matrix(
+            make_transactions(size, seed=7, anomaly_rate=args.anomaly_rate), entity_encoder
+        )
+        scores = model.decision_function(features)
+        rows = select_rows(scores, risk_levels(scores), EXPLAIN_ANOMALIES, args.max_rows)
+        selected = features[rows]
+
+        score_time = best_of(lambda: model.decision_function(features), args.repeat)
+        explain_time = best_of(lambda: compiled.feature_contributions(selected), args.repeat) if len(rows) else 0.0
+        per_row = explain_time / len(rows) * 1e6 if len(rows) else 0.0
+        print(
+            f"{size:>8} {len(rows):>10} {score_time * 1000:>11.3f} {explain_time * 1000:>13.3f} "
+            f"{per_row:>8.1f} {explain_time / score_time:>8.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
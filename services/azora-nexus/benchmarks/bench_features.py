@@ -0,0 +1,55 @@
+"""
+Benchmark: per-row extract_features vs the batch feature engine.
+
+Checks that both paths produce the same feature matrix and risk levels, then
+reports the speedup for each batch size.
+
+    python benchmarks/bench_features.py [--sizes 1000 10000 100000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MODEL_DIR", tempfile.mkdtemp(prefix="spotter-models-"))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="spotter-data-"))
+
+import numpy as np
+
+from common import best_of, make_transactions
+from spotter import calculate_risk_level, entity_encoder, extract_features
+from spotter_features import extract_feature_matrix, risk_levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'batch':>8} {'per-row (s)':>12} {'batch (s)':>10} {'speedup':>8}")
+    for size in args.sizes:
+        transactions = make_transactions(size)
+
+        def per_row():
+            matrix = np.array([extract_features(tx) for tx in transactions])
+            return matrix, [calculate_risk_level(v) for v in -matrix[:, 2]]
+
+        def batched():
+            matrix = extract_feature_matrix(transactions, entity_encoder)
+            return matrix, risk_levels(-matrix[:, 2])
+
+        expected, expected_levels = per_row()
+        actual, actual_levels = batched()
+        assert np.array_equal(expected, actual), "feature matrices differ"
+        assert expected_levels == actual_levels.tolist(), "risk levels differ"
+
+        slow = best_of(per_row, args.repeat)
+        fast = best_of(batched, args.repeat)
+        print(f"{size:>8} {slow:>12.4f} {fast:>10.4f} {slow / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
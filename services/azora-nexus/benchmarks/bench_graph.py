@@ -0,0 +1,112 @@
+"""
+Benchmark: transaction graph ingest, merges and pattern queries at scale.
+
+Feeds --edges synthetic transfers between --accounts accounts through
+TransactionGraph.add in batches of --batch-rows, merging whenever a merge is
+due as the server's background task would, with a few planted rings. Reports
+ingest rows per second, merge times, bytes per edge of the edge arrays and
+the process's peak memory, then times a query over the last hour and over
+the whole retention period, checking the planted rings are found.
+
+    python benchmarks/bench_graph.py [--edges 10000000] [--accounts 1000000] [--batch-rows 100000]
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from spotter_features import TransactionColumns
+from spotter_graph import TransactionGraph
+
+START = np.datetime64("2024-01-01T00:00:00", "s")
+
+
+def make_columns(rng, names: np.ndarray, rows: int, first: int, seconds: int) -> TransactionColumns:
+    """Random transfers with timestamps spread over seconds from START + first"""
+    offsets = np.sort(rng.integers(0, seconds, rows)) + first
+    return TransactionColumns(
+        ids=[""] * rows,
+        amount=rng.lognormal(3, 1, rows),
+        timestamp=np.datetime_as_string(START + offsets.astype("timedelta64[s]")),
+        sender=names[rng.integers(0, len(names), rows)],
+        recipient=names[rng.integers(0, len(names), rows)],
+        currency=np.full(rows, "USD", dtype=object),
+        country=np.full(rows, "US", dtype=object),
+        category=[None] * rows,
+        overrides=[None] * rows,
+    )
+
+
+def ring_columns(ring: int, size: int, at: int) -> TransactionColumns:
+    accounts = np.array([f"ring{ring}-{k}" for k in range(size)], dtype=object)
+    return TransactionColumns(
+        ids=[""] * size,
+        amount=np.full(size, 5000.0),
+        timestamp=np.datetime_as_string(START + np.full(size, at).astype("timedelta64[s]")),
+        sender=accounts,
+        recipient=np.roll(accounts, -1),
+        currency=np.full(size, "USD", dtype=object),
+        country=np.full(size, "US", dtype=object),
+        category=[None] * size,
+        overrides=[None] * size,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--edges", type=int, default=10000000)
+    parser.add_argument("--accounts", type=int, default=1000000)
+    parser.add_argument("--batch-rows", type=int, default=100000)
+    parser.add_argument("--retention-hours", type=float, default=24)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    names = np.array([f"acct-{i}" for i in range(args.accounts)], dtype=object)
+    graph = TransactionGraph(retention=args.retention_hours * 3600, max_edges=args.edges)
+    batches = -(-args.edges // args.batch_rows)
+    # Event time advances evenly so the whole run spans the retention period
+    seconds_per_batch = max(1, int(args.retention_hours * 3600 / batches))
+
+    ingest = 0.0
+    merges = []
+    for index in range(batches):
+        rows = min(args.batch_rows, args.edges - index * args.batch_rows)
+        columns = make_columns(rng, names, rows, index * seconds_per_batch, seconds_per_batch)
+        start = time.perf_counter()
+        graph.add(columns)
+        if index % max(1, batches // 3) == 0:
+            graph.add(ring_columns(index, 3 + index % 3, index * seconds_per_batch + seconds_per_batch // 2))
+        ingest += time.perf_counter() - start
+        if graph.merge_due:
+            start = time.perf_counter()
+            graph.merge()
+            merges.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    graph.merge()
+    merges.append(time.perf_counter() - start)
+
+    stats = graph.stats()
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"edges {stats['edges']}, accounts {stats['nodes']}")
+    print(f"ingest {args.edges / ingest:.0f} rows/s, {len(merges)} merges: mean {np.mean(merges) * 1000:.0f} ms, "
+          f"max {np.max(merges) * 1000:.0f} ms")
+    print(f"edge arrays {stats['edge_bytes'] / stats['edges']:.1f} bytes/edge ({stats['edge_bytes'] / 2**20:.0f} MB), "
+          f"peak RSS {peak_mb:.0f} MB")
+
+    print(f"{'window':>8} {'transactions':>13} {'query (s)':>10} {'cycles':>7} {'rings found':>12}")
+    for label, window in (("1h", 3600.0), ("all", None)):
+        start = time.perf_counter()
+        result = graph.query(window=window, min_counterparties=20, max_cycle_length=5)
+        elapsed = time.perf_counter() - start
+        rings = {cycle["accounts"][0].split("-")[0] for cycle in result["cycles"] if cycle["accounts"][0].startswith("ring")}
+        print(f"{label:>8} {result['transactions']:>13} {elapsed:>10.2f} {len(result['cycles']):>7} {len(rings):>12}")
+
+
+if __name__ == "__main__":
+    main()
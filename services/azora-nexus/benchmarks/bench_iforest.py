@@ -0,0 +1,52 @@
+"""
+Benchmark: sklearn IsolationForest.decision_function vs the compiled scorer.
+
+Checks that both produce the same scores, then reports per-call latency for
+each batch size; the compiled scorer serves batches up to
+SPOTTER_COMPILED_MAX_ROWS.
+
+    python benchmarks/bench_iforest.py [--sizes 1 10 50 1000 10000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MODEL_DIR", tempfile.mkdtemp(prefix="spotter-models-"))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="spotter-data-"))
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from common import best_of, make_transactions
+from spotter import entity_encoder
+from spotter_features import extract_feature_matrix
+from spotter_iforest import compile_isolation_forest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 50, 1000, 10000])
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    features = extract_feature_matrix(make_transactions(max(args.sizes + [20000])), entity_encoder)
+    model = IsolationForest(n_estimators=args.trees, contamination=0.01, random_state=42).fit(features)
+    compiled = compile_isolation_forest(model)
+
+    print(f"{'batch':>8} {'sklearn (ms)':>13} {'compiled (ms)':>14} {'speedup':>8}")
+    for size in args.sizes:
+        batch = features[:size]
+        expected = model.decision_function(batch)
+        assert np.allclose(compiled.decision_function(batch), expected, rtol=0, atol=1e-12), "scores differ"
+
+        slow = best_of(lambda: model.decision_function(batch), args.repeat)
+        fast = best_of(lambda: compiled.decision_function(batch), args.repeat)
+        print(f"{size:>8} {slow * 1000:>13.3f} {fast * 1000:>14.3f} {slow / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: JSON TransactionBatch vs Arrow IPC / msgpack columnar ingest.
+
+Times request body decoding plus feature extraction for each format, after
+checking that all of them produce the same feature matrix. Formats whose
+library is not installed are skipped.
+
+    python benchmarks/bench_ingest.py [--sizes 1000 10000 100000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MODEL_DIR", tempfile.mkdtemp(prefix="spotter-models-"))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="spotter-data-"))
+
+import numpy as np
+
+from common import best_of, make_transactions
+from spotter import TransactionBatch, entity_encoder
+from spotter_columnar import decode_batch
+from spotter_datasets import TRANSACTION_FIELDS
+from spotter_features import extract_feature_matrix
+
+
+def encode_bodies(transactions):
+    """Request bodies of the same batch in every available format"""
+    rows = [tx.model_dump() for tx in transactions]
+    bodies = {"json": json.dumps({"transactions": rows}).encode("utf-8")}
+    columns = {field: [row[field] for row in rows] for field in TRANSACTION_FIELDS}
+    try:
+        import msgpack
+        packed = dict(columns, amount=np.asarray(columns["amount"], dtype="<f8").tobytes())
+        bodies["msgpack"] = msgpack.packb(packed)
+    except ImportError:
+        pass
+    try:
+        import pyarrow as pa
+        table = pa.table(columns)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        bodies["arrow"] = sink.getvalue().to_pybytes()
+    except ImportError:
+        pass
+    return bodies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'batch':>8} {'format':>8} {'body (KiB)':>11} {'decode+features (s)':>20} {'vs json':>8}")
+    for size in args.sizes:
+        bodies = encode_bodies(make_transactions(size))
+
+        def ingest(fmt, body):
+            if fmt == "json":
+                return extract_feature_matrix(TransactionBatch.model_validate_json(body).transactions, entity_encoder)
+            return decode_batch(fmt, body).feature_matrix(entity_encoder)
+
+        expected = ingest("json", bodies["json"])
+        baseline = None
+        for fmt, body in bodies.items():
+            assert np.array_equal(ingest(fmt, body), expected), f"{fmt} features differ"
+            elapsed = best_of(lambda: ingest(fmt, body), args.repeat)
+            baseline = baseline or elapsed
+            print(f"{size:>8} {fmt:>8} {len(body) / 1024:>11.0f} {elapsed:>20.4f} {baseline / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: large-batch pattern mode vs sklearn DBSCAN.
+
+Clusters the same batch with DBSCAN and with the grid-indexed clusterer,
+checks that the labels agree, then reports clustering and group-building
+time for each path and the peak memory traced during clustering.
+
+    python benchmarks/bench_patterns.py [--sizes 50000 200000 500000] [--max-pairs 1000000]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sklearn.cluster import DBSCAN
+
+from common import make_transactions
+from spotter_encoding import EntityEncoder
+from spotter_features import extract_feature_matrix
+from spotter_patterns import DEFAULT_MAX_PAIRS, batch_groups, grid_dbscan
+
+
+def loop_groups(ids, features: np.ndarray, labels: np.ndarray):
+    """Group building of the standard find_patterns path"""
+    clusters = {}
+    for i, label in enumerate(labels):
+        if label != -1:
+            clusters.setdefault(label, []).append(i)
+    groups = []
+    for indices in clusters.values():
+        if len(indices) < 2:
+            continue
+        centroid = features[indices].mean(axis=0)
+        density = float(np.mean(np.linalg.norm(features[indices] - centroid, axis=1)))
+        groups.append({"transactions": [ids[i] for i in indices], "density": density})
+    return groups
+
+
+def traced(fn):
+    """Result, seconds and peak traced MB of one call"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50000, 200000, 500000])
+    parser.add_argument("--eps", type=float, default=0.5)
+    parser.add_argument("--min-samples", type=int, default=5)
+    parser.add_argument("--max-pairs", type=int, default=DEFAULT_MAX_PAIRS)
+    args = parser.parse_args()
+
+    print(
+        f"{'batch':>8} {'groups':>7} {'dbscan (s)':>11} {'grid (s)':>9} "
+        f"{'dbscan MB':>10} {'grid MB':>8} {'loop build (s)':>15} {'segmented (s)':>14}"
+    )
+    for size in args.sizes:
+        transactions = make_transactions(size, seed=size)
+        ids = [tx.id for tx in transactions]
+        features = extract_feature_matrix(transactions, EntityEncoder())
+
+        expected, dbscan_time, dbscan_peak = traced(
+            lambda: DBSCAN(eps=args.eps, min_samples=args.min_samples).fit_predict(features)
+        )
+        labels, grid_time, grid_peak = traced(
+            lambda: grid_dbscan(features, args.eps, args.min_samples, args.max_pairs)
+        )
+        assert np.array_equal(expected, labels), "grid labels differ from DBSCAN"
+
+        start = time.perf_counter()
+        loop_groups(ids, features, labels)
+        loop_time = time.perf_counter() - start
+        start = time.perf_counter()
+        groups = batch_groups(ids, features, labels)
+        segmented_time = time.perf_counter() - start
+
+        print(
+            f"{size:>8} {len(groups):>7} {dbscan_time:>11.3f} {grid_time:>9.3f} "
+            f"{dbscan_peak:>10.0f} {grid_peak:>8.0f} {loop_time:>15.3f} {segmented_time:>14.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
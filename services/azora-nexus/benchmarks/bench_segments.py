@@ -0,0 +1,124 @@
+"""
+Benchmark: segment model routing under a fixed model budget.
+
+Publishes --segments anomaly models, one per category value, to a temporary
+MODEL_DIR, then scores batches whose categories follow a Zipf distribution,
+like a few large markets and a long tail. For each LRU budget it reports
+rows per second against scoring every row with the global model, LRU hits,
+loads and evictions, and the bytes held by resident models against holding
+every segment model. The first pass also writes each model's compiled node
+tables, so the first budget's loads include compiling them. Scores of a few
+segments are checked against decision_function of the published model.
+
+    python benchmarks/bench_segments.py [--segments 200] [--budgets 16 64 256] [--zipf 1.5]
+"""
+
+import argparse
+import gc
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MODEL_DIR", tempfile.mkdtemp(prefix="spotter-models-"))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="spotter-data-"))
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from common import make_transactions
+from spotter import entity_encoder
+from spotter_executor import segment_score_with
+from spotter_features import extract_feature_matrix
+from spotter_iforest import compile_isolation_forest
+from spotter_registry import ModelRegistry
+from spotter_segments import SegmentModels, SegmentRouter, segment_model_name, segment_name
+
+logging.disable(logging.WARNING)
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--segments", type=int, default=200)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--memory-mb", type=float, default=256)
+    parser.add_argument("--zipf", type=float, default=1.5)
+    parser.add_argument("--batch-rows", type=int, default=256)
+    parser.add_argument("--batches", type=int, default=100)
+    parser.add_argument("--estimators", type=int, default=100)
+    args = parser.parse_args()
+
+    registry = ModelRegistry(os.environ["MODEL_DIR"])
+    training = extract_feature_matrix(make_transactions(20000, seed=1), entity_encoder)
+    global_model = compile_isolation_forest(
+        IsolationForest(n_estimators=args.estimators, random_state=42).fit(training)
+    )
+
+    rng = np.random.default_rng(0)
+    names = [f"s{index:04d}" for index in range(args.segments)]
+    start = time.perf_counter()
+    for index, name in enumerate(names):
+        sample = training[rng.choice(len(training), 2000, replace=False)]
+        model = IsolationForest(n_estimators=args.estimators, max_samples=256, random_state=index).fit(sample)
+        model_name = segment_model_name(segment_name({"category": name}))
+        registry.activate(model_name, registry.publish_model(model_name, model))
+    print(f"published {args.segments} segment models in {time.perf_counter() - start:.1f}s")
+
+    router = SegmentRouter(registry, ["category"])
+    router.refresh()
+
+    # Zipf-distributed segments: rank r gets weight 1 / r^zipf
+    weights = 1.0 / np.arange(1, args.segments + 1) ** args.zipf
+    features = extract_feature_matrix(make_transactions(args.batch_rows, seed=7), entity_encoder)
+    categories = [np.array(names)[rng.choice(args.segments, args.batch_rows, p=weights / weights.sum())]
+                  for _ in range(args.batches)]
+    touched = np.mean([len(np.unique(batch)) for batch in categories])
+    print(f"{args.batches} batches of {args.batch_rows} rows, {touched:.0f} segments per batch on average\n")
+
+    start = time.perf_counter()
+    for _ in categories:
+        global_model.decision_function(features)
+    global_rate = args.batches * args.batch_rows / (time.perf_counter() - start)
+    print(f"global model: {global_rate:,.0f} rows/s")
+
+    print(f"\n{'budget':>7} {'rows/s':>10} {'vs global':>10} {'route (ms)':>11} {'hits':>8} {'loads':>7} "
+          f"{'evictions':>10} {'load (ms)':>10} {'resident MB':>12} {'all MB':>8} {'RSS +MB':>8}")
+    for budget in args.budgets:
+        gc.collect()
+        rss_before = rss_mb()
+        models = SegmentModels(registry.root, max_models=budget, max_bytes=int(args.memory_mb * 2**20))
+        scores = np.empty(args.batch_rows)
+        route_time = 0.0
+        start = time.perf_counter()
+        for batch in categories:
+            route_start = time.perf_counter()
+            groups, _ = router.route({"category": batch})
+            route_time += time.perf_counter() - route_start
+            # As when serving, resident segments are scored while the others load
+            groups.sort(key=lambda group: not models.resident(group[0], group[1]))
+            for segment, version, rows in groups:
+                scores[rows] = segment_score_with(models, features[rows], segment, version)
+        elapsed = time.perf_counter() - start
+        stats = models.stats()
+        per_model = stats["resident_bytes"] / stats["resident_models"]
+        print(f"{budget:>7} {args.batches * args.batch_rows / elapsed:>10,.0f} "
+              f"{args.batches * args.batch_rows / elapsed / global_rate:>9.2f}x {route_time / args.batches * 1000:>11.3f} "
+              f"{stats['hits']:>8} {stats['loads']:>7} {stats['evictions']:>10} {stats['mean_load_ms']:>10.2f} {stats['resident_bytes'] / 2**20:>12.1f} "
+              f"{per_model * args.segments / 2**20:>8.1f} {rss_mb() - rss_before:>8.1f}")
+
+    # Scores of the last batch match the published sklearn models
+    for segment, version, rows in groups[:3]:
+        expected = registry.load(segment_model_name(segment), version).decision_function(features[rows])
+        assert np.allclose(scores[rows], expected), segment
+    print("\nsegment scores match decision_function of the published models")
+
+
+if __name__ == "__main__":
+    main()
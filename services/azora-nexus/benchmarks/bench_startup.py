@@ -0,0 +1,128 @@
+"""
+Benchmark: cold start of the spotter service.
+
+Publishes a trained anomaly model to a scratch MODEL_DIR, starts uvicorn in
+a fresh process and reports, from process start: when /health first
+answers, when /ready first answers 200, and the latency of the first
+anomaly request sent right after it compared with warm requests.
+
+    python benchmarks/bench_startup.py [--executor thread process] [--rows 100] [--runs 3]
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+import httpx
+import numpy as np
+from sklearn.cluster import DBSCAN
+from sklearn.ensemble import IsolationForest
+
+from common import make_transaction_dicts, make_transactions
+from spotter_encoding import EntityEncoder
+from spotter_features import extract_feature_matrix
+from spotter_registry import ModelRegistry
+
+logging.disable(logging.INFO)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(client: httpx.Client, path: str, deadline: float) -> float:
+    """Seconds until path answers 200"""
+    while time.perf_counter() < deadline:
+        try:
+            if client.get(path).status_code == 200:
+                return time.perf_counter()
+        except httpx.TransportError:
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f"{path} did not answer in time")
+
+
+def cold_start(executor: str, model_dir: str, body: bytes, warm_requests: int):
+    root = tempfile.mkdtemp(prefix="bench_startup_")
+    port = free_port()
+    env = dict(
+        os.environ,
+        MODEL_DIR=model_dir,
+        DATA_DIR=root,
+        SPOTTER_EXECUTOR=executor,
+        SPOTTER_WORKERS="2",
+        SPOTTER_INLINE_ROWS="0",
+        COMPLIANCE_MAX_RETRIES="0",
+    )
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "spotter:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVICE_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            deadline = start + 120
+            live = wait_for(client, "/health", deadline)
+            ready = wait_for(client, "/ready", deadline)
+            headers = {"content-type": "application/json"}
+
+            def post() -> float:
+                began = time.perf_counter()
+                response = client.post("/api/analyze/anomalies", content=body, headers=headers)
+                response.raise_for_status()
+                return time.perf_counter() - began
+
+            first = post()
+            warm = float(np.median([post() for _ in range(warm_requests)]))
+            return live - start, ready - start, first, warm
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--executor", nargs="+", default=["thread", "process"])
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--warm-requests", type=int, default=20)
+    args = parser.parse_args()
+
+    model_dir = tempfile.mkdtemp(prefix="bench_startup_models_")
+    try:
+        registry = ModelRegistry(model_dir)
+        training = extract_feature_matrix(make_transactions(20000, seed=1), EntityEncoder())
+        for name, model in (
+            ("anomaly_model", IsolationForest(random_state=0).fit(training)),
+            ("clustering_model", DBSCAN(eps=0.5, min_samples=5)),
+        ):
+            registry.activate(name, registry.publish_model(name, model))
+        body = json.dumps({"transactions": make_transaction_dicts(args.rows, seed=2)}).encode("utf-8")
+
+        print(f"{'executor':>8} {'live (s)':>9} {'ready (s)':>10} {'first (ms)':>11} {'warm (ms)':>10}")
+        for executor in args.executor:
+            runs = [cold_start(executor, model_dir, body, args.warm_requests) for _ in range(args.runs)]
+            live, ready, first, warm = np.median(np.array(runs), axis=0)
+            print(f"{executor:>8} {live:>9.2f} {ready:>10.2f} {first * 1000:>11.1f} {warm * 1000:>10.1f}")
+    finally:
+        shutil.rmtree(model_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
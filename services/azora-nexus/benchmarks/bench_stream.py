@@ -0,0 +1,128 @@
+"""
+Benchmark: WebSocket ingest stream vs one POST per small batch.
+
+Sends the same transactions to the in-process app in messages of
+--message-rows rows, once as a POST /api/analyze/anomalies per message and
+once over a single /api/analyze/stream connection that follows the credit
+protocol. Reports rows per second and the latency from sending a
+transaction to receiving its result, and checks that both paths return the
+same scores. The stream client keeps its whole credit window in flight, so
+its latency includes queueing behind up to SPOTTER_STREAM_MAX_PENDING_ROWS
+rows.
+
+    python benchmarks/bench_stream.py [--rows 50000] [--message-rows 10] [--result-credit 2048]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MODEL_DIR", tempfile.mkdtemp(prefix="spotter-models-"))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="spotter-data-"))
+os.environ.setdefault("COMPLIANCE_MAX_RETRIES", "0")
+os.environ.setdefault("SPOTTER_MODEL_POLL_SECONDS", "3600")
+
+import numpy as np
+from fastapi.testclient import TestClient
+from sklearn.ensemble import IsolationForest
+
+from common import make_transaction_dicts, make_transactions
+
+import spotter
+from spotter_features import extract_feature_matrix
+
+logging.disable(logging.ERROR)
+
+
+def post_messages(client: TestClient, messages):
+    latencies, scores = [], {}
+    for message in messages:
+        start = time.perf_counter()
+        response = client.post("/api/analyze/anomalies", json={"transactions": message})
+        response.raise_for_status()
+        elapsed = time.perf_counter() - start
+        for result in response.json()["results"]:
+            scores[result["transaction_id"]] = result["anomaly_score"]
+            latencies.append(elapsed)
+    return latencies, scores
+
+
+def stream_messages(client: TestClient, messages, result_credit: int):
+    """Send messages as fast as the server's credit allows, granting result credit as results arrive"""
+    rows = sum(len(message) for message in messages)
+    sent_at, latencies, scores = {}, [], {}
+    with client.websocket_connect("/api/analyze/stream") as websocket:
+        credit = websocket.receive_json()["credit"]
+        websocket.send_text(json.dumps({"credit": result_credit}))
+        next_message = 0
+        while len(scores) < rows:
+            if next_message < len(messages) and len(messages[next_message]) <= credit:
+                message = messages[next_message]
+                now = time.perf_counter()
+                for transaction in message:
+                    sent_at[transaction["id"]] = now
+                websocket.send_text(json.dumps({"transactions": message}))
+                credit -= len(message)
+                next_message += 1
+                continue
+            frame = websocket.receive_json()
+            if "detail" in frame:
+                raise RuntimeError(frame["detail"])
+            if "credit" in frame:
+                credit += frame["credit"]
+                continue
+            now = time.perf_counter()
+            for result in frame["results"]:
+                scores[result["transaction_id"]] = result["anomaly_score"]
+                latencies.append(now - sent_at[result["transaction_id"]])
+            websocket.send_text(json.dumps({"credit": len(frame["results"])}))
+    return latencies, scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--message-rows", type=int, default=10)
+    parser.add_argument("--result-credit", type=int, default=2048)
+    args = parser.parse_args()
+
+    model = IsolationForest(random_state=0).fit(
+        extract_feature_matrix(make_transactions(20000, seed=3), spotter.entity_encoder)
+    )
+    version = spotter.model_registry.publish_model("anomaly_model", model, {"source": "benchmark"})
+    spotter.model_registry.activate("anomaly_model", version)
+
+    transactions = make_transaction_dicts(args.rows, seed=1)
+    messages = [transactions[i:i + args.message_rows] for i in range(0, args.rows, args.message_rows)]
+
+    with TestClient(spotter.app) as client:
+        while client.get("/ready").status_code != 200:
+            time.sleep(0.05)
+
+        print(f"{'path':>8} {'rows/s':>10} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+        results = {}
+        for label, run in (
+            ("post", lambda: post_messages(client, messages)),
+            ("stream", lambda: stream_messages(client, messages, args.result_credit)),
+        ):
+            start = time.perf_counter()
+            latencies, scores = run()
+            elapsed = time.perf_counter() - start
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            print(f"{label:>8} {args.rows / elapsed:>10.0f} {p50:>9.1f} {p99:>9.1f}")
+            results[label] = scores
+        stats = client.get("/api/analyze/stream/stats").json()
+        print(f"stream batches: {stats['batches']}, mean rows {stats['mean_batch_rows']:.0f}, "
+              f"credit stalls {stats['credit_stalls']}")
+
+    ids = list(results["post"])
+    assert np.allclose([results["post"][i] for i in ids], [results["stream"][i] for i in ids]), "scores differ"
+
+
+if __name__ == "__main__":
+    main()
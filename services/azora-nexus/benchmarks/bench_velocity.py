@@ -0,0 +1,69 @@
+"""
+Benchmark: velocity store updates.
+
+Checks that a time-ordered stream gives the same velocity features whether
+it is counted as one batch or as many small ones, then reports the cost per
+row of bulk updates for each batch size and of small live requests against
+a warm store.
+
+    python benchmarks/bench_velocity.py [--sizes 1000 10000 100000] [--windows 300,3600,86400]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from common import best_of, make_transactions
+from spotter_features import to_columns
+from spotter_velocity import VelocityStore, parse_windows
+
+
+def ordered_columns(size: int, seed: int):
+    transactions = sorted(make_transactions(size, seed=seed), key=lambda tx: tx.timestamp)
+    return to_columns(transactions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--windows", default="300,3600,86400")
+    parser.add_argument("--request-rows", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    windows = parse_windows(args.windows)
+
+    # Idle eviction drops state already decayed by exp(-idle / window), so
+    # the equivalence check keeps every entity
+    columns = ordered_columns(5000, seed=3)
+    whole = VelocityStore(windows, idle_seconds=np.inf).update(columns)
+    step = VelocityStore(windows, idle_seconds=np.inf)
+    chunked = np.vstack([
+        step.update(columns.take(np.arange(start, min(start + 50, len(columns)))))
+        for start in range(0, len(columns), 50)
+    ])
+    assert np.allclose(whole, chunked, rtol=1e-6, atol=1e-9), "batch and incremental features differ"
+
+    print(f"{'batch':>8} {'update (s)':>11} {'us/row':>8}")
+    for size in args.sizes:
+        columns = ordered_columns(size, seed=size)
+        elapsed = best_of(lambda: VelocityStore(windows).update(columns), args.repeat)
+        print(f"{size:>8} {elapsed:>11.4f} {elapsed / size * 1e6:>8.2f}")
+
+    store = VelocityStore(windows)
+    store.update(ordered_columns(max(args.sizes), seed=1))
+    requests = ordered_columns(args.request_rows * 200, seed=2)
+    batches = [
+        requests.take(np.arange(start, start + args.request_rows))
+        for start in range(0, len(requests), args.request_rows)
+    ]
+    elapsed = best_of(lambda: [store.update(batch) for batch in batches], args.repeat) / len(batches)
+    print(f"{args.request_rows}-row requests on a warm store: {elapsed * 1000:.3f} ms each")
+    print(store.stats()["entities"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Offline check: cascade scoring vs full IsolationForest scoring.
+
+Scores a reference dataset with the full forest and with cascade scoring at
+each --trees / --z setting, and reports the early-exit rate, how often the
+anomaly flag and risk level disagree with full scoring, the score error of
+rows that exited early and the speedup. Exits non-zero when the flag
+disagreement rate exceeds --max-disagreement.
+
+    python benchmarks/check_cascade.py --dataset DATA_DIR/reference.csv --model model.joblib
+    python benchmarks/check_cascade.py --rows 100000 --trees 8 16 32 --z 2 3 4
+
+Without --dataset, seeded synthetic transactions are used; without --model,
+the current anomaly model of MODEL_DIR, or a model fitted on synthetic data.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="spotter-data-"))
+
+import joblib
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from common import make_transactions
+from spotter_datasets import frame_features, iter_chunks
+from spotter_encoding import EntityEncoder
+from spotter_features import extract_feature_matrix, risk_levels
+from spotter_iforest import compile_isolation_forest
+from spotter_registry import ModelRegistry
+
+
+def reference_features(args, encoder: EntityEncoder) -> np.ndarray:
+    if args.dataset:
+        return np.vstack([frame_features(chunk, encoder)[1] for chunk, _ in iter_chunks(args.dataset)])
+    return extract_feature_matrix(make_transactions(args.rows, seed=args.seed), encoder)
+
+
+def load_model(args, encoder: EntityEncoder):
+    if args.model:
+        return joblib.load(args.model)
+    model_dir = os.environ.get("MODEL_DIR")
+    if model_dir:
+        registry = ModelRegistry(model_dir)
+        version = registry.current_version("anomaly_model")
+        if version is not None:
+            print(f"Using anomaly_model version {version} from {model_dir}")
+            return registry.load("anomaly_model", version)
+    training = extract_feature_matrix(make_transactions(20000, seed=args.seed + 1), encoder)
+    return IsolationForest(n_estimators=100, contamination=0.01, random_state=args.seed).fit(training)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dataset", help="CSV, Parquet or NDJSON reference dataset")
+    parser.add_argument("--model", help="joblib file of a fitted IsolationForest")
+    parser.add_argument("--rows", type=int, default=50000, help="synthetic rows when no dataset is given")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--trees", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--z", type=float, nargs="+", default=[2.0, 3.0, 4.0])
+    parser.add_argument("--max-disagreement", type=float, default=0.001)
+    args = parser.parse_args()
+
+    encoder = EntityEncoder()
+    features = reference_features(args, encoder)
+    model = load_model(args, encoder)
+    compiled = compile_isolation_forest(model)
+    if compiled is None:
+        sys.exit("Cascade scoring needs a fitted IsolationForest")
+
+    start = time.perf_counter()
+    full = model.decision_function(features)
+    full_seconds = time.perf_counter() - start
+    full_flags = full < 0
+    full_levels = risk_levels(full)
+    print(f"{len(features)} rows, {compiled.n_trees} trees, full scoring {full_seconds:.3f}s, "
+          f"{full_flags.mean():.2%} anomalous\n")
+
+    print(f"{'trees':>5} {'z':>5} {'early exit':>11} {'flag diff':>10} {'level diff':>11} "
+          f"{'max err':>8} {'mean err':>9} {'speedup':>8}")
+    worst = 0.0
+    for trees in args.trees:
+        for z in args.z:
+            start = time.perf_counter()
+            scores, exited = compiled.cascade_decision_function(features, trees, z)
+            seconds = time.perf_counter() - start
+
+            flag_diff = float(((scores < 0) != full_flags).mean())
+            level_diff = float((risk_levels(scores) != full_levels).mean())
+            errors = np.abs(scores - full)[exited]
+            worst = max(worst, flag_diff)
+            print(
+                f"{trees:>5} {z:>5.1f} {exited.mean():>11.2%} {flag_diff:>10.4%} {level_diff:>11.4%} "
+                f"{errors.max() if len(errors) else 0.0:>8.4f} {errors.mean() if len(errors) else 0.0:>9.4f} "
+                f"{full_seconds / seconds:>7.1f}x"
+            )
+
+    if worst > args.max_disagreement:
+        print(f"\nFlag disagreement {worst:.4%} exceeds {args.max_disagreement:.4%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
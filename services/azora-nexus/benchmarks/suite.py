@@ -0,0 +1,221 @@
+"""
+Benchmark and load-test suite for the spotter service.
+
+Runs micro-benchmarks of the scoring pipeline (extract_features,
+calculate_risk_level, decision_function, the clustering path) and in-process
+HTTP load tests of both analyze endpoints across batch sizes and
+concurrency levels, all on seeded synthetic data and without external
+services: compliance events go to an in-process stub that accepts them.
+Results are written as JSON; with --baseline they are compared to an
+earlier run and the script exits non-zero when any result regressed by
+more than --tolerance.
+
+Baselines are machine specific, so none is committed. Record one from the
+code before a change, on the host that will run the comparison:
+
+    git stash
+    python benchmarks/suite.py --output baseline.json
+    git stash pop
+    python benchmarks/suite.py --baseline baseline.json --tolerance 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MODEL_DIR", tempfile.mkdtemp(prefix="spotter-models-"))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="spotter-data-"))
+os.environ.setdefault("SPOTTER_MODEL_POLL_SECONDS", "3600")
+
+import numpy as np
+import sklearn
+from sklearn.cluster import DBSCAN
+from sklearn.ensemble import IsolationForest
+
+from common import best_of, make_transaction_dicts, make_transactions
+
+import spotter
+from spotter_executor import cluster_with, score_with
+from spotter_features import extract_feature_matrix, risk_levels
+from spotter_patterns import summarize_groups
+
+logging.disable(logging.WARNING)
+
+
+def result(value: float, unit: str, better: str) -> Dict[str, Any]:
+    return {"value": value, "unit": unit, "better": better}
+
+
+def fit_anomaly_model(seed: int) -> IsolationForest:
+    training = extract_feature_matrix(make_transactions(20000, seed=seed + 1), spotter.entity_encoder)
+    return IsolationForest(n_estimators=100, contamination=0.01, random_state=seed).fit(training)
+
+
+def micro_benchmarks(sizes: List[int], repeat: int, seed: int, model) -> Dict[str, Dict[str, Any]]:
+    """Per-function timings of the scoring pipeline"""
+    results = {}
+    clustering = DBSCAN(eps=0.5, min_samples=5)
+    for size in sizes:
+        transactions = make_transactions(size, seed=seed)
+        features = extract_feature_matrix(transactions, spotter.entity_encoder)
+        scores = model.decision_function(features)
+        score_list = scores.tolist()
+
+        timings = {
+            "extract_features": lambda: [spotter.extract_features(tx) for tx in transactions],
+            "extract_feature_matrix": lambda: extract_feature_matrix(transactions, spotter.entity_encoder),
+            "calculate_risk_level": lambda: [spotter.calculate_risk_level(s) for s in score_list],
+            "risk_levels": lambda: risk_levels(scores),
+            "decision_function": lambda: score_with(model, features),
+            "cluster": lambda: summarize_groups(features, cluster_with(clustering, features)),
+        }
+        for name, fn in timings.items():
+            elapsed = best_of(fn, repeat)
+            results[f"micro.{name}.rows={size}"] = result(elapsed, "s", "lower")
+            results[f"micro.{name}.rows={size}.throughput"] = result(size / elapsed, "rows/s", "higher")
+    return results
+
+
+async def load_test(
+    client, path: str, body: bytes, rows: int, concurrency: int, requests: int
+) -> Dict[str, Dict[str, Any]]:
+    """Latency percentiles and throughput of one endpoint at one load level"""
+    latencies: List[float] = []
+    failures = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, failures
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await client.post(path, content=body, headers={"content-type": "application/json"})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    if failures:
+        raise RuntimeError(f"{failures}/{requests} requests to {path} failed")
+
+    prefix = f"http.{path.rsplit('/', 1)[-1]}.rows={rows}.concurrency={concurrency}"
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]).tolist()
+    return {
+        f"{prefix}.p50": result(p50, "s", "lower"),
+        f"{prefix}.p95": result(p95, "s", "lower"),
+        f"{prefix}.p99": result(p99, "s", "lower"),
+        f"{prefix}.throughput": result(rows * requests / elapsed, "rows/s", "higher"),
+    }
+
+
+async def load_tests(
+    sizes: List[int], concurrency_levels: List[int], requests: int, seed: int, model
+) -> Dict[str, Dict[str, Any]]:
+    """Drive the ASGI app in-process, with its startup and shutdown hooks"""
+    import httpx
+
+    version = spotter.model_registry.publish_model("anomaly_model", model, {"source": "benchmark"})
+    spotter.model_registry.activate("anomaly_model", version)
+
+    # Compliance events are accepted by an in-process stub instead of the network
+    spotter.compliance_shipper.transport = httpx.MockTransport(lambda request: httpx.Response(200))
+
+    results = {}
+    async with spotter.app.router.lifespan_context(spotter.app):
+        transport = httpx.ASGITransport(app=spotter.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://spotter", timeout=None) as client:
+            # Models load in the background after startup
+            while (await client.get("/ready")).status_code != 200:
+                await asyncio.sleep(0.05)
+            for size in sizes:
+                body = json.dumps({"transactions": make_transaction_dicts(size, seed=seed)}).encode("utf-8")
+                for path in ("/api/analyze/anomalies", "/api/analyze/patterns"):
+                    # Warm up caches and the compute pool before measuring
+                    await client.post(path, content=body, headers={"content-type": "application/json"})
+                    for concurrency in concurrency_levels:
+                        results.update(await load_test(client, path, body, size, concurrency, requests))
+    return results
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print current vs baseline and return the names of regressed results"""
+    regressions = []
+    print(f"\n{'result':<64} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, entry in current["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None or not previous["value"]:
+            continue
+        change = entry["value"] / previous["value"] - 1
+        worse = change > tolerance if entry["better"] == "lower" else change < -tolerance
+        marker = "  REGRESSED" if worse else ""
+        print(f"{name:<64} {previous['value']:>12.4g} {entry['value']:>12.4g} {change:>+7.1%}{marker}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--micro-sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--http-sizes", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--requests", type=int, default=16, help="requests per endpoint and load level")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    model = fit_anomaly_model(args.seed)
+    results = micro_benchmarks(args.micro_sizes, args.repeat, args.seed, model)
+    if not args.skip_http:
+        results.update(asyncio.run(load_tests(args.http_sizes, args.concurrency, args.requests, args.seed, model)))
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "sklearn": sklearn.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "executor": spotter.compute_pool.mode,
+        },
+        "parameters": vars(args),
+        "results": results,
+    }
+
+    for name, entry in results.items():
+        print(f"{name:<64} {entry['value']:>12.4g} {entry['unit']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} result(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
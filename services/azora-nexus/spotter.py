@@ -2,20 +2,57 @@ import os
 import json
 import time
 import numpy as np
-import pandas as pd
-from datetime import datetime
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request
+from datetime import datetime, timezone
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-import httpx
+from pydantic import BaseModel, Field, ValidationError
+from typing import Iterable, List, Optional, Dict, Any, Tuple, Union
 import logging
 import asyncio
-from sklearn.ensemble import IsolationForest
-from sklearn.cluster import DBSCAN
-import joblib
-import uvicorn
-import os
+
+from spotter_admission import AdmissionController, BodyTooLarge, Overloaded
+from spotter_batcher import MicroBatcher
+from spotter_bulk import BulkJob, BulkJobs
+from spotter_cache import ResultCache, feature_keys, transaction_keys
+from spotter_columnar import (
+    MEDIA_TYPES,
+    ColumnarBatch,
+    UnsupportedFormat,
+    anomaly_response_binary,
+    binary_format,
+    decode_batch,
+    openapi_body,
+    pattern_response_binary,
+    response_format,
+)
+from spotter_compliance import ComplianceShipper
+from spotter_encoding import EntityEncoder
+from spotter_executor import ComputePool
+from spotter_explain import contribution_dicts, explain_max_rows_from_env, select_rows, validate_explain
+from spotter_datasets import resolve_dataset
+from spotter_drift import DriftMonitor
+from spotter_features import build_feature_matrix, model_feature_names, risk_levels, to_columns
+from spotter_graph import TransactionGraph
+from spotter_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics, MetricsMiddleware
+from spotter_patterns import DEFAULT_MAX_PAIRS, PatternWindow, batch_groups, grid_clusterable
+from spotter_profiler import SamplingProfiler
+from spotter_registry import DEFAULT_MODEL_VERSION, MODEL_NAMES, ModelRegistry
+from spotter_segments import SegmentModels, SegmentRouter, segment_model_name
+from spotter_startup import StartupTracker
+from spotter_stream import IngestStreams, StreamProtocolError
+from spotter_serialization import (
+    anomaly_response_json,
+    fast_endpoints_from_env,
+    pattern_response_json,
+    use_fast_response,
+)
+from spotter_training import TrainingJob, TrainingJobs
+from spotter_velocity import VelocityStore
+
+# Process start to readiness, timed by phase and served at /ready
+startup = StartupTracker()
+startup.record("imports", time.time() - startup.started_at)
 
 # Setup logging
 logging.basicConfig(
@@ -41,6 +78,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-stage latency, batch size and model-call metrics served at /metrics
+metrics = Metrics()
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
 # Environment variables
 COMPLIANCE_URL = os.environ.get("COMPLIANCE_URL", "http://localhost:4095")
 MODEL_DIR = os.environ.get("MODEL_DIR", "/workspaces/azora-os/data/models")
@@ -50,10 +91,76 @@ DATA_DIR = os.environ.get("DATA_DIR", "/workspaces/azora-os/data/ai")
 os.makedirs(MODEL_DIR, exist_ok=True)
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Endpoints answering with arrays serialized straight to JSON (SPOTTER_FAST_RESPONSES)
+FAST_RESPONSE_ENDPOINTS = fast_endpoints_from_env()
+# Most rows given features_contribution per batch (?explain=)
+EXPLAIN_MAX_ROWS = explain_max_rows_from_env()
+MODEL_POLL_SECONDS = float(os.environ.get("SPOTTER_MODEL_POLL_SECONDS", "5"))
+# Batches from this many rows are clustered through the grid index (0 disables it)
+LARGE_PATTERN_ROWS = int(os.environ.get("SPOTTER_PATTERN_LARGE_ROWS", "50000"))
+PATTERN_MAX_PAIRS = int(os.environ.get("SPOTTER_PATTERN_MAX_PAIRS", str(DEFAULT_MAX_PAIRS)))
+VELOCITY_SNAPSHOT_SECONDS = float(os.environ.get("SPOTTER_VELOCITY_SNAPSHOT_SECONDS", "300"))
+# Rows of the synthetic batch models are warmed up with before /ready (0 disables warm-up)
+WARM_UP_ROWS = int(os.environ.get("SPOTTER_WARM_UP_ROWS", "256"))
+
 # Models
 anomaly_model = None
 clustering_model = None
 
+# Versioned artifacts under MODEL_DIR; model_versions tracks what is served
+model_registry = ModelRegistry.from_env(MODEL_DIR)
+model_versions: Dict[str, str] = {name: DEFAULT_MODEL_VERSION for name in MODEL_NAMES.values()}
+model_watcher: Optional[asyncio.Task] = None
+model_preparation: Optional[asyncio.Task] = None
+
+# Batched, pooled shipping of compliance events
+compliance_shipper = ComplianceShipper.from_env(COMPLIANCE_URL, DATA_DIR)
+
+# Deterministic sender/recipient/country/currency encoding shared by all workers
+entity_encoder = EntityEncoder.from_env(DATA_DIR)
+
+# Rolling per-sender/recipient/country counters appended to the anomaly features (SPOTTER_VELOCITY_WINDOWS)
+velocity_store = VelocityStore.from_env(DATA_DIR)
+velocity_snapshotter: Optional[asyncio.Task] = None
+
+# Sender -> recipient edges of scored transactions for ring and fan-out queries (SPOTTER_GRAPH)
+transaction_graph = TransactionGraph.from_env(DATA_DIR)
+graph_merger: Optional[asyncio.Task] = None
+
+# Input and score distributions of live traffic against the training baseline (SPOTTER_DRIFT)
+drift_monitor = DriftMonitor.from_env()
+
+# Per-segment anomaly models and the rows routed to them (SPOTTER_SEGMENT_BY)
+segment_router = SegmentRouter.from_env(model_registry)
+
+# Scoring and clustering run here instead of on the event loop; segment models are loaded into its LRU on demand
+compute_pool = ComputePool.from_env(SegmentModels.from_env(MODEL_DIR) if segment_router is not None else None)
+
+# Recent transactions clustered incrementally for cross-batch patterns
+pattern_window = PatternWindow.from_env()
+
+# Training jobs run in child processes; their status is kept under DATA_DIR
+training_jobs = TrainingJobs.from_env(DATA_DIR, MODEL_DIR)
+
+# Bulk scoring jobs over DATA_DIR datasets, checkpointed under DATA_DIR/scores
+bulk_jobs = BulkJobs.from_env(DATA_DIR)
+
+# Runtime-switchable stack sampler (SPOTTER_PROFILER)
+profiler = SamplingProfiler.from_env()
+
+# Scores of recently seen transactions, optionally shared by workers (SPOTTER_RESULT_CACHE_SIZE)
+result_cache = ResultCache.from_env()
+
+# In-flight row budget, per-client limits and load shedding of the analyze endpoints (SPOTTER_ADMISSION_MAX_ROWS)
+admission = AdmissionController.from_env()
+ADMISSION_CLIENT_HEADER = os.environ.get("SPOTTER_ADMISSION_CLIENT_HEADER", "x-client-id")
+
+# Batching and credit windows of WebSocket ingest streams
+ingest_streams = IngestStreams.from_env()
+
+# Optional coalescing of concurrent small anomaly requests (SPOTTER_MICROBATCH)
+micro_batcher = MicroBatcher.from_env(compute_pool.score)
+
 # Pydantic models
 class Transaction(BaseModel):
     id: str
@@ -84,6 +191,15 @@ class AnomalyResponse(BaseModel):
     processing_time: float
     model_version: str
     anomalies_found: int
+    # Rows that left cascade scoring early (None when cascade mode is off)
+    early_exits: Optional[int] = None
+    # Share of the batch answered from the result cache (None when it is off)
+    cache_hit_ratio: Optional[float] = None
+
+class StreamMessage(BaseModel):
+    """Client frame of an ingest stream: transactions, result credit or both"""
+    transactions: List[Transaction] = []
+    credit: int = Field(0, ge=0)
 
 class PatternGroup(BaseModel):
     group_id: int
@@ -98,11 +214,52 @@ class PatternResponse(BaseModel):
     processing_time: float
     model_version: str
 
+class GraphAccount(BaseModel):
+    account: str
+    counterparties: int
+    transactions: int
+    amount: float
+
+class GraphCycle(BaseModel):
+    accounts: List[str]
+    length: int
+    transactions: int
+    # Smallest sender -> recipient total along the cycle
+    amount: float
+
+class DenseSubgraph(BaseModel):
+    # Highest-degree members first, at most 100 of them
+    accounts: List[str]
+    size: int
+    edges: int
+    density: float
+    amount: float
+
+class GraphPatternResponse(BaseModel):
+    since: str
+    until: str
+    transactions: int
+    accounts: int
+    fan_out: List[GraphAccount]
+    fan_in: List[GraphAccount]
+    cycles: List[GraphCycle]
+    # The cycle search ran out of steps; cycles moving less money may be missing
+    cycles_truncated: bool
+    dense_subgraphs: List[DenseSubgraph]
+    processing_time: float
+
+# Request body of the analysis endpoints: JSON, Arrow IPC stream or msgpack columns
+BATCH_REQUEST_BODY = openapi_body(TransactionBatch.model_json_schema())
+
 class ModelTrainingRequest(BaseModel):
     data_source: str
     parameters: Dict[str, Any]
     model_type: str = "anomaly_detection"
 
+class BulkScoringRequest(BaseModel):
+    data_source: str
+    parameters: Dict[str, Any] = {}
+
 class ModelTrainingResponse(BaseModel):
     job_id: str
     status: str
@@ -112,40 +269,159 @@ class ModelTrainingResponse(BaseModel):
 # Initialize models on startup
 @app.on_event("startup")
 async def initialize_models():
-    global anomaly_model, clustering_model
+    global velocity_snapshotter, graph_merger, model_preparation
+    
+    with startup.phase("state"):
+        entity_encoder.load()
+        if velocity_store is not None:
+            velocity_store.load()
+            velocity_snapshotter = asyncio.create_task(snapshot_velocity_store())
+        if transaction_graph is not None:
+            transaction_graph.load()
+            graph_merger = asyncio.create_task(merge_transaction_graph())
+        compliance_shipper.start()
+        bulk_jobs.resume_interrupted(locate_bulk_job)
+    
+    # Models load and warm up while the server already answers /health;
+    # /ready reports 503 until they are done
+    model_preparation = asyncio.create_task(prepare_models())
+
+async def prepare_models():
+    global anomaly_model, clustering_model, model_watcher
     
     try:
-        # Try to load existing models
-        anomaly_model_path = os.path.join(MODEL_DIR, "anomaly_model.joblib")
-        clustering_model_path = os.path.join(MODEL_DIR, "clustering_model.joblib")
-        
-        if os.path.exists(anomaly_model_path):
-            anomaly_model = joblib.load(anomaly_model_path)
-            logger.info("Loaded existing anomaly detection model")
-        else:
-            # Create a default model
-            anomaly_model = IsolationForest(
-                n_estimators=100, 
-                max_samples='auto', 
-                contamination=0.01, 
-                random_state=42
-            )
-            logger.info("Created new anomaly detection model")
+        with startup.phase("models"):
+            # Adopt pre-registry artifacts, then load the current versions
+            for model_name in MODEL_NAMES.values():
+                model_registry.import_legacy(model_name)
+            await refresh_models()
+            await refresh_segments()
+            
+            if anomaly_model is None:
+                from sklearn.ensemble import IsolationForest
+                
+                # Create a default model
+                anomaly_model = IsolationForest(
+                    n_estimators=100, 
+                    max_samples='auto', 
+                    contamination=0.01, 
+                    random_state=42
+                )
+                logger.info("Created new anomaly detection model")
+            
+            if clustering_model is None:
+                from sklearn.cluster import DBSCAN
+                
+                # Create a default model
+                clustering_model = DBSCAN(
+                    eps=0.5,
+                    min_samples=5,
+                    metric='euclidean'
+                )
+                logger.info("Created new clustering model")
         
-        if os.path.exists(clustering_model_path):
-            clustering_model = joblib.load(clustering_model_path)
-            logger.info("Loaded existing clustering model")
-        else:
-            # Create a default model
-            clustering_model = DBSCAN(
-                eps=0.5,
-                min_samples=5,
-                metric='euclidean'
-            )
-            logger.info("Created new clustering model")
+        with startup.phase("compile"):
+            await compute_pool.update_models(anomaly_model, clustering_model)
+            configure_pattern_window()
+        with startup.phase("warm_up"):
+            await warm_up_models()
             
     except Exception as e:
+        # The failed phase is reported by /ready, which stays at 503
         logger.error(f"Error initializing models: {e}")
+    else:
+        startup.mark_ready()
+    model_watcher = asyncio.create_task(watch_model_registry())
+
+async def warm_up_models():
+    """Score and cluster a synthetic batch so first requests skip one-time costs"""
+    if WARM_UP_ROWS <= 0:
+        return
+    rng = np.random.default_rng(0)
+    anomaly_features = rng.normal(size=(WARM_UP_ROWS, len(model_feature_names(velocity_store))))
+    pattern_features = anomaly_features[:, :len(model_feature_names())]
+    await compute_pool.warm_up(anomaly_features, pattern_features)
+
+async def refresh_models() -> bool:
+    """Load any model whose CURRENT version differs from the one being served"""
+    global anomaly_model, clustering_model
+    
+    changed = False
+    for model_name in MODEL_NAMES.values():
+        version = model_registry.current_version(model_name)
+        if version is None or version == model_versions[model_name]:
+            continue
+        
+        # In-flight requests keep the model object they started with
+        model = await asyncio.to_thread(model_registry.load, model_name, version)
+        if model_name == "anomaly_model":
+            anomaly_model = model
+            if drift_monitor is not None:
+                drift_monitor.reset(version, await asyncio.to_thread(model_registry.load_baseline, model_name, version))
+        else:
+            clustering_model = model
+        model_versions[model_name] = version
+        changed = True
+        logger.info(f"Serving {model_name} version {version}")
+    return changed
+
+async def refresh_segments() -> bool:
+    """Re-read which segments have a model; True if the routing table changed"""
+    if segment_router is None:
+        return False
+    return await asyncio.to_thread(segment_router.refresh)
+
+async def watch_model_registry():
+    """Hot-swap to versions activated by other workers or training jobs"""
+    while True:
+        await asyncio.sleep(MODEL_POLL_SECONDS)
+        try:
+            await refresh_segments()
+            if await refresh_models():
+                await compute_pool.update_models(anomaly_model, clustering_model)
+                configure_pattern_window()
+                await warm_up_models()
+        except Exception as e:
+            logger.error(f"Error refreshing models from registry: {e}")
+
+async def snapshot_velocity_store():
+    """Save the velocity state periodically so a crash loses at most one interval"""
+    while True:
+        await asyncio.sleep(VELOCITY_SNAPSHOT_SECONDS)
+        try:
+            await asyncio.to_thread(velocity_store.snapshot)
+        except Exception as e:
+            logger.error(f"Error saving velocity state snapshot: {e}")
+
+async def merge_transaction_graph():
+    """Fold buffered graph edges into the CSR arrays off the event loop"""
+    while True:
+        await asyncio.sleep(1.0)
+        if not transaction_graph.merge_due:
+            continue
+        try:
+            await asyncio.to_thread(transaction_graph.merge)
+        except Exception as e:
+            logger.error(f"Error merging transaction graph edges: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_services():
+    startup.mark_draining()
+    if model_preparation is not None:
+        model_preparation.cancel()
+    if model_watcher is not None:
+        model_watcher.cancel()
+    if velocity_snapshotter is not None:
+        velocity_snapshotter.cancel()
+    if graph_merger is not None:
+        graph_merger.cancel()
+    compute_pool.shutdown()
+    entity_encoder.snapshot()
+    if velocity_store is not None:
+        velocity_store.snapshot()
+    if transaction_graph is not None:
+        transaction_graph.snapshot()
+    await compliance_shipper.stop()
 
 # Helper functions
 def extract_features(transaction: Transaction) -> np.ndarray:
@@ -159,8 +435,8 @@ def extract_features(transaction: Transaction) -> np.ndarray:
     # Basic features
     features.append(transaction.amount)
     features.append(datetime.fromisoformat(transaction.timestamp.replace('Z', '+00:00')).hour)
-    features.append(float(hash(transaction.sender) % 1000) / 1000)
-    features.append(float(hash(transaction.recipient) % 1000) / 1000)
+    features.append(entity_encoder.encode_one("sender", transaction.sender))
+    features.append(entity_encoder.encode_one("recipient", transaction.recipient))
     
     # Add more feature engineering here in production
     
@@ -179,31 +455,463 @@ def calculate_risk_level(score: float) -> str:
     else:
         return "normal"
 
-async def log_to_compliance(action: str, data: Dict[str, Any]):
-    """Log events to compliance service"""
+def configure_pattern_window():
+    """Keep the pattern window on the clustering model's eps/min_samples"""
+    if clustering_model is not None and hasattr(clustering_model, "eps"):
+        pattern_window.configure(clustering_model.eps, clustering_model.min_samples)
+
+def large_pattern_batch(feature_matrix: np.ndarray) -> bool:
+    """Whether a batch takes the large-batch pattern path"""
+    return (
+        LARGE_PATTERN_ROWS > 0
+        and len(feature_matrix) >= LARGE_PATTERN_ROWS
+        and grid_clusterable(clustering_model, feature_matrix.shape[1])
+    )
+
+def build_pattern_groups(groups: List[Dict[str, Any]]) -> List[PatternGroup]:
+    return [
+        PatternGroup(
+            group_id=group["group_id"],
+            transactions=group["transactions"],
+            centroid=group["centroid"],
+            density=group["density"],
+            risk_score=group["risk_score"]
+        )
+        for group in groups
+    ]
+
+def request_error(error: Dict[str, Any]) -> Dict[str, Any]:
+    """Validation error of a body field, without echoing back a body that is not valid JSON"""
+    error = {**error, "loc": ("body", *error["loc"])}
+    if error["type"] == "json_invalid":
+        # The input is the whole body, possibly large or not UTF-8
+        error.pop("input", None)
+    return error
+
+async def read_body(request: Request) -> bytes:
+    """Request body, rejected with 413 as soon as it passes the admission byte cap"""
+    if admission is None:
+        return await request.body()
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{COMPLIANCE_URL}/api/log",
-                json={
-                    "service": "azora-ai-spotter",
-                    "action": action,
-                    "timestamp": datetime.now().isoformat(),
-                    "data": data
-                },
-                timeout=5.0
-            )
-            return response.status_code == 200
+        length = request.headers.get("content-length")
+        if length is not None and length.isdigit():
+            admission.check_body(int(length))
+        chunks, size = [], 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            admission.check_body(size)
+            chunks.append(chunk)
+    except BodyTooLarge as e:
+        metrics.admission_shed.inc(1, "body_size")
+        raise HTTPException(status_code=413, detail=str(e))
+    return b"".join(chunks)
+
+async def read_batch(request: Request) -> Union[TransactionBatch, ColumnarBatch]:
+    """Transaction batch from a JSON, Arrow IPC stream or msgpack body"""
+    body = await read_body(request)
+    fmt = binary_format(request.headers.get("content-type"))
+    if fmt is None:
+        try:
+            with metrics.stage("parse"):
+                batch = TransactionBatch.model_validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError([request_error(error) for error in e.errors(include_url=False)])
+        metrics.observe_batch(batch_length(batch))
+        return batch
+    try:
+        with metrics.stage("parse"):
+            # Precomputed features are the anomaly model's input, velocity features included
+            batch = await asyncio.to_thread(decode_batch, fmt, body, len(model_feature_names(velocity_store)))
+    except UnsupportedFormat as e:
+        raise HTTPException(status_code=415, detail=str(e))
     except Exception as e:
-        logger.error(f"Failed to log to compliance: {e}")
-        return False
+        raise HTTPException(status_code=400, detail=f"Invalid {fmt} body: {e}")
+    metrics.observe_batch(batch_length(batch))
+    return batch
+
+def overloaded(e: Overloaded) -> HTTPException:
+    metrics.admission_shed.inc(1, e.reason)
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def client_name(connection: Union[Request, WebSocket]) -> str:
+    """Client identity used for per-client admission limits"""
+    return connection.headers.get(ADMISSION_CLIENT_HEADER) or (
+        connection.client.host if connection.client else "unknown"
+    )
+
+async def admit_client(request: Request):
+    """One of the client's concurrent request slots, taken before the body is read"""
+    if admission is None:
+        yield None
+        return
+    client = client_name(request)
+    try:
+        admission.enter(client)
+    except Overloaded as e:
+        raise overloaded(e)
+    try:
+        yield client
+    finally:
+        admission.exit(client)
+
+async def admit_rows(rows: int, check: bool = True) -> int:
+    """Reserve rows of the in-flight budget; 0 when admission control is off"""
+    if admission is None:
+        return 0
+    try:
+        with metrics.stage("queue"):
+            return await admission.acquire(rows, check)
+    except Overloaded as e:
+        raise overloaded(e)
+
+def release_rows(reserved: int):
+    if admission is not None and reserved:
+        admission.release(reserved)
+
+def batch_length(batch: Union[TransactionBatch, ColumnarBatch]) -> int:
+    if isinstance(batch, ColumnarBatch):
+        return len(batch)
+    return len(batch.transactions)
+
+def batch_ids(batch: Union[TransactionBatch, ColumnarBatch]) -> List[str]:
+    if isinstance(batch, ColumnarBatch):
+        return batch.ids
+    return [tx.id for tx in batch.transactions]
+
+def batch_features(
+    batch: Union[TransactionBatch, ColumnarBatch],
+    with_velocity: bool = False,
+    commit: bool = True
+) -> Tuple[List[str], np.ndarray]:
+    """Transaction ids and feature matrix of a JSON or columnar batch.
+
+    with_velocity appends the velocity features of the anomaly model (when
+    configured), counting the batch in the velocity store and adding it to
+    the transaction graph unless commit is False.
+    """
+    velocity = velocity_store if with_velocity else None
+    with metrics.stage("features"):
+        if isinstance(batch, ColumnarBatch):
+            columns = batch.columns
+            ids, feature_matrix = batch.ids, batch.feature_matrix(entity_encoder, velocity, commit)
+        else:
+            columns = to_columns(batch.transactions)
+            ids, feature_matrix = batch_ids(batch), build_feature_matrix(columns, entity_encoder, velocity, commit)
+    if transaction_graph is not None and with_velocity and commit and columns is not None:
+        with metrics.stage("graph"):
+            transaction_graph.add(columns)
+    return ids, feature_matrix
+
+def batch_rows(
+    batch: Union[TransactionBatch, ColumnarBatch],
+    rows: np.ndarray
+) -> Union[TransactionBatch, ColumnarBatch]:
+    """The given rows of a JSON or columnar batch"""
+    if isinstance(batch, ColumnarBatch):
+        return batch.take(rows)
+    return TransactionBatch.model_construct(
+        transactions=[batch.transactions[i] for i in rows.tolist()], analyze=batch.analyze
+    )
+
+def batch_segment_values(batch: Union[TransactionBatch, ColumnarBatch]) -> Optional[Dict[str, Any]]:
+    """Segment field values of every row, or None when no rows can be routed to a segment model"""
+    if segment_router is None or not segment_router.models:
+        return None
+    if isinstance(batch, ColumnarBatch):
+        # Precomputed features carry no transaction fields to route by
+        if batch.columns is None:
+            return None
+        return {field: getattr(batch.columns, field) for field in segment_router.fields}
+    return {field: [getattr(tx, field) for tx in batch.transactions] for field in segment_router.fields}
+
+def batch_segment_keys(batch: Union[TransactionBatch, ColumnarBatch]) -> Optional[Iterable[str]]:
+    """Segment field values of every row joined into one string, or None when routing is off"""
+    if segment_router is None:
+        return None
+    if isinstance(batch, ColumnarBatch):
+        values = [getattr(batch.columns, field) for field in segment_router.fields]
+    else:
+        values = [[getattr(tx, field) for tx in batch.transactions] for field in segment_router.fields]
+    return ("\x1e".join(map(str, row)) for row in zip(*values))
+
+def scoring_version(model_version: str) -> str:
+    """Version cached scores are keyed on: the global model's, plus the digest of the segment routing table"""
+    if segment_router is None:
+        return model_version
+    return f"{model_version}+segments.{segment_router.digest}"
+
+def batch_cache_keys(batch: Union[TransactionBatch, ColumnarBatch], model_version: str) -> np.ndarray:
+    """Result cache keys of every row of a JSON or columnar batch"""
+    if isinstance(batch, ColumnarBatch):
+        if batch.features is not None:
+            return feature_keys(model_version, batch.ids, batch.features)
+        columns = batch.columns
+        return transaction_keys(
+            model_version,
+            columns.ids,
+            columns.amount.tolist(),
+            columns.timestamp.tolist(),
+            columns.sender,
+            columns.recipient,
+            columns.overrides,
+            batch_segment_keys(batch)
+        )
+    transactions = batch.transactions
+    return transaction_keys(
+        model_version,
+        (tx.id for tx in transactions),
+        (tx.amount for tx in transactions),
+        (tx.timestamp for tx in transactions),
+        (tx.sender for tx in transactions),
+        (tx.recipient for tx in transactions),
+        (tx.features for tx in transactions),
+        batch_segment_keys(batch)
+    )
+
+def batch_response_format(request: Request, batch: Union[TransactionBatch, ColumnarBatch]) -> Optional[str]:
+    request_format = batch.format if isinstance(batch, ColumnarBatch) else None
+    return response_format(request.headers.get("accept"), request_format)
+
+def pattern_response(
+    groups: List[Dict[str, Any]],
+    start_time: float,
+    model_version: str,
+    fast: bool,
+    binary: Optional[str] = None
+):
+    """PatternResponse for group dictionaries, serialized directly in fast or binary mode"""
+    if binary:
+        with metrics.stage("serialize"):
+            return Response(
+                content=pattern_response_binary(binary, groups, time.time() - start_time, model_version),
+                media_type=MEDIA_TYPES[binary]
+            )
+    if fast:
+        with metrics.stage("serialize"):
+            return Response(
+                content=pattern_response_json(groups, time.time() - start_time, model_version),
+                media_type="application/json"
+            )
+    # FastAPI validates and serializes the model after the handler returns
+    metrics.open_stage("serialize")
+    pattern_groups = build_pattern_groups(groups)
+    return PatternResponse(
+        groups=pattern_groups,
+        total_groups=len(pattern_groups),
+        processing_time=time.time() - start_time,
+        model_version=model_version
+    )
+
+def compute_timeout(request: Request) -> Optional[float]:
+    """Per-request compute timeout from the X-Compute-Timeout header (seconds)"""
+    value = request.headers.get("x-compute-timeout")
+    if value is None:
+        return None
+    try:
+        timeout = float(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid X-Compute-Timeout header")
+    return timeout if timeout > 0 else None
+
+async def score_features(
+    feature_matrix: np.ndarray,
+    timeout: Optional[float],
+    segments: Optional[Dict[str, Any]] = None
+) -> Tuple[np.ndarray, Optional[int]]:
+    """Scores and early-exit count of a feature matrix.
+
+    With the segment field values of its rows, rows of segments that have a
+    model are grouped and scored by it, one call per segment, and the rest
+    by the global model.
+    """
+    if segments is None:
+        return await score_global(feature_matrix, timeout)
+    with metrics.stage("route"):
+        groups, global_rows = segment_router.route(segments)
+    metrics.segment_rows.inc(len(feature_matrix) - len(global_rows), "segment")
+    metrics.segment_rows.inc(len(global_rows), "global")
+    if not groups:
+        return await score_global(feature_matrix, timeout)
+    
+    scores = np.empty(len(feature_matrix))
+    
+    async def score_group(segment: str, version: str, rows: np.ndarray):
+        scores[rows] = await compute_pool.score_segment(segment, version, feature_matrix[rows], timeout=timeout)
+    
+    with metrics.stage("score"):
+        await asyncio.gather(*(score_group(segment, version, rows) for segment, version, rows in groups))
+    # Segment rows never early-exit; None only when cascade mode is off
+    early_exits = 0 if compute_pool.cascade_enabled else None
+    if len(global_rows):
+        scores[global_rows], early_exits = await score_global(feature_matrix[global_rows], timeout)
+    return scores, early_exits
+
+async def score_global(feature_matrix: np.ndarray, timeout: Optional[float]) -> Tuple[np.ndarray, Optional[int]]:
+    """Scores and early-exit count of a feature matrix from the global model.
+
+    Cascade mode scores clearly normal rows with fewer trees; otherwise small
+    batches are coalesced when micro-batching is on. Features and scores are
+    counted into the drift sketches.
+    """
+    version = model_versions["anomaly_model"]
+    early_exits = None
+    if compute_pool.cascade_enabled:
+        with metrics.stage("score"), metrics.model_call("anomaly_model", "cascade", version):
+            scores, exited = await compute_pool.score_cascade(feature_matrix, timeout=timeout)
+        early_exits = int(exited.sum())
+        metrics.cascade_rows.inc(early_exits, "early_exit")
+        metrics.cascade_rows.inc(len(exited) - early_exits, "full")
+    else:
+        with metrics.stage("score"), metrics.model_call("anomaly_model", "decision_function", version):
+            if micro_batcher is not None and micro_batcher.accepts(len(feature_matrix)):
+                scores = await asyncio.wait_for(
+                    micro_batcher.score(feature_matrix),
+                    timeout=timeout if timeout is not None else compute_pool.timeout
+                )
+            else:
+                scores = await compute_pool.score(feature_matrix, timeout=timeout)
+    
+    if drift_monitor is not None:
+        with metrics.stage("drift"):
+            drift_monitor.observe(feature_matrix, scores, version)
+    return scores, early_exits
+
+async def score_cached(
+    batch: Union[TransactionBatch, ColumnarBatch],
+    model_version: str,
+    timeout: Optional[float]
+) -> Tuple[np.ndarray, Optional[int], float]:
+    """Scores, early-exit count and cache hit ratio, computing only uncached rows"""
+    with metrics.stage("cache"):
+        cache_keys = batch_cache_keys(batch, scoring_version(model_version))
+        scores, cached = result_cache.lookup(cache_keys)
+    hits = int(cached.sum())
+    metrics.result_cache_rows.inc(hits, "hit")
+    metrics.result_cache_rows.inc(len(cached) - hits, "miss")
+    
+    early_exits = 0 if compute_pool.cascade_enabled else None
+    misses = np.flatnonzero(~cached)
+    if len(misses):
+        # Cached rows were counted in the velocity store when first scored
+        missed = batch if hits == 0 else batch_rows(batch, misses)
+        _, feature_matrix = batch_features(missed, with_velocity=True)
+        fresh, early_exits = await score_features(feature_matrix, timeout, batch_segment_values(missed))
+        scores[misses] = fresh
+        with metrics.stage("cache"):
+            result_cache.store(cache_keys[misses], fresh)
+    return scores, early_exits, hits / len(cached) if len(cached) else 0.0
+
+async def score_batch(
+    batch: Union[TransactionBatch, ColumnarBatch],
+    model_version: str,
+    timeout: Optional[float]
+) -> Tuple[List[str], Optional[np.ndarray], np.ndarray, Optional[int], Optional[float]]:
+    """Ids, feature matrix (None for cache lookups), scores, early exits and cache hit ratio of a batch"""
+    if result_cache is not None:
+        # Repeated transactions skip feature extraction and scoring
+        scores, early_exits, cache_hit_ratio = await score_cached(batch, model_version, timeout)
+        return batch_ids(batch), None, scores, early_exits, cache_hit_ratio
+    
+    # Extract features for the whole batch at once
+    transaction_ids, feature_matrix = batch_features(batch, with_velocity=True)
+    
+    # Get anomaly scores (-1 to 1, lower is more anomalous)
+    scores, early_exits = await score_features(feature_matrix, timeout, batch_segment_values(batch))
+    return transaction_ids, feature_matrix, scores, early_exits, None
+
+async def score_admitted(
+    batch: Union[TransactionBatch, ColumnarBatch],
+    model_version: str,
+    timeout: Optional[float],
+    keep_features: bool,
+    shed: bool = True
+) -> Tuple[List[str], Optional[np.ndarray], np.ndarray, Optional[int], Optional[float]]:
+    """score_batch within the in-flight row budget.
+
+    Batches over SPOTTER_ADMISSION_CHUNK_ROWS are scored chunk by chunk in
+    row order, each chunk waiting for its own share of the budget, so one
+    large request cannot hold the whole budget while others wait. Feature
+    matrices of the chunks are kept only when keep_features is set. Without
+    shed the batch waits in line however long the estimated wait.
+    """
+    if admission is None:
+        return await score_batch(batch, model_version, timeout)
+    
+    spans = admission.chunks(batch_length(batch))
+    parts = []
+    for index, (start, stop) in enumerate(spans):
+        chunk = batch if len(spans) == 1 else batch_rows(batch, np.arange(start, stop))
+        # Only the first chunk can be shed; the rest belong to an admitted request
+        reserved = await admit_rows(stop - start, check=shed and index == 0)
+        try:
+            ids, features, scores, early_exits, hit_ratio = await score_batch(chunk, model_version, timeout)
+        finally:
+            release_rows(reserved)
+        parts.append((ids, features if keep_features else None, scores, early_exits, hit_ratio))
+    if len(parts) == 1:
+        return parts[0]
+    
+    ids = [transaction_id for part in parts for transaction_id in part[0]]
+    feature_matrix = np.vstack([part[1] for part in parts]) if keep_features and parts[0][1] is not None else None
+    scores = np.concatenate([part[2] for part in parts])
+    # A chunk without a count or ratio (no cascade or cache at the time) counts as 0
+    early_exits = None
+    if compute_pool.cascade_enabled or any(part[3] is not None for part in parts):
+        early_exits = sum(part[3] or 0 for part in parts)
+    cache_hit_ratio = None
+    if result_cache is not None or any(part[4] is not None for part in parts):
+        cache_hit_ratio = sum((part[4] or 0.0) * len(part[0]) for part in parts) / len(ids)
+    return ids, feature_matrix, scores, early_exits, cache_hit_ratio
+
+async def explain_scores(
+    batch: Union[TransactionBatch, ColumnarBatch],
+    feature_matrix: Optional[np.ndarray],
+    scores: np.ndarray,
+    levels: np.ndarray,
+    mode: str,
+    timeout: Optional[float]
+) -> Dict[int, Dict[str, float]]:
+    """features_contribution of the rows selected by the ?explain= mode.
+
+    Without the batch's feature matrix (rows answered from the result cache)
+    features are extracted again for the selected rows only, reading the
+    velocity store without counting them a second time.
+    """
+    rows = select_rows(scores, levels, mode, EXPLAIN_MAX_ROWS)
+    if not len(rows):
+        return {}
+    if feature_matrix is not None:
+        selected = feature_matrix[rows]
+    else:
+        _, selected = batch_features(batch_rows(batch, rows), with_velocity=True, commit=False)
+    
+    # Rows are explained by the model that scored them
+    groups, global_rows = [], np.arange(len(rows))
+    segments = batch_segment_values(batch_rows(batch, rows)) if segment_router is not None else None
+    if segments is not None:
+        groups, global_rows = segment_router.route(segments, count=False)
+    shares = np.empty(selected.shape)
+    with metrics.stage("explain"):
+        for segment, version, group in groups:
+            shares[group] = await compute_pool.explain_segment(segment, version, selected[group], timeout=timeout)
+        if len(global_rows):
+            version = model_versions["anomaly_model"]
+            with metrics.model_call("anomaly_model", "feature_contributions", version):
+                shares[global_rows] = await compute_pool.explain(selected[global_rows], timeout=timeout)
+    return contribution_dicts(rows, shares, model_feature_names(velocity_store))
+
+async def log_to_compliance(action: str, data: Dict[str, Any]):
+    """Queue an event for batched delivery to the compliance service"""
+    return compliance_shipper.submit(action, data)
 
 # API Endpoints
 @app.get("/health")
 async def health_check():
+    """Liveness: the process is up, whether or not models are loaded yet"""
     return {
         "status": "healthy",
         "service": "azora-ai-spotter",
+        "ready": startup.ready,
         "models": {
             "anomaly_detection": anomaly_model is not None,
             "clustering": clustering_model is not None
@@ -211,36 +919,84 @@ async def health_check():
         "version": "1.0.0"
     }
 
-@app.post("/api/analyze/anomalies", response_model=AnomalyResponse)
-async def detect_anomalies(batch: TransactionBatch, background_tasks: BackgroundTasks):
+@app.get("/ready")
+async def readiness_check(response: Response):
+    """Readiness: 503 until models are loaded and warmed up, and again while shutting down"""
+    status = startup.status()
+    status["model_versions"] = model_versions
+    if not status["ready"]:
+        response.status_code = 503
+    return status
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Request, stage and model-call metrics in the Prometheus text format"""
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/api/debug/profiler")
+async def profiler_status():
+    return profiler.status()
+
+@app.post("/api/debug/profiler/start")
+async def start_profiler(interval_ms: float = 10.0, duration: Optional[float] = None):
+    """Start sampling every thread's stack; stops by itself after duration seconds"""
+    try:
+        profiler.start(interval=interval_ms / 1000, duration=duration)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return profiler.status()
+
+@app.post("/api/debug/profiler/stop")
+async def stop_profiler():
+    """Stop sampling and return the profile as collapsed stacks"""
+    await asyncio.to_thread(profiler.stop)
+    return Response(content=profiler.collapsed(), media_type="text/plain")
+
+@app.get("/api/debug/profiler/profile")
+async def profiler_profile():
+    """The latest profile as collapsed stacks, for flamegraph tools"""
+    return Response(content=profiler.collapsed(), media_type="text/plain")
+
+@app.post("/api/analyze/anomalies", response_model=AnomalyResponse, openapi_extra=BATCH_REQUEST_BODY)
+async def detect_anomalies(
+    background_tasks: BackgroundTasks,
+    request: Request,
+    explain: Optional[str] = None,
+    client: Optional[str] = Depends(admit_client),
+    batch: Union[TransactionBatch, ColumnarBatch] = Depends(read_batch)
+):
     if not anomaly_model:
         raise HTTPException(status_code=503, detail="Anomaly detection model not available")
     
+    try:
+        explain = validate_explain(explain)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if explain is not None and not compute_pool.explain_enabled:
+        raise HTTPException(status_code=400, detail="Feature contributions need an IsolationForest anomaly model")
+    
     start_time = time.time()
     batch_id = f"batch-{int(time.time())}"
+    model_version = model_versions["anomaly_model"]
     
     try:
-        # Extract features from transactions
-        feature_matrix = np.array([extract_features(tx) for tx in batch.transactions])
-        
-        # Get anomaly scores (-1 to 1, lower is more anomalous)
-        scores = anomaly_model.decision_function(feature_matrix)
+        timeout = compute_timeout(request)
+        transaction_ids, feature_matrix, scores, early_exits, cache_hit_ratio = await score_admitted(
+            batch, model_version, timeout, keep_features=explain is not None
+        )
         
-        results = []
-        anomalies_count = 0
+        anomaly_flags = scores < 0
+        anomalies_count = int(anomaly_flags.sum())
+        levels = risk_levels(scores)
         
-        for i, tx in enumerate(batch.transactions):
-            is_anomaly = scores[i] < 0
-            if is_anomaly:
-                anomalies_count += 1
-            
-            results.append(AnomalyResult(
-                transaction_id=tx.id,
-                is_anomaly=is_anomaly,
-                anomaly_score=float(scores[i]),
-                risk_level=calculate_risk_level(scores[i]),
-                features_contribution=None  # Feature importance would be added in production
-            ))
+        # Per-feature contributions only for the rows the caller asked about
+        contributions = None
+        if explain is not None:
+            contributions = await explain_scores(batch, feature_matrix, scores, levels, explain, timeout)
         
         # Log anomalies to compliance in background
         if anomalies_count > 0:
@@ -250,192 +1006,528 @@ async def detect_anomalies(batch: TransactionBatch, background_tasks: Background
                 {
                     "batch_id": batch_id,
                     "anomalies": anomalies_count,
-                    "total_transactions": len(batch.transactions)
+                    "total_transactions": len(transaction_ids)
                 }
             )
         
+        binary = batch_response_format(request, batch)
+        if binary:
+            with metrics.stage("serialize"):
+                return Response(
+                    content=anomaly_response_binary(
+                        binary,
+                        transaction_ids,
+                        scores,
+                        anomaly_flags,
+                        levels,
+                        batch_id,
+                        time.time() - start_time,
+                        model_version,
+                        anomalies_count,
+                        early_exits,
+                        contributions,
+                        cache_hit_ratio
+                    ),
+                    media_type=MEDIA_TYPES[binary]
+                )
+        
+        if use_fast_response("anomalies", request.headers, FAST_RESPONSE_ENDPOINTS):
+            with metrics.stage("serialize"):
+                return Response(
+                    content=anomaly_response_json(
+                        transaction_ids,
+                        scores,
+                        anomaly_flags,
+                        levels,
+                        batch_id,
+                        time.time() - start_time,
+                        model_version,
+                        anomalies_count,
+                        early_exits,
+                        contributions,
+                        cache_hit_ratio
+                    ),
+                    media_type="application/json"
+                )
+        
+        with metrics.stage("build"):
+            results = [
+                AnomalyResult(
+                    transaction_id=transaction_id,
+                    is_anomaly=is_anomaly,
+                    anomaly_score=score,
+                    risk_level=level
+                )
+                for transaction_id, is_anomaly, score, level in zip(
+                    transaction_ids, anomaly_flags.tolist(), scores.tolist(), levels.tolist()
+                )
+            ]
+            for row, contribution in (contributions or {}).items():
+                results[row].features_contribution = contribution
+        
+        # FastAPI validates and serializes the model after the handler returns
+        metrics.open_stage("serialize")
         return AnomalyResponse(
             results=results,
             batch_id=batch_id,
             processing_time=time.time() - start_time,
-            model_version="1.0.0",
-            anomalies_found=anomalies_count
+            model_version=model_version,
+            anomalies_found=anomalies_count,
+            early_exits=early_exits,
+            cache_hit_ratio=cache_hit_ratio
         )
         
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Anomaly scoring timed out")
     except Exception as e:
         logger.error(f"Error detecting anomalies: {e}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
-@app.post("/api/analyze/patterns", response_model=PatternResponse)
-async def find_patterns(batch: TransactionBatch):
+async def close_stream(websocket: WebSocket, code: int, detail: str):
+    """Send an error frame and close, unless the client is already gone"""
+    try:
+        await websocket.send_text(json.dumps({"detail": detail}))
+        await websocket.close(code=code)
+    except (RuntimeError, WebSocketDisconnect):
+        pass
+
+@app.websocket("/api/analyze/stream")
+async def stream_anomalies(websocket: WebSocket):
+    """Continuous anomaly scoring over one connection.
+
+    The client sends StreamMessage frames and receives one AnomalyResponse
+    frame per scored batch (split when its result credit runs short), plus
+    {"credit": n} frames granting it n more transactions.
+    """
+    await websocket.accept()
+    if not anomaly_model:
+        await close_stream(websocket, 1013, "Anomaly detection model not available")
+        return
+    client = client_name(websocket)
+    if admission is not None:
+        try:
+            admission.enter(client)
+        except Overloaded as e:
+            metrics.admission_shed.inc(1, e.reason)
+            await close_stream(websocket, 1013, str(e))
+            return
+    
+    async def receive() -> Tuple[List[Transaction], int]:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        with metrics.stage("parse"):
+            parsed = StreamMessage.model_validate_json(message.get("text") or message.get("bytes") or b"")
+        return parsed.transactions, parsed.credit
+    
+    async def score(batch_id: str, transactions: List[Transaction]):
+        metrics.observe_batch(len(transactions))
+        model_version = model_versions["anomaly_model"]
+        # Stream batches wait in line for the row budget instead of being shed
+        transaction_ids, _, scores, early_exits, cache_hit_ratio = await score_admitted(
+            TransactionBatch(transactions=transactions), model_version, None, keep_features=False, shed=False
+        )
+        anomalies_count = int((scores < 0).sum())
+        if anomalies_count > 0:
+            await log_to_compliance(
+                "anomaly.detected",
+                {"batch_id": batch_id, "anomalies": anomalies_count, "total_transactions": len(transaction_ids)}
+            )
+        return transaction_ids, scores, model_version, early_exits, cache_hit_ratio
+    
+    try:
+        await ingest_streams.serve(receive, websocket.send_text, score)
+    except WebSocketDisconnect:
+        pass
+    except ValidationError as e:
+        await close_stream(websocket, 1007, f"Invalid stream message: {e.errors(include_url=False)}")
+    except StreamProtocolError as e:
+        await close_stream(websocket, 1008, str(e))
+    except asyncio.TimeoutError:
+        await close_stream(websocket, 1011, "Anomaly scoring timed out")
+    except Exception as e:
+        logger.error(f"Error streaming anomalies: {e}")
+        await close_stream(websocket, 1011, f"Analysis failed: {str(e)}")
+    finally:
+        if admission is not None:
+            admission.exit(client)
+
+@app.get("/api/compliance/stats")
+async def compliance_shipping_stats():
+    """Queue, delivery and spool counters of the compliance shipper"""
+    return compliance_shipper.stats()
+
+@app.get("/api/encoding/stats")
+async def entity_encoding_stats():
+    """Hit and miss rates of the entity encoding cache"""
+    return entity_encoder.stats()
+
+@app.get("/api/velocity/stats")
+async def velocity_stats():
+    """Windows, feature names and tracked entities of the velocity store"""
+    if velocity_store is None:
+        return {"enabled": False}
+    return {"enabled": True, **velocity_store.stats()}
+
+@app.get("/api/analyze/cache/stats")
+async def result_cache_stats():
+    """Result cache occupancy and hit ratio of this worker"""
+    if result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **result_cache.stats()}
+
+@app.get("/api/analyze/batcher/stats")
+async def micro_batcher_stats():
+    """Queue depth and batch-size statistics of the anomaly micro-batcher"""
+    if micro_batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **micro_batcher.stats()}
+
+@app.get("/api/analyze/admission/stats")
+async def admission_stats():
+    """In-flight rows, queue and shed counters of admission control"""
+    if admission is None:
+        return {"enabled": False}
+    return {"enabled": True, **admission.stats()}
+
+@app.get("/api/analyze/stream/stats")
+async def ingest_stream_stats():
+    """Open WebSocket ingest streams, rows held for them and batching counters"""
+    return ingest_streams.stats()
+
+@app.post("/api/analyze/patterns", response_model=PatternResponse, openapi_extra=BATCH_REQUEST_BODY)
+async def find_patterns(
+    request: Request,
+    scope: str = "batch",
+    client: Optional[str] = Depends(admit_client),
+    batch: Union[TransactionBatch, ColumnarBatch] = Depends(read_batch)
+):
+    """Cluster a batch on its own (scope=batch) or within the recent window (scope=window)"""
     if not clustering_model:
         raise HTTPException(status_code=503, detail="Clustering model not available")
+    if scope not in ("batch", "window"):
+        raise HTTPException(status_code=400, detail="scope must be 'batch' or 'window'")
     
     start_time = time.time()
+    model_version = model_versions["clustering_model"]
+    fast = use_fast_response("patterns", request.headers, FAST_RESPONSE_ENDPOINTS)
+    binary = batch_response_format(request, batch)
     
+    # Clustering needs the whole batch, so it is admitted as one reservation
+    reserved = await admit_rows(batch_length(batch))
     try:
-        # Extract features from transactions
-        feature_matrix = np.array([extract_features(tx) for tx in batch.transactions])
+        # Extract features for the whole batch at once
+        transaction_ids, feature_matrix = batch_features(batch)
+        
+        if scope == "window":
+            try:
+                with metrics.stage("cluster"):
+                    await asyncio.to_thread(pattern_window.add, transaction_ids, feature_matrix)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            with metrics.stage("build"):
+                groups = await asyncio.to_thread(pattern_window.groups, transaction_ids)
+            return pattern_response(groups, start_time, model_version, fast, binary)
+        
+        if large_pattern_batch(feature_matrix):
+            # Grid-indexed neighbourhoods and segmented group statistics
+            with metrics.stage("cluster"), metrics.model_call("clustering_model", "grid_dbscan", model_version):
+                labels = await compute_pool.cluster_grid(
+                    feature_matrix, PATTERN_MAX_PAIRS, timeout=compute_timeout(request)
+                )
+            with metrics.stage("build"):
+                groups = await asyncio.to_thread(batch_groups, transaction_ids, feature_matrix, labels)
+            return pattern_response(groups, start_time, model_version, fast, binary)
         
         # Apply clustering
-        labels = clustering_model.fit_predict(feature_matrix)
+        with metrics.stage("cluster"), metrics.model_call("clustering_model", "fit_predict", model_version):
+            labels = await compute_pool.cluster(feature_matrix, timeout=compute_timeout(request))
         
-        # Organize transactions by cluster
-        clusters = {}
-        for i, label in enumerate(labels):
-            if label == -1:  # DBSCAN noise
-                continue
+        with metrics.stage("build"):
+            # Organize transactions by cluster
+            clusters = {}
+            for i, label in enumerate(labels):
+                if label == -1:  # DBSCAN noise
+                    continue
                 
-            if label not in clusters:
-                clusters[label] = []
-            clusters[label].append(i)
+                if label not in clusters:
+                    clusters[label] = []
+                clusters[label].append(i)
         
-        # Build response
-        groups = []
-        for group_id, indices in clusters.items():
-            if len(indices) < 2:  # Skip single-transaction clusters
-                continue
+            # Build response
+            groups = []
+            for group_id, indices in clusters.items():
+                if len(indices) < 2:  # Skip single-transaction clusters
+                    continue
                 
-            # Calculate centroid
-            centroid_features = feature_matrix[indices].mean(axis=0)
-            centroid = {f"feature_{i}": float(val) for i, val in enumerate(centroid_features)}
+                # Calculate centroid
+                centroid_features = feature_matrix[indices].mean(axis=0)
+                centroid = {f"feature_{i}": float(val) for i, val in enumerate(centroid_features)}
             
-            # Calculate density (average distance to centroid)
-            distances = np.linalg.norm(feature_matrix[indices] - centroid_features, axis=1)
-            density = float(np.mean(distances))
+                # Calculate density (average distance to centroid)
+                distances = np.linalg.norm(feature_matrix[indices] - centroid_features, axis=1)
+                density = float(np.mean(distances))
             
-            # Calculate risk score based on cluster properties
-            risk_score = 0.0
-            if len(indices) > 20:  # Large clusters might be suspicious
-                risk_score += 0.2
-            if density < 0.1:  # Very tight clusters might be suspicious
-                risk_score += 0.3
+                # Calculate risk score based on cluster properties
+                risk_score = 0.0
+                if len(indices) > 20:  # Large clusters might be suspicious
+                    risk_score += 0.2
+                if density < 0.1:  # Very tight clusters might be suspicious
+                    risk_score += 0.3
                 
-            groups.append(PatternGroup(
-                group_id=int(group_id),
-                transactions=[batch.transactions[i].id for i in indices],
-                centroid=centroid,
-                density=density,
-                risk_score=risk_score
-            ))
+                groups.append({
+                    "group_id": int(group_id),
+                    "transactions": [transaction_ids[i] for i in indices],
+                    "centroid": centroid,
+                    "density": density,
+                    "risk_score": risk_score
+                })
         
-        return PatternResponse(
-            groups=groups,
-            total_groups=len(groups),
-            processing_time=time.time() - start_time,
-            model_version="1.0.0"
-        )
+        return pattern_response(groups, start_time, model_version, fast, binary)
         
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Pattern analysis timed out")
     except Exception as e:
         logger.error(f"Error finding patterns: {e}")
         raise HTTPException(status_code=500, detail=f"Pattern analysis failed: {str(e)}")
+    finally:
+        release_rows(reserved)
+
+@app.get("/api/analyze/graph", response_model=GraphPatternResponse)
+async def graph_patterns(
+    window: Optional[float] = Query(None, gt=0),
+    until: Optional[str] = None,
+    min_counterparties: int = Query(10, ge=1),
+    max_cycle_length: int = Query(4, ge=2, le=8),
+    min_degree: int = Query(3, ge=2),
+    limit: int = Query(20, ge=1, le=1000)
+):
+    """Cycles, fan-out/fan-in accounts and dense subgraphs among the transactions of a time window"""
+    if transaction_graph is None:
+        raise HTTPException(status_code=404, detail="Transaction graph is disabled (SPOTTER_GRAPH)")
+    until_seconds = None
+    if until is not None:
+        try:
+            until_seconds = datetime.fromisoformat(until.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid until timestamp: {until}")
+    
+    start_time = time.time()
+    with metrics.stage("graph"):
+        result = await asyncio.to_thread(
+            transaction_graph.query,
+            window,
+            until_seconds,
+            min_counterparties,
+            max_cycle_length,
+            min_degree,
+            limit
+        )
+    for key in ("since", "until"):
+        result[key] = datetime.fromtimestamp(result[key], timezone.utc).isoformat()
+    return GraphPatternResponse(**result, processing_time=time.time() - start_time)
+
+@app.get("/api/analyze/graph/stats")
+async def transaction_graph_stats():
+    """Nodes, edges, memory and merge counters of the transaction graph"""
+    if transaction_graph is None:
+        return {"enabled": False}
+    return {"enabled": True, **transaction_graph.stats()}
+
+@app.get("/api/analyze/patterns/window", response_model=PatternResponse)
+async def window_patterns(request: Request):
+    """All groups currently in the sliding pattern window"""
+    start_time = time.time()
+    groups = await asyncio.to_thread(pattern_window.groups)
+    fast = use_fast_response("patterns", request.headers, FAST_RESPONSE_ENDPOINTS)
+    binary = response_format(request.headers.get("accept"), None)
+    return pattern_response(groups, start_time, model_versions["clustering_model"], fast, binary)
+
+@app.get("/api/analyze/patterns/window/stats")
+async def window_pattern_stats():
+    """Size, age and maintenance counters of the sliding pattern window"""
+    return pattern_window.stats()
 
 @app.post("/api/models/train", response_model=ModelTrainingResponse)
-async def train_model(request: ModelTrainingRequest, background_tasks: BackgroundTasks):
-    """Start asynchronous model training"""
-    job_id = f"training-{int(time.time())}"
-    
-    # In production, this would launch a proper training job
-    # Here we just simulate it
-    background_tasks.add_task(
-        simulate_model_training,
-        job_id,
-        request.model_type,
-        request.parameters
-    )
+async def train_model(request: ModelTrainingRequest):
+    """Start a training job on a dataset in DATA_DIR"""
+    try:
+        dataset_path = resolve_dataset(DATA_DIR, request.data_source)
+        job = training_jobs.submit(
+            request.model_type,
+            request.data_source,
+            dataset_path,
+            request.parameters,
+            on_complete=activate_trained_model
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return ModelTrainingResponse(
-        job_id=job_id,
-        status="started",
-        model_type=request.model_type,
+        job_id=job.job_id,
+        status=job.status,
+        model_type=job.model_type,
         estimated_completion=(
             datetime.now().timestamp() + 300
         ).__str__()
     )
 
-async def simulate_model_training(job_id: str, model_type: str, parameters: Dict[str, Any]):
-    """Simulate a model training job"""
-    logger.info(f"Started training job {job_id} for {model_type}")
+async def activate_trained_model(job: TrainingJob):
+    """Publish a completed job's artifact and drift baseline and serve them on every worker"""
+    model_name = segment_model_name(job.segment) if job.segment else MODEL_NAMES[job.model_type]
+    version = await asyncio.to_thread(
+        model_registry.publish,
+        model_name,
+        job.model_path,
+        {"job_id": job.job_id, "data_source": job.data_source, "rows": job.rows, "parameters": job.parameters},
+        job.baseline_path
+    )
+    model_registry.activate(model_name, version)
+    
+    job.model_version = version
+    job.model_path = model_registry.artifact_path(model_name, version)
+    if job.baseline_path is not None:
+        job.baseline_path = model_registry.baseline_path(model_name, version)
+    training_jobs.save(job)
     
-    # Simulate training time
-    await asyncio.sleep(5)
+    if job.segment:
+        # Segment models are loaded by the compute pool when first routed to
+        await refresh_segments()
+    elif await refresh_models():
+        await compute_pool.update_models(anomaly_model, clustering_model)
+        configure_pattern_window()
     
+    await log_to_compliance(
+        "model.trained",
+        {
+            "job_id": job.job_id,
+            "model_type": job.model_type,
+            "segment": job.segment,
+            "model_version": version,
+            "data_source": job.data_source,
+            "rows": job.rows,
+            "parameters": job.parameters
+        }
+    )
+
+@app.get("/api/models/versions")
+async def list_model_versions():
+    """Published versions of every model and the one each worker should serve"""
+    return {
+        model_type: {
+            "current": model_registry.current_version(model_name),
+            "serving": model_versions[model_name],
+            "versions": model_registry.versions(model_name)
+        }
+        for model_type, model_name in MODEL_NAMES.items()
+    }
+
+@app.get("/api/models/drift")
+async def model_drift():
+    """Drift of recent inputs and scores from the served anomaly model's training baseline"""
+    if drift_monitor is None:
+        return {"enabled": False}
+    return {"enabled": True, **drift_monitor.stats()}
+
+@app.get("/api/models/segments")
+async def model_segments():
+    """Segments routed to their own anomaly model, and the models resident in this worker"""
+    if segment_router is None:
+        return {"enabled": False}
+    return {"enabled": True, **segment_router.stats(), "models": compute_pool.segment_models.stats()}
+
+@app.post("/api/models/{model_type}/versions/{version}/activate")
+async def activate_model_version(model_type: str, version: str):
+    """Switch (or roll back) the served version of a model"""
+    if model_type not in MODEL_NAMES:
+        raise HTTPException(status_code=404, detail=f"Unknown model type {model_type}")
     try:
-        if model_type == "anomaly_detection":
-            global anomaly_model
-            
-            # Create a new model with the specified parameters
-            contamination = parameters.get("contamination", 0.01)
-            n_estimators = parameters.get("n_estimators", 100)
-            
-            new_model = IsolationForest(
-                n_estimators=n_estimators,
-                contamination=contamination,
-                random_state=42
-            )
-            
-            # In production, you'd fit the model on actual data here
-            # For now, we'll just save the initialized model
-            anomaly_model = new_model
-            joblib.dump(anomaly_model, os.path.join(MODEL_DIR, "anomaly_model.joblib"))
-            
-        elif model_type == "clustering":
-            global clustering_model
-            
-            eps = parameters.get("eps", 0.5)
-            min_samples = parameters.get("min_samples", 5)
-            
-            new_model = DBSCAN(
-                eps=eps,
-                min_samples=min_samples
-            )
-            
-            clustering_model = new_model
-            joblib.dump(clustering_model, os.path.join(MODEL_DIR, "clustering_model.joblib"))
-        
-        logger.info(f"Completed training job {job_id}")
-        
-        # Log to compliance
-        await log_to_compliance(
-            "model.trained",
-            {
-                "job_id": job_id,
-                "model_type": model_type,
-                "parameters": parameters
-            }
+        model_registry.activate(MODEL_NAMES[model_type], version)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    if await refresh_models():
+        await compute_pool.update_models(anomaly_model, clustering_model)
+        configure_pattern_window()
+    
+    await log_to_compliance("model.activated", {"model_type": model_type, "model_version": version})
+    return {"model_type": model_type, "version": version}
+
+def locate_bulk_job(job: BulkJob) -> Tuple[str, str]:
+    """Dataset and pinned model artifact of a bulk scoring job"""
+    model_path = model_registry.artifact_path(MODEL_NAMES["anomaly_detection"], job.model_version)
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"anomaly_model version {job.model_version} is no longer in the registry")
+    return resolve_dataset(DATA_DIR, job.data_source), model_path
+
+@app.post("/api/score/jobs")
+async def submit_bulk_scoring(request: BulkScoringRequest):
+    """Score a dataset in DATA_DIR in the background with the current anomaly model"""
+    version = model_registry.current_version(MODEL_NAMES["anomaly_detection"])
+    if version is None:
+        raise HTTPException(status_code=503, detail="No published anomaly model to score with")
+    try:
+        dataset_path = resolve_dataset(DATA_DIR, request.data_source)
+        job = bulk_jobs.submit(
+            request.data_source,
+            dataset_path,
+            request.parameters,
+            version,
+            model_registry.artifact_path(MODEL_NAMES["anomaly_detection"], version)
         )
-        
-    except Exception as e:
-        logger.error(f"Error in training job {job_id}: {e}")
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job.to_status()
+
+@app.get("/api/score/jobs/{job_id}")
+async def get_bulk_scoring_status(job_id: str):
+    """Progress, throughput and output location of a bulk scoring job"""
+    if not job_id.startswith("scoring-"):
+        raise HTTPException(status_code=400, detail="Invalid job ID format")
+    job = bulk_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Scoring job {job_id} not found")
+    return job.to_status()
+
+@app.post("/api/score/jobs/{job_id}/resume")
+async def resume_bulk_scoring(job_id: str):
+    """Continue a failed or interrupted bulk scoring job from its checkpoint"""
+    if not job_id.startswith("scoring-"):
+        raise HTTPException(status_code=400, detail="Invalid job ID format")
+    job = bulk_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Scoring job {job_id} not found")
+    try:
+        job = bulk_jobs.resume(job_id, *locate_bulk_job(job))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return job.to_status()
 
 @app.get("/api/models/status/{job_id}")
 async def get_training_status(job_id: str):
     """Check status of a training job"""
-    # In production, you would check actual job status
-    # Here we just simulate completion
-    
     if not job_id.startswith("training-"):
         raise HTTPException(status_code=400, detail="Invalid job ID format")
     
-    job_timestamp = int(job_id.split("-")[1])
-    current_time = int(time.time())
-    
-    if current_time - job_timestamp < 10:
-        status = "running"
-        progress = min(100, (current_time - job_timestamp) * 10)
-    else:
-        status = "completed"
-        progress = 100
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Training job {job_id} not found")
     
-    return {
-        "job_id": job_id,
-        "status": status,
-        "progress": progress,
-        "start_time": datetime.fromtimestamp(job_timestamp).isoformat(),
-        "estimated_completion": datetime.fromtimestamp(job_timestamp + 10).isoformat()
-    }
+    return job.to_status()
 
 # Start server when run directly
 if __name__ == "__main__":
+    import uvicorn
+    
     port = int(os.environ.get("PORT", 4097))
     uvicorn.run("spotter:app", host="0.0.0.0", port=port, reload=True)
\ No newline at end of file
@@ -0,0 +1,239 @@
+"""
+Admission control for the Azora AI Spotter's analyze endpoints.
+
+Without limits a few clients sending very large batches exhaust memory and
+push every caller into timeouts. AdmissionController bounds the rows being
+processed at once with an in-flight row budget: requests wait in line for
+their share, and anomaly batches larger than chunk_rows are admitted and
+scored one chunk at a time. Each client may have a limited number of
+requests in flight. A request that would wait longer than the queue-wait
+SLO is rejected up front with a Retry-After hint instead of timing out
+later. The wait is estimated from the rows ahead of it and the rate at
+which the budget drained while it was saturated. Rows are only known once
+the body is parsed, so bodies are capped in bytes as they are read: one
+larger than max_body_bytes is rejected from its Content-Length, or as soon
+as a streamed body passes the cap, before it is held in memory.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# Saturated time the drain rate is measured over before each update
+RATE_SAMPLE_SECONDS = 0.2
+# Weight of the newest drain rate sample
+RATE_SMOOTHING = 0.3
+# Body bytes allowed per row of the budget when no body cap is configured
+BODY_BYTES_PER_ROW = 1024
+
+
+class Overloaded(Exception):
+    """A request shed by admission control"""
+
+    def __init__(self, reason: str, message: str, retry_after: float):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class BodyTooLarge(Exception):
+    """A request body over the admission byte cap"""
+
+
+class AdmissionController:
+    """In-flight row budget, per-client concurrency and early load shedding"""
+
+    def __init__(
+        self,
+        max_rows: int,
+        client_concurrency: int = 8,
+        chunk_rows: int = 50000,
+        slo: float = 1.0,
+        max_body_bytes: int = 0,
+    ):
+        if max_rows <= 0:
+            raise ValueError("max_rows must be positive")
+        self.max_rows = max_rows
+        self.client_concurrency = client_concurrency
+        self.chunk_rows = max(1, min(chunk_rows, max_rows))
+        self.slo = slo
+        self.max_body_bytes = max_body_bytes if max_body_bytes > 0 else max_rows * BODY_BYTES_PER_ROW
+
+        self._in_flight_rows = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+        self._queued_rows = 0
+        self._clients: Dict[str, int] = {}
+
+        # Rows released per second of saturated time (None until measured)
+        self._rate: Optional[float] = None
+        self._sample_rows = 0
+        self._sample_seconds = 0.0
+        self._saturated_since: Optional[float] = None
+
+        self._admitted = 0
+        self._shed = {"client_limit": 0, "queue_wait": 0, "body_size": 0}
+        self._split_requests = 0
+        self._chunks = 0
+        self._waited_requests = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+
+    @classmethod
+    def from_env(cls) -> Optional["AdmissionController"]:
+        """Build a controller if SPOTTER_ADMISSION_MAX_ROWS is set, otherwise None"""
+        max_rows = int(os.environ.get("SPOTTER_ADMISSION_MAX_ROWS", "0"))
+        if max_rows <= 0:
+            return None
+        return cls(
+            max_rows,
+            client_concurrency=int(os.environ.get("SPOTTER_ADMISSION_CLIENT_CONCURRENCY", "8")),
+            chunk_rows=int(os.environ.get("SPOTTER_ADMISSION_CHUNK_ROWS", "50000")),
+            slo=float(os.environ.get("SPOTTER_ADMISSION_SLO_MS", "1000")) / 1000,
+            max_body_bytes=int(os.environ.get("SPOTTER_ADMISSION_MAX_BODY_BYTES", "0")),
+        )
+
+    def estimated_wait(self, rows: int) -> float:
+        """Seconds a request for rows would wait behind the work already admitted or queued"""
+        backlog = self._queued_rows + self._in_flight_rows + rows - self.max_rows
+        if backlog <= 0 or not self._rate:
+            return 0.0
+        return backlog / self._rate
+
+    def enter(self, client: str):
+        """Take one of the client's request slots, or shed the request before its body is read"""
+        active = self._clients.get(client, 0)
+        if self.client_concurrency > 0 and active >= self.client_concurrency:
+            self._shed["client_limit"] += 1
+            raise Overloaded("client_limit", f"Too many concurrent requests from {client}", 1)
+        wait = self.estimated_wait(0)
+        if wait > self.slo:
+            self._shed["queue_wait"] += 1
+            raise Overloaded("queue_wait", f"Server overloaded, estimated queue wait {wait:.1f}s", wait)
+        self._clients[client] = active + 1
+        self._admitted += 1
+
+    def check_body(self, size: int):
+        """Reject a body once its declared or received size passes the byte cap"""
+        if size > self.max_body_bytes:
+            self._shed["body_size"] += 1
+            raise BodyTooLarge(f"Request body exceeds {self.max_body_bytes} bytes")
+
+    def exit(self, client: str):
+        active = self._clients.get(client, 0) - 1
+        if active > 0:
+            self._clients[client] = active
+        else:
+            self._clients.pop(client, None)
+
+    def chunks(self, rows: int) -> List[Tuple[int, int]]:
+        """(start, stop) row spans a batch is admitted and scored in"""
+        spans = [(start, min(start + self.chunk_rows, rows)) for start in range(0, rows, self.chunk_rows)]
+        if len(spans) > 1:
+            self._split_requests += 1
+        return spans or [(0, 0)]
+
+    async def acquire(self, rows: int, check: bool = True) -> int:
+        """Reserve rows of the budget, waiting in line; returns the rows to release.
+
+        A request larger than the whole budget reserves all of it and runs
+        alone. With check, a request whose estimated wait exceeds the SLO is
+        shed instead of queued; later chunks of an admitted request skip it.
+        """
+        rows = max(1, min(rows, self.max_rows))
+        if check:
+            wait = self.estimated_wait(rows)
+            if wait > self.slo:
+                self._shed["queue_wait"] += 1
+                raise Overloaded("queue_wait", f"Server overloaded, estimated queue wait {wait:.1f}s", wait)
+        self._chunks += 1
+
+        if not self._waiters and self._in_flight_rows + rows <= self.max_rows:
+            self._in_flight_rows += rows
+            return rows
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (rows, future)
+        self._waiters.append(entry)
+        self._queued_rows += rows
+        self._waited_requests += 1
+        self._mark_saturation()
+        start = time.perf_counter()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just before the caller gave up
+                self.release(rows)
+            else:
+                self._waiters.remove(entry)
+                self._queued_rows -= rows
+                self._mark_saturation()
+                self._wake()
+            raise
+        wait = time.perf_counter() - start
+        self._queue_wait_total += wait
+        self._queue_wait_max = max(self._queue_wait_max, wait)
+        return rows
+
+    def release(self, rows: int):
+        self._measure()
+        self._in_flight_rows -= rows
+        if self._saturated_since is not None:
+            self._sample_rows += rows
+        self._wake()
+        self._mark_saturation()
+
+    def _wake(self):
+        while self._waiters and self._in_flight_rows + self._waiters[0][0] <= self.max_rows:
+            rows, future = self._waiters.popleft()
+            self._queued_rows -= rows
+            self._in_flight_rows += rows
+            future.set_result(None)
+
+    def _measure(self):
+        """Fold saturated time into the drain rate sample"""
+        if self._saturated_since is None:
+            return
+        now = time.perf_counter()
+        self._sample_seconds += now - self._saturated_since
+        self._saturated_since = now
+        if self._sample_seconds >= RATE_SAMPLE_SECONDS and self._sample_rows:
+            sample = self._sample_rows / self._sample_seconds
+            self._rate = sample if self._rate is None else (1 - RATE_SMOOTHING) * self._rate + RATE_SMOOTHING * sample
+            self._sample_rows = 0
+            self._sample_seconds = 0.0
+
+    def _mark_saturation(self):
+        """Only time with requests waiting shows how fast the budget drains"""
+        if self._waiters and self._saturated_since is None:
+            self._saturated_since = time.perf_counter()
+        elif not self._waiters and self._saturated_since is not None:
+            self._measure()
+            self._saturated_since = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Budget use, queue and shed counters"""
+        return {
+            "max_rows": self.max_rows,
+            "client_concurrency": self.client_concurrency,
+            "chunk_rows": self.chunk_rows,
+            "slo_ms": self.slo * 1000,
+            "max_body_bytes": self.max_body_bytes,
+            "in_flight_rows": self._in_flight_rows,
+            "queued_requests": len(self._waiters),
+            "queued_rows": self._queued_rows,
+            "active_clients": len(self._clients),
+            "admitted": self._admitted,
+            "shed": dict(self._shed),
+            "waited_requests": self._waited_requests,
+            "split_requests": self._split_requests,
+            "chunks": self._chunks,
+            "queue_wait_avg_ms": (
+                self._queue_wait_total / self._waited_requests * 1000 if self._waited_requests else 0.0
+            ),
+            "queue_wait_max_ms": self._queue_wait_max * 1000,
+            "drain_rows_per_second": self._rate,
+        }
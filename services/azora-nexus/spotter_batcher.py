@@ -0,0 +1,153 @@
+"""
+Micro-batching scheduler for the Azora AI Spotter.
+
+Small anomaly requests each pay the fixed cost of a full decision_function
+call. MicroBatcher collects concurrent requests for a short window (or until
+enough rows are pending), scores them in one matrix call and hands every
+caller back its own slice of the scores.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ScoreFn = Callable[[np.ndarray], Awaitable[np.ndarray]]
+
+
+class MicroBatcher:
+    """Coalesces concurrent small scoring requests into one model call"""
+
+    def __init__(
+        self,
+        score_fn: ScoreFn,
+        window: float = 0.002,
+        max_rows: int = 1024,
+        max_request_rows: int = 64,
+    ):
+        self.score_fn = score_fn
+        self.window = window
+        self.max_rows = max_rows
+        self.max_request_rows = max_request_rows
+
+        self._pending: List[Tuple[np.ndarray, asyncio.Future, float]] = []
+        self._pending_rows = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+        self._batches = 0
+        self._batched_rows = 0
+        self._batched_requests = 0
+        self._max_batch_rows = 0
+        self._batch_size_histogram: Dict[int, int] = {}
+        self._flush_reasons = {"window": 0, "size": 0}
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+
+    @classmethod
+    def from_env(cls, score_fn: ScoreFn) -> Optional["MicroBatcher"]:
+        """Build a batcher if SPOTTER_MICROBATCH is enabled, otherwise None"""
+        if os.environ.get("SPOTTER_MICROBATCH", "false").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            score_fn,
+            window=float(os.environ.get("SPOTTER_MICROBATCH_WINDOW_MS", "2")) / 1000,
+            max_rows=int(os.environ.get("SPOTTER_MICROBATCH_MAX_ROWS", "1024")),
+            max_request_rows=int(os.environ.get("SPOTTER_MICROBATCH_MAX_REQUEST_ROWS", "64")),
+        )
+
+    def accepts(self, rows: int) -> bool:
+        """Whether a request of this size should go through the batcher"""
+        return 0 < rows <= self.max_request_rows
+
+    async def score(self, feature_matrix: np.ndarray) -> np.ndarray:
+        """Queue a feature matrix and wait for its scores"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((feature_matrix, future, time.perf_counter()))
+        self._pending_rows += len(feature_matrix)
+
+        if self._pending_rows >= self.max_rows:
+            self._flush("size")
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush, "window")
+
+        return await future
+
+    def _flush(self, reason: str):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        pending = [item for item in self._pending if not item[1].done()]
+        self._pending = []
+        self._pending_rows = 0
+        if not pending:
+            return
+
+        now = time.perf_counter()
+        rows = sum(len(matrix) for matrix, _, _ in pending)
+        waits = [now - queued_at for _, _, queued_at in pending]
+        self._batches += 1
+        self._batched_rows += rows
+        self._batched_requests += len(pending)
+        self._max_batch_rows = max(self._max_batch_rows, rows)
+        bucket = 1 << (rows - 1).bit_length()
+        self._batch_size_histogram[bucket] = self._batch_size_histogram.get(bucket, 0) + 1
+        self._flush_reasons[reason] += 1
+        self._queue_wait_total += sum(waits)
+        self._queue_wait_max = max(self._queue_wait_max, max(waits))
+
+        # Requests with caller-supplied features of another width cannot share
+        # a matrix, so each feature width is scored as its own batch.
+        groups: Dict[Tuple[int, ...], list] = {}
+        for item in pending:
+            groups.setdefault(item[0].shape[1:], []).append(item)
+        for group in groups.values():
+            task = asyncio.ensure_future(self._run_batch(group))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, pending: List[Tuple[np.ndarray, asyncio.Future, float]]):
+        try:
+            scores = await self.score_fn(np.vstack([matrix for matrix, _, _ in pending]))
+        except Exception as e:
+            logger.error(f"Micro-batch of {len(pending)} requests failed: {e}")
+            for _, future, _ in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offset = 0
+        for matrix, future, _ in pending:
+            if not future.done():
+                future.set_result(scores[offset:offset + len(matrix)])
+            offset += len(matrix)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and batch-size statistics for tuning the window"""
+        return {
+            "window_ms": self.window * 1000,
+            "max_rows": self.max_rows,
+            "max_request_rows": self.max_request_rows,
+            "queue_depth": len(self._pending),
+            "queue_rows": self._pending_rows,
+            "batches": self._batches,
+            "requests": self._batched_requests,
+            "rows": self._batched_rows,
+            "mean_batch_rows": self._batched_rows / self._batches if self._batches else 0.0,
+            "mean_batch_requests": self._batched_requests / self._batches if self._batches else 0.0,
+            "max_batch_rows": self._max_batch_rows,
+            "flushed_by_window": self._flush_reasons["window"],
+            "flushed_by_size": self._flush_reasons["size"],
+            "mean_queue_wait_ms": (
+                self._queue_wait_total / self._batched_requests * 1000 if self._batched_requests else 0.0
+            ),
+            "max_queue_wait_ms": self._queue_wait_max * 1000,
+            # Batches per power-of-two row bucket ("8" counts batches of 5-8 rows)
+            "batch_rows_histogram": {str(k): v for k, v in sorted(self._batch_size_histogram.items())},
+        }
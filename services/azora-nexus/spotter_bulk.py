@@ -0,0 +1,463 @@
+"""
+Bulk scoring jobs for the Azora AI Spotter.
+
+Rescoring history (tens of millions of rows) does not fit the synchronous
+JSON endpoints. A bulk job streams a dataset from DATA_DIR in chunks in a
+child process, builds features there and scores the chunks in parallel on a
+process pool, keeping at most a few chunks in flight so memory does not
+depend on the size of the file. Each scored chunk is written as its own
+columnar part file (Parquet, or NPZ without pyarrow) and recorded in a
+checkpoint, so a job interrupted by a crash or restart resumes from the
+chunks it had not finished. Jobs are pinned to the anomaly model version
+that was current when they were submitted.
+"""
+
+import asyncio
+import fcntl
+import importlib.util
+import json
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from spotter_training import _peak_memory_mb
+from spotter_velocity import parse_windows
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+# Statuses of jobs that should be running; picked up again after a restart
+ACTIVE_STATUSES = ("queued", "running")
+
+# Job parameters the child process reads as counts
+COUNT_PARAMETERS = ("chunk_rows", "workers", "max_inflight_chunks", "entity_cache_size", "velocity_capacity")
+
+
+@dataclass
+class BulkJob:
+    job_id: str
+    data_source: str
+    parameters: Dict[str, Any]
+    model_version: str
+    output_dir: str
+    status: str = "queued"
+    progress: float = 0.0
+    rows: int = 0
+    chunks: int = 0
+    anomalies: int = 0
+    # Rows already scored by an earlier attempt when this one started
+    resumed_rows: int = 0
+    rows_per_second: float = 0.0
+    attempts: int = 0
+    output_format: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    peak_memory_mb: Optional[float] = None
+    error: Optional[str] = None
+
+    def to_status(self) -> Dict[str, Any]:
+        """Status document served by /api/score/jobs/{job_id}"""
+        status = asdict(self)
+        end = self.finished_at or time.time()
+        status["running_seconds"] = end - self.started_at if self.started_at else 0.0
+        status["progress"] = round(self.progress * 100, 1)
+        return status
+
+
+def output_format() -> str:
+    """Parquet when pyarrow is installed, NPZ otherwise"""
+    return "parquet" if importlib.util.find_spec("pyarrow") is not None else "npz"
+
+
+def read_checkpoint(output_dir: str) -> Dict[str, Dict[str, int]]:
+    """Chunk index -> {rows, anomalies} of every part already written"""
+    try:
+        with open(os.path.join(output_dir, CHECKPOINT_FILE)) as f:
+            return json.load(f)["chunks"]
+    except FileNotFoundError:
+        return {}
+
+
+def _write_checkpoint(output_dir: str, chunks: Dict[str, Dict[str, int]]):
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({"chunks": chunks}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _write_part(path: str, fmt: str, ids: List[str], scores: np.ndarray):
+    """One chunk's results as a columnar file, written atomically"""
+    from spotter_features import risk_levels
+
+    columns = {
+        "id": np.asarray(ids, dtype=str),
+        "anomaly_score": scores,
+        "is_anomaly": scores < 0,
+        "risk_level": risk_levels(scores),
+    }
+    tmp_path = f"{path}.tmp"
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        pq.write_table(pa.table(columns), tmp_path)
+    else:
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **columns)
+    os.replace(tmp_path, path)
+
+
+# Model held by each scoring process of a bulk job
+_bulk_model = {"anomaly": None}
+
+
+def _init_bulk_worker(model_path: str):
+    import joblib
+
+    _bulk_model["anomaly"] = joblib.load(model_path, mmap_mode="r")
+
+
+def _score_chunk(features: np.ndarray) -> np.ndarray:
+    return _bulk_model["anomaly"].decision_function(features)
+
+
+def run_bulk_job(spec: Dict[str, Any], progress: "multiprocessing.Queue"):
+    """Child-process entry point: stream, score and write one dataset"""
+    from spotter_datasets import frame_features, iter_chunks
+    from spotter_encoding import EntityEncoder
+    from spotter_velocity import VelocityStore
+
+    executor = None
+    try:
+        parameters = spec["parameters"]
+        output_dir = spec["output_dir"]
+        fmt = spec["output_format"]
+        workers = int(spec["workers"])
+        max_inflight = int(parameters.get("max_inflight_chunks", 2 * workers))
+
+        done = read_checkpoint(output_dir)
+        rows = sum(chunk["rows"] for chunk in done.values())
+        anomalies = sum(chunk["anomalies"] for chunk in done.values())
+        scored = 0
+        progress.put({"event": "resumed", "rows": rows, "chunks": len(done), "anomalies": anomalies})
+
+        encoder = EntityEncoder(capacity=int(parameters.get("entity_cache_size", 100000)))
+        # Velocity features depend on every earlier row, so finished chunks
+        # are still replayed through the store, just not scored again
+        velocity = None
+        if spec.get("velocity_windows"):
+            velocity = VelocityStore(
+                spec["velocity_windows"], capacity=int(parameters.get("velocity_capacity", 1000000))
+            )
+
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_bulk_worker,
+            initargs=(spec["model_path"],),
+        )
+        pending = {}
+        fraction = 0.0
+
+        def collect(futures):
+            nonlocal rows, anomalies, scored
+            for future in futures:
+                index, ids = pending.pop(future)
+                scores = future.result()
+                _write_part(os.path.join(output_dir, f"part-{index:06d}.{fmt}"), fmt, ids, scores)
+                flagged = int((scores < 0).sum())
+                done[str(index)] = {"rows": len(ids), "anomalies": flagged}
+                _write_checkpoint(output_dir, done)
+                rows += len(ids)
+                scored += len(ids)
+                anomalies += flagged
+            progress.put({
+                "event": "progress",
+                "progress": fraction,
+                "rows": rows,
+                "scored": scored,
+                "chunks": len(done),
+                "anomalies": anomalies,
+            })
+
+        for index, (chunk, fraction) in enumerate(iter_chunks(spec["path"], int(parameters.get("chunk_rows", 50000)))):
+            if str(index) in done and velocity is None:
+                continue
+            ids, features = frame_features(chunk, encoder, velocity)
+            if str(index) in done:
+                continue
+            while len(pending) >= max_inflight:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+            pending[executor.submit(_score_chunk, features)] = (index, ids)
+
+        fraction = 1.0
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(finished)
+
+        progress.put({
+            "event": "completed",
+            "rows": rows,
+            "scored": scored,
+            "chunks": len(done),
+            "anomalies": anomalies,
+            "peak_memory_mb": _peak_memory_mb(),
+        })
+    except Exception as e:
+        progress.put({"event": "failed", "error": f"{type(e).__name__}: {e}", "peak_memory_mb": _peak_memory_mb()})
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def validate_parameters(parameters: Dict[str, Any]):
+    """Reject job parameters the child process would fail on or hang with"""
+    for name in COUNT_PARAMETERS:
+        value = parameters.get(name)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < 1):
+            raise ValueError(f"{name} must be a positive integer")
+    windows = parameters.get("velocity_windows")
+    if windows is None:
+        return
+    try:
+        windows = parse_windows(windows) if isinstance(windows, str) else [float(window) for window in windows]
+    except (TypeError, ValueError):
+        raise ValueError("velocity_windows must be a list or comma-separated string of seconds")
+    if not all(math.isfinite(window) and window > 0 for window in windows):
+        raise ValueError("velocity_windows must be positive numbers of seconds")
+
+
+class BulkJobs:
+    """Registry and runner of bulk scoring jobs"""
+
+    def __init__(
+        self,
+        jobs_dir: str,
+        output_root: str,
+        max_concurrent: int = 1,
+        workers: Optional[int] = None,
+        velocity_windows: Sequence[float] = (),
+    ):
+        self.jobs_dir = jobs_dir
+        self.output_root = output_root
+        self.workers = workers or os.cpu_count() or 1
+        self.velocity_windows = list(velocity_windows)
+        self.jobs: Dict[str, BulkJob] = {}
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._tasks = set()
+        os.makedirs(jobs_dir, exist_ok=True)
+        os.makedirs(output_root, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, data_dir: str) -> "BulkJobs":
+        workers = os.environ.get("SPOTTER_BULK_WORKERS")
+        return cls(
+            jobs_dir=os.path.join(data_dir, "scoring_jobs"),
+            output_root=os.path.join(data_dir, "scores"),
+            max_concurrent=int(os.environ.get("SPOTTER_BULK_CONCURRENCY", "1")),
+            workers=int(workers) if workers else None,
+            velocity_windows=parse_windows(os.environ.get("SPOTTER_VELOCITY_WINDOWS", "")),
+        )
+
+    def save(self, job: BulkJob):
+        path = os.path.join(self.jobs_dir, f"{job.job_id}.json")
+        with open(f"{path}.{os.getpid()}.tmp", "w") as f:
+            json.dump(asdict(job), f, default=str)
+        os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+    def _load(self, job_id: str) -> Optional[BulkJob]:
+        path = os.path.join(self.jobs_dir, f"{os.path.basename(job_id)}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return BulkJob(**json.load(f))
+
+    def get(self, job_id: str) -> Optional[BulkJob]:
+        """A job run by this process, or the last state saved by whichever process runs it"""
+        if job_id in self.jobs:
+            return self.jobs[job_id]
+        return self._load(job_id)
+
+    def submit(self, data_source: str, dataset_path: str, parameters: Dict[str, Any], model_version: str, model_path: str) -> BulkJob:
+        """Register a job and start it in the background"""
+        validate_parameters(parameters)
+        job_id = f"scoring-{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        job = BulkJob(
+            job_id=job_id,
+            data_source=data_source,
+            parameters=parameters,
+            model_version=model_version,
+            output_dir=os.path.join(self.output_root, job_id),
+            output_format=output_format(),
+        )
+        os.makedirs(job.output_dir, exist_ok=True)
+        self._start(job, self._lock(job), dataset_path, model_path)
+        return job
+
+    def resume(self, job_id: str, dataset_path: str, model_path: str) -> BulkJob:
+        """Restart a failed or interrupted job from its checkpoint"""
+        job = self._load(job_id)
+        if job is None:
+            raise FileNotFoundError(f"Scoring job {job_id} not found")
+        if job.status == "completed":
+            raise ValueError(f"Scoring job {job_id} already completed")
+        lock = self._lock(job)
+        if lock is None:
+            raise ValueError(f"Scoring job {job_id} is running in another process")
+        job.error = None
+        self._start(job, lock, dataset_path, model_path)
+        return job
+
+    def interrupted(self) -> List[BulkJob]:
+        """Saved jobs that were queued or running when their process stopped"""
+        jobs = []
+        for filename in sorted(os.listdir(self.jobs_dir)):
+            if not filename.endswith(".json"):
+                continue
+            job = self._load(filename[:-len(".json")])
+            if job is not None and job.status in ACTIVE_STATUSES and job.job_id not in self.jobs:
+                jobs.append(job)
+        return jobs
+
+    @staticmethod
+    def _lock(job: BulkJob):
+        """Exclusive lock on a job's output, or None if another process holds it.
+
+        The lock lasts as long as the returned file stays open and is
+        released by the OS if the holding process dies.
+        """
+        lock = open(os.path.join(job.output_dir, ".lock"), "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+        return lock
+
+    def _start(self, job: BulkJob, lock, dataset_path: str, model_path: str):
+        job.status = "queued"
+        self.jobs[job.job_id] = job
+        self.save(job)
+        task = asyncio.create_task(self._run(job, lock, dataset_path, model_path))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def resume_interrupted(self, locate) -> List[BulkJob]:
+        """Resume jobs left queued or running by a stopped process.
+
+        locate(job) returns the (dataset_path, model_path) of a job. Jobs
+        another live process holds the lock of are left to it.
+        """
+        resumed = []
+        for job in self.interrupted():
+            lock = self._lock(job)
+            if lock is None:
+                continue
+            try:
+                dataset_path, model_path = locate(job)
+            except Exception as e:
+                lock.close()
+                job.status = "failed"
+                job.error = f"Cannot resume: {e}"
+                self.save(job)
+                continue
+            logger.info(f"Resuming interrupted scoring job {job.job_id}")
+            self._start(job, lock, dataset_path, model_path)
+            resumed.append(job)
+        return resumed
+
+    async def _run(self, job: BulkJob, lock, dataset_path: str, model_path: str):
+        try:
+            async with self._slots:
+                await self._execute(job, dataset_path, model_path)
+        except Exception as e:
+            job.status = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+            self.save(job)
+            logger.error(f"Scoring job {job.job_id} failed: {job.error}")
+        finally:
+            lock.close()
+
+    async def _execute(self, job: BulkJob, dataset_path: str, model_path: str):
+        job.status = "running"
+        job.attempts += 1
+        job.started_at = time.time()
+        job.finished_at = None
+        self.save(job)
+
+        spec = {
+            "path": dataset_path,
+            "parameters": job.parameters,
+            "model_path": model_path,
+            "output_dir": job.output_dir,
+            "output_format": job.output_format,
+            "workers": int(job.parameters.get("workers", self.workers)),
+            "velocity_windows": job.parameters.get("velocity_windows", self.velocity_windows),
+        }
+        if isinstance(spec["velocity_windows"], str):
+            spec["velocity_windows"] = parse_windows(spec["velocity_windows"])
+
+        context = multiprocessing.get_context("spawn")
+        progress = context.Queue()
+        process = context.Process(target=run_bulk_job, args=(spec, progress), name=f"spotter-{job.job_id}")
+        process.start()
+        logger.info(f"Started scoring job {job.job_id} (pid {process.pid}, attempt {job.attempts})")
+
+        result = await self._follow(job, process, progress)
+        await asyncio.to_thread(process.join)
+
+        job.finished_at = time.time()
+        job.peak_memory_mb = result.get("peak_memory_mb")
+        if result.get("event") == "completed":
+            self._apply(job, result)
+            job.progress = 1.0
+            job.status = "completed"
+            logger.info(f"Completed scoring job {job.job_id}: {job.rows} rows, {job.anomalies} anomalies")
+        else:
+            job.status = "failed"
+            job.error = result.get("error") or f"Scoring process exited with code {process.exitcode}"
+            logger.error(f"Scoring job {job.job_id} failed: {job.error}")
+        self.save(job)
+
+    def _apply(self, job: BulkJob, message: Dict[str, Any]):
+        job.rows = message["rows"]
+        job.chunks = message["chunks"]
+        job.anomalies = message["anomalies"]
+        if "scored" in message:
+            elapsed = time.time() - job.started_at
+            job.rows_per_second = message["scored"] / elapsed if elapsed > 0 else 0.0
+
+    async def _follow(self, job: BulkJob, process, progress) -> Dict[str, Any]:
+        """Apply progress messages until the child reports a result or dies"""
+        while True:
+            try:
+                message = await asyncio.to_thread(progress.get, True, 0.5)
+            except queue.Empty:
+                if process.is_alive():
+                    continue
+                try:
+                    message = progress.get_nowait()
+                except queue.Empty:
+                    return {"event": "failed"}
+
+            if message["event"] == "resumed":
+                job.resumed_rows = message["rows"]
+                self._apply(job, message)
+            elif message["event"] == "progress":
+                job.progress = message["progress"]
+                self._apply(job, message)
+            else:
+                return message
+            self.save(job)
@@ -0,0 +1,210 @@
+"""
+Idempotent result cache for the Azora AI Spotter.
+
+Upstream systems retry and re-send overlapping windows, so the same
+transactions are scored again and again. ResultCache remembers anomaly
+scores under a 64-bit key derived from the transaction id, a digest of
+everything its feature vector is built from, the segment fields it is
+routed on (see spotter_segments) and the model version, so a
+repeated transaction skips feature extraction and scoring, and a new model
+version never sees scores from an old one.
+
+Entries live in a fixed-size set-associative table (a bucket of `ways`
+slots per key) with a TTL; a full bucket evicts its least recently used
+slot. The table is a NumPy structured array, so whole batches are looked up
+and stored with vectorized indexing. Given a path, the table is a
+memory-mapped file (for example under /dev/shm) that every uvicorn worker
+on the host shares. Slots carry their key twice and writers clear the
+second copy while updating; readers check both copies again after taking
+the score, so readers in other processes see either a whole entry or a
+miss.
+"""
+
+import hashlib
+import itertools
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SLOT_DTYPE = np.dtype([
+    ("key", "<u8"),
+    ("score", "<f8"),
+    ("expires", "<f8"),
+    ("used", "<f8"),
+    # Equals key once the slot is fully written
+    ("check", "<u8"),
+])
+
+_MAGIC = int.from_bytes(b"SPOTRC01", "little")
+_HEADER_BYTES = 64
+
+
+def _digest(text: str) -> int:
+    key = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    # Zero marks an empty slot
+    return key or 1
+
+
+def transaction_keys(
+    model_version: str,
+    ids: Iterable[str],
+    amounts: Iterable[float],
+    timestamps: Iterable[str],
+    senders: Iterable[str],
+    recipients: Iterable[str],
+    overrides: Iterable[Optional[dict]],
+    segments: Optional[Iterable[str]] = None,
+) -> np.ndarray:
+    """Cache keys of transactions from the fields their features are built from and their segment, if routed"""
+    if segments is None:
+        segments = itertools.repeat("")
+    return np.fromiter(
+        (
+            _digest(
+                f"{model_version}\x1f{tx_id}\x1f{amount!r}\x1f{timestamp}\x1f{sender}\x1f{recipient}\x1f{features!r}"
+                f"\x1f{segment}"
+            )
+            for tx_id, amount, timestamp, sender, recipient, features, segment in zip(
+                ids, amounts, timestamps, senders, recipients, overrides, segments
+            )
+        ),
+        dtype=np.uint64,
+    )
+
+
+def feature_keys(model_version: str, ids: Iterable[str], features: np.ndarray) -> np.ndarray:
+    """Cache keys of rows given as precomputed feature vectors"""
+    rows = np.ascontiguousarray(features, dtype="<f8")
+    return np.fromiter(
+        (
+            _digest(f"{model_version}\x1f{tx_id}\x1f{row.tobytes().hex()}")
+            for tx_id, row in zip(ids, rows)
+        ),
+        dtype=np.uint64,
+    )
+
+
+class ResultCache:
+    """Bounded TTL cache of anomaly scores, per process or shared through a file"""
+
+    def __init__(self, capacity: int, ttl: float = 600.0, path: Optional[str] = None, ways: int = 8):
+        self.ways = ways
+        self.buckets = max(1, -(-capacity // ways))
+        self.capacity = self.buckets * ways
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self._table = self._open_file(path)
+        else:
+            self._table = np.zeros((self.buckets, ways), dtype=SLOT_DTYPE)
+
+    @classmethod
+    def from_env(cls) -> Optional["ResultCache"]:
+        """The configured cache, or None when SPOTTER_RESULT_CACHE_SIZE is 0"""
+        capacity = int(os.environ.get("SPOTTER_RESULT_CACHE_SIZE", "0"))
+        if capacity <= 0:
+            return None
+        return cls(
+            capacity=capacity,
+            ttl=float(os.environ.get("SPOTTER_RESULT_CACHE_TTL", "600")),
+            path=os.environ.get("SPOTTER_RESULT_CACHE_PATH") or None,
+        )
+
+    def _open_file(self, path: str) -> np.ndarray:
+        """Map the shared table, creating it if missing or of another size"""
+        header = np.array([_MAGIC, self.buckets, self.ways], dtype="<u8")
+        size = _HEADER_BYTES + self.capacity * SLOT_DTYPE.itemsize
+        try:
+            if os.path.getsize(path) == size:
+                existing = np.fromfile(path, dtype="<u8", count=len(header))
+                if np.array_equal(existing, header):
+                    return np.memmap(path, dtype=SLOT_DTYPE, mode="r+", offset=_HEADER_BYTES,
+                                     shape=(self.buckets, self.ways))
+        except OSError:
+            pass
+
+        # Written aside and renamed so other workers never map a partial file
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header.tobytes().ljust(_HEADER_BYTES, b"\0"))
+            f.truncate(size)
+        os.replace(tmp_path, path)
+        logger.info(f"Created shared result cache {path} with {self.capacity} slots")
+        return np.memmap(path, dtype=SLOT_DTYPE, mode="r+", offset=_HEADER_BYTES, shape=(self.buckets, self.ways))
+
+    def lookup(self, keys: np.ndarray, now: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Cached scores (NaN for misses) and the hit mask for an array of keys"""
+        now = time.time() if now is None else now
+        buckets = (keys % np.uint64(self.buckets)).astype(np.intp)
+        slots = self._table[buckets]
+        wanted = keys[:, None]
+        match = (slots["key"] == wanted) & (slots["check"] == wanted) & (slots["expires"] > now)
+        hit = match.any(axis=1)
+        way = match.argmax(axis=1)
+
+        scores = slots["score"][np.arange(len(keys)), way]
+        # A store in another process may have replaced the slot while it was
+        # copied; the score only counts if both key copies still match after it
+        rows, ways = buckets[hit], way[hit]
+        still = (self._table["check"][rows, ways] == keys[hit]) & (self._table["key"][rows, ways] == keys[hit])
+        hit[np.flatnonzero(hit)[~still]] = False
+        scores[~hit] = np.nan
+        self._table["used"][buckets[hit], way[hit]] = now
+
+        hits = int(hit.sum())
+        self.hits += hits
+        self.misses += len(keys) - hits
+        return scores, hit
+
+    def store(self, keys: np.ndarray, scores: np.ndarray, now: Optional[float] = None):
+        """Insert scores, replacing the same key, else an expired or the least recently used slot"""
+        if not len(keys):
+            return
+        now = time.time() if now is None else now
+        buckets = (keys % np.uint64(self.buckets)).astype(np.intp)
+        slots = self._table[buckets]
+        priority = slots["used"].copy()
+        priority[slots["expires"] <= now] = -1.0
+        priority[slots["key"] == keys[:, None]] = -2.0
+
+        # Keys sharing a bucket in this batch take its best slots in turn
+        order = np.argsort(buckets, kind="stable")
+        ordered = buckets[order]
+        first = np.r_[True, ordered[1:] != ordered[:-1]]
+        group_start = np.maximum.accumulate(np.where(first, np.arange(len(keys)), 0))
+        rank = np.empty(len(keys), dtype=np.intp)
+        rank[order] = np.arange(len(keys)) - group_start
+        way = np.argsort(priority, axis=1, kind="stable")[np.arange(len(keys)), rank % self.ways]
+
+        table = self._table
+        table["check"][buckets, way] = 0
+        table["key"][buckets, way] = keys
+        table["score"][buckets, way] = scores
+        table["expires"][buckets, way] = now + self.ttl
+        table["used"][buckets, way] = now
+        table["check"][buckets, way] = keys
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "file" if self.path else "memory",
+            "path": self.path,
+            "capacity": self.capacity,
+            "entries": int((self._table["expires"] > time.time()).sum()),
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio,
+        }
@@ -0,0 +1,357 @@
+"""
+Binary columnar request and response bodies for the Azora AI Spotter.
+
+Bulk feeds can post a batch as an Arrow IPC stream or as msgpack columns
+instead of JSON rows. Either body is decoded column by column straight into
+TransactionColumns (or a precomputed feature matrix), skipping per-row
+Transaction models; numeric columns are wrapped without copying where the
+format allows. In place of the per-row validation, decoding rejects
+non-finite numbers, timestamps that do not parse and precomputed features
+of the wrong width with a ValueError. Responses can be returned in the
+same format.
+
+Both formats are optional: pyarrow and msgpack are imported on first use.
+"""
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import numpy as np
+
+from spotter_datasets import TRANSACTION_FIELDS
+from spotter_encoding import EntityEncoder
+from spotter_features import FEATURE_NAMES, TransactionColumns, build_feature_matrix, parse_hours
+
+if TYPE_CHECKING:
+    from spotter_velocity import VelocityStore
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+MSGPACK = "application/msgpack"
+
+MEDIA_TYPES = {"arrow": ARROW_STREAM, "msgpack": MSGPACK}
+
+_FORMATS = {
+    ARROW_STREAM: "arrow",
+    MSGPACK: "msgpack",
+    "application/x-msgpack": "msgpack",
+}
+
+class UnsupportedFormat(RuntimeError):
+    """A binary format whose library is not installed"""
+
+
+@dataclass
+class ColumnarBatch:
+    """A decoded binary batch: transaction columns or precomputed features"""
+    format: str
+    ids: List[str]
+    columns: Optional[TransactionColumns] = None
+    features: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def feature_matrix(
+        self, encoder: EntityEncoder, velocity: Optional["VelocityStore"] = None, commit: bool = True
+    ) -> np.ndarray:
+        if self.features is not None:
+            # Precomputed rows carry the velocity features too; drop them when not asked for
+            return self.features if velocity is not None else self.features[:, :len(FEATURE_NAMES)]
+        return build_feature_matrix(self.columns, encoder, velocity, commit)
+
+    def take(self, rows: np.ndarray) -> "ColumnarBatch":
+        """The given rows as a new batch"""
+        return ColumnarBatch(
+            format=self.format,
+            ids=[self.ids[i] for i in rows.tolist()],
+            columns=self.columns.take(rows) if self.columns is not None else None,
+            features=self.features[rows] if self.features is not None else None,
+        )
+
+
+def binary_format(content_type: Optional[str]) -> Optional[str]:
+    """"arrow" or "msgpack" for a binary Content-Type, None for anything else"""
+    if not content_type:
+        return None
+    return _FORMATS.get(content_type.split(";")[0].strip().lower())
+
+
+def response_format(accept: Optional[str], request_format: Optional[str]) -> Optional[str]:
+    """Binary format to answer in: the one named by Accept, else the request's own"""
+    accept = (accept or "").lower()
+    for media_type, fmt in _FORMATS.items():
+        if media_type in accept:
+            return fmt
+    if "application/json" in accept:
+        return None
+    return request_format
+
+
+def _import_arrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        raise UnsupportedFormat("Arrow bodies require pyarrow to be installed")
+    return pa
+
+
+def _import_msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise UnsupportedFormat("msgpack bodies require msgpack to be installed")
+    return msgpack
+
+
+def _build(
+    fmt: str, n: int, columns: Dict[str, Any], strings, feature_count: Optional[int] = None
+) -> ColumnarBatch:
+    """ColumnarBatch from decoded numeric and string columns.
+
+    Precomputed feature_* columns must number feature_count when it is given.
+    """
+    precomputed = sorted((name for name in columns if name.startswith("feature_")), key=_feature_order)
+    if "id" not in columns:
+        if not precomputed:
+            raise ValueError("Batch is missing the id column")
+        ids = [str(i) for i in range(n)]
+    else:
+        ids = strings("id").astype(str).tolist()
+
+    if precomputed:
+        if feature_count is not None and len(precomputed) != feature_count:
+            raise ValueError(f"Batch has {len(precomputed)} feature_* columns, expected {feature_count}")
+        features = np.column_stack([_float_column(columns[name], n, name) for name in precomputed])
+        return ColumnarBatch(format=fmt, ids=ids, features=features)
+
+    missing = [field for field in TRANSACTION_FIELDS if field not in columns]
+    if missing:
+        raise ValueError(f"Batch is missing columns: {', '.join(missing)}")
+    timestamps = strings("timestamp").astype(str)
+    try:
+        parse_hours(timestamps)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Column timestamp: {e}")
+    return ColumnarBatch(
+        format=fmt,
+        ids=ids,
+        columns=TransactionColumns(
+            ids=ids,
+            amount=_float_column(columns["amount"], n, "amount"),
+            timestamp=timestamps,
+            sender=strings("sender"),
+            recipient=strings("recipient"),
+            currency=strings("currency"),
+            country=strings("country"),
+            category=strings("category").tolist() if "category" in columns else [None] * n,
+            overrides=[None] * n,
+        ),
+    )
+
+
+def _feature_order(name: str):
+    # feature_10 sorts after feature_9
+    suffix = name[len("feature_"):]
+    return (0, int(suffix), "") if suffix.isdigit() else (1, 0, suffix)
+
+
+def _float_column(values, n: int, name: str) -> np.ndarray:
+    if isinstance(values, (bytes, bytearray, memoryview)):
+        # Little-endian float64 buffer, wrapped without copying
+        array = np.frombuffer(values, dtype="<f8")
+    else:
+        array = np.asarray(values, dtype=np.float64)
+    if array.shape != (n,):
+        raise ValueError(f"Column {name} has {len(array)} values, expected {n}")
+    if not np.isfinite(array).all():
+        # Nulls decode to NaN
+        raise ValueError(f"Column {name} has missing or non-finite values")
+    return array
+
+
+def decode_arrow(body: bytes, feature_count: Optional[int] = None) -> ColumnarBatch:
+    """Decode an Arrow IPC stream of transaction or feature_* columns"""
+    pa = _import_arrow()
+    table = pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    n = table.num_rows
+    numeric = {}
+    for name in table.column_names:
+        column = table.column(name)
+        if name == "amount" or name.startswith("feature_"):
+            # Single-chunk float64 columns without nulls are zero-copy views
+            column = column.combine_chunks() if column.num_chunks != 1 else column.chunk(0)
+            numeric[name] = column.cast(pa.float64()).to_numpy(zero_copy_only=False)
+        else:
+            numeric[name] = column
+
+    def strings(name: str) -> np.ndarray:
+        column = numeric[name]
+        if not pa.types.is_string(column.type) and not pa.types.is_large_string(column.type):
+            column = column.cast(pa.string())
+        return column.to_numpy().astype(object)
+
+    return _build("arrow", n, numeric, strings, feature_count)
+
+
+def decode_msgpack(body: bytes, feature_count: Optional[int] = None) -> ColumnarBatch:
+    """Decode a msgpack map of column name to values.
+
+    Numeric columns (amount, feature_*) may be lists or binary little-endian
+    float64 buffers; the latter are used without copying.
+    """
+    msgpack = _import_msgpack()
+    columns = msgpack.unpackb(body, raw=False)
+    if not isinstance(columns, dict):
+        raise ValueError("msgpack body must be a map of column name to values")
+    sizes = {len(v) // 8 if isinstance(v, bytes) else len(v) for v in columns.values()}
+    if len(sizes) > 1:
+        raise ValueError("msgpack columns differ in length")
+    n = sizes.pop() if sizes else 0
+
+    def strings(name: str) -> np.ndarray:
+        return np.array(columns[name], dtype=object)
+
+    return _build("msgpack", n, columns, strings, feature_count)
+
+
+def decode_batch(fmt: str, body: bytes, feature_count: Optional[int] = None) -> ColumnarBatch:
+    return decode_arrow(body, feature_count) if fmt == "arrow" else decode_msgpack(body, feature_count)
+
+
+def _arrow_stream(pa, table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def anomaly_response_binary(
+    fmt: str,
+    transaction_ids: List[str],
+    scores: np.ndarray,
+    anomaly_flags: np.ndarray,
+    levels: np.ndarray,
+    batch_id: str,
+    processing_time: float,
+    model_version: str,
+    anomalies_found: int,
+    early_exits: Optional[int] = None,
+    contributions: Optional[Dict[int, Dict[str, float]]] = None,
+    cache_hit_ratio: Optional[float] = None,
+) -> bytes:
+    """AnomalyResponse with column-oriented results in an Arrow or msgpack body.
+
+    features_contribution is only included when contributions were requested.
+    """
+    explained = None
+    if contributions is not None:
+        explained = [None] * len(transaction_ids)
+        for row, contribution in contributions.items():
+            explained[row] = contribution
+
+    if fmt == "arrow":
+        pa = _import_arrow()
+        columns = {
+            "transaction_id": pa.array(transaction_ids, type=pa.string()),
+            "is_anomaly": pa.array(anomaly_flags),
+            "anomaly_score": pa.array(scores, type=pa.float64()),
+            "risk_level": pa.array(levels.tolist(), type=pa.string()).dictionary_encode(),
+        }
+        if explained is not None:
+            columns["features_contribution"] = pa.array(
+                [None if c is None else list(c.items()) for c in explained],
+                type=pa.map_(pa.string(), pa.float64()),
+            )
+        table = pa.table(
+            columns,
+            metadata={
+                "batch_id": batch_id,
+                "processing_time": repr(processing_time),
+                "model_version": model_version,
+                "anomalies_found": str(anomalies_found),
+                "early_exits": "" if early_exits is None else str(early_exits),
+                "cache_hit_ratio": "" if cache_hit_ratio is None else repr(cache_hit_ratio),
+            },
+        )
+        return _arrow_stream(pa, table)
+
+    msgpack = _import_msgpack()
+    results = {
+        "transaction_id": list(transaction_ids),
+        "is_anomaly": anomaly_flags.tolist(),
+        "anomaly_score": scores.tolist(),
+        "risk_level": levels.tolist(),
+    }
+    if explained is not None:
+        results["features_contribution"] = explained
+    return msgpack.packb({
+        "results": results,
+        "batch_id": batch_id,
+        "processing_time": processing_time,
+        "model_version": model_version,
+        "anomalies_found": int(anomalies_found),
+        "early_exits": early_exits,
+        "cache_hit_ratio": cache_hit_ratio,
+    })
+
+
+def pattern_response_binary(
+    fmt: str,
+    groups: List[Dict[str, Any]],
+    processing_time: float,
+    model_version: str,
+) -> bytes:
+    """PatternResponse in an Arrow (one row per group) or msgpack body"""
+    if fmt == "arrow":
+        pa = _import_arrow()
+        table = pa.table(
+            {
+                "group_id": pa.array([g["group_id"] for g in groups], type=pa.int64()),
+                "transactions": pa.array([g["transactions"] for g in groups], type=pa.list_(pa.string())),
+                "centroid": pa.array([list(g["centroid"].values()) for g in groups], type=pa.list_(pa.float64())),
+                "density": pa.array([g["density"] for g in groups], type=pa.float64()),
+                "risk_score": pa.array([g["risk_score"] for g in groups], type=pa.float64()),
+            },
+            metadata={
+                "total_groups": str(len(groups)),
+                "processing_time": repr(processing_time),
+                "model_version": model_version,
+            },
+        )
+        return _arrow_stream(pa, table)
+
+    msgpack = _import_msgpack()
+    return msgpack.packb({
+        "groups": groups,
+        "total_groups": len(groups),
+        "processing_time": processing_time,
+        "model_version": model_version,
+    })
+
+
+def openapi_body(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """openapi_extra documenting a JSON body schema next to the binary formats"""
+    definitions = schema.pop("$defs", {})
+
+    def inline(node):
+        if isinstance(node, dict):
+            ref = node.get("$ref", "")
+            if ref.startswith("#/$defs/"):
+                return inline(definitions[ref[len("#/$defs/"):]])
+            return {key: inline(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [inline(value) for value in node]
+        return node
+
+    binary = {"schema": {"type": "string", "format": "binary"}}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": inline(schema)},
+                ARROW_STREAM: binary,
+                MSGPACK: binary,
+            },
+        }
+    }
@@ -0,0 +1,312 @@
+"""
+Compliance log shipping for the Azora AI Spotter.
+
+ComplianceShipper keeps one pooled HTTP client for the compliance service,
+buffers events in a bounded in-memory queue and ships them in batches, by
+size or by time. Failed batches are retried with exponential backoff and
+spilled to an on-disk spool when the service stays down; the spool is
+replayed once the service answers again. A worker claims a spool file by
+renaming it while it replays it; claims left by a stopped worker are
+returned to the spool when the next one starts. stop() asks the worker to
+finish its current batch rather than cancelling it, since a cancel that
+lands inside a connect attempt can surface as a connection error and be
+retried like one.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "azora-ai-spotter"
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, owned by another user
+        return True
+    return True
+
+
+class ComplianceShipper:
+    """Batched, retrying shipper for compliance events"""
+
+    def __init__(
+        self,
+        base_url: str,
+        spool_dir: str,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 5.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.transport = transport
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        # Batch taken off the queue but not yet confirmed shipped
+        self._inflight: List[Dict[str, Any]] = []
+        # None until the service has told us whether it has a batch endpoint
+        self._batch_endpoint: Optional[bool] = None
+
+        self.shipped = 0
+        self.failed_batches = 0
+        self.spilled = 0
+        self.replayed = 0
+
+    @classmethod
+    def from_env(cls, base_url: str, data_dir: str) -> "ComplianceShipper":
+        return cls(
+            base_url,
+            spool_dir=os.path.join(data_dir, "compliance_spool"),
+            batch_size=int(os.environ.get("COMPLIANCE_BATCH_SIZE", "100")),
+            flush_interval=float(os.environ.get("COMPLIANCE_FLUSH_INTERVAL", "1.0")),
+            max_queue=int(os.environ.get("COMPLIANCE_MAX_QUEUE", "10000")),
+            max_retries=int(os.environ.get("COMPLIANCE_MAX_RETRIES", "3")),
+        )
+
+    def start(self):
+        """Open the connection pool and start the background flusher"""
+        if self._worker is not None:
+            return
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._recover_claims()
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+            transport=self.transport,
+        )
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._stopping = asyncio.Event()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        """Drain queued events, spooling whatever cannot be sent in time"""
+        if self._worker is None:
+            return
+        deadline = time.monotonic() + timeout
+        self._stopping.set()
+        # The worker exits after its current send; cancel it if that takes too long
+        done, _ = await asyncio.wait({self._worker}, timeout=timeout)
+        if not done:
+            self._worker.cancel()
+            await asyncio.wait({self._worker}, timeout=max(deadline - time.monotonic(), 0.1))
+        self._worker = None
+
+        # Delivery is at-least-once: an interrupted batch is sent again
+        pending = self._inflight + self._drain_queue()
+        self._inflight = []
+        try:
+            # Retry backoff counts against the timeout too
+            await asyncio.wait_for(self._flush(pending), max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            logger.warning(f"Compliance flush did not finish within {timeout}s")
+        self._spill(pending)
+
+        await self._client.aclose()
+        self._client = None
+
+    async def _flush(self, pending: List[Dict[str, Any]]):
+        """Ship pending events in batches, removing each from pending once shipped"""
+        while pending:
+            batch = pending[:self.batch_size]
+            if not await self._send_with_retry(batch):
+                return
+            del pending[:len(batch)]
+
+    def submit(self, action: str, data: Dict[str, Any]) -> bool:
+        """Queue an event; returns False if it had to be spooled instead"""
+        event = {
+            "service": SERVICE_NAME,
+            "action": action,
+            "timestamp": datetime.now().isoformat(),
+            "data": data,
+        }
+        if self._queue is None:
+            self._spill([event])
+            return False
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self._spill([event])
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "shipped": self.shipped,
+            "failed_batches": self.failed_batches,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "spool_files": len(self._spool_files()),
+        }
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            event = await self._next_event()
+            if event is None:
+                return
+            batch = self._inflight = [event]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                event = await self._next_event(remaining)
+                if event is None:
+                    break
+                batch.append(event)
+            if self._stopping.is_set():
+                # stop() ships the in-flight batch itself
+                return
+
+            if await self._send_with_retry(batch):
+                self._inflight = []
+                await self._replay_spool()
+            else:
+                self._spill(batch)
+                self._inflight = []
+
+    async def _next_event(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next queued event, or None on timeout or once stop() is called"""
+        get = asyncio.ensure_future(self._queue.get())
+        stopping = asyncio.ensure_future(self._stopping.wait())
+        try:
+            await asyncio.wait({get, stopping}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopping.cancel()
+            if not get.done():
+                get.cancel()
+        return get.result() if get.done() and not get.cancelled() else None
+
+    def _drain_queue(self) -> List[Dict[str, Any]]:
+        events = []
+        while not self._queue.empty():
+            events.append(self._queue.get_nowait())
+        return events
+
+    async def _send_with_retry(self, batch: List[Dict[str, Any]]) -> bool:
+        for attempt in range(self.max_retries + 1):
+            try:
+                if await self._send(batch):
+                    self.shipped += len(batch)
+                    return True
+            except httpx.HTTPError as e:
+                logger.warning(f"Compliance shipping attempt {attempt + 1} failed: {e}")
+            if attempt < self.max_retries:
+                await asyncio.sleep(self.backoff * (2 ** attempt))
+        self.failed_batches += 1
+        logger.error(f"Failed to ship {len(batch)} compliance events")
+        return False
+
+    async def _send(self, batch: List[Dict[str, Any]]) -> bool:
+        if self._batch_endpoint is not False:
+            response = await self._client.post(
+                "/api/log/batch", json={"service": SERVICE_NAME, "events": batch}
+            )
+            if response.status_code in (404, 405):
+                logger.info("Compliance service has no batch endpoint, shipping events individually")
+                self._batch_endpoint = False
+            else:
+                self._batch_endpoint = True
+                return response.is_success
+
+        # Fall back to one request per event over the pooled connections
+        responses = await asyncio.gather(*(self._client.post("/api/log", json=event) for event in batch))
+        return all(response.is_success for response in responses)
+
+    def _spool_files(self) -> List[str]:
+        if not os.path.isdir(self.spool_dir):
+            return []
+        return sorted(name for name in os.listdir(self.spool_dir) if name.endswith(".ndjson"))
+
+    def _spill(self, events: List[Dict[str, Any]]):
+        if not events:
+            return
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, f"{time.time_ns()}-{os.getpid()}.ndjson")
+        self._write_spool(path, events)
+        self.spilled += len(events)
+        logger.warning(f"Spooled {len(events)} compliance events to {path}")
+
+    def _write_spool(self, path: str, events: List[Dict[str, Any]]):
+        with open(f"{path}.tmp", "w") as f:
+            for event in events:
+                f.write(json.dumps(event, default=str) + "\n")
+        os.replace(f"{path}.tmp", path)
+
+    async def _replay_spool(self):
+        for name in self._spool_files():
+            if self._stopping.is_set():
+                return
+            path = os.path.join(self.spool_dir, name)
+            # Claim the file so other workers sharing DATA_DIR skip it
+            claimed = f"{path}.{os.getpid()}.replaying"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+
+            try:
+                with open(claimed) as f:
+                    events = [json.loads(line) for line in f if line.strip()]
+            except (OSError, json.JSONDecodeError) as e:
+                logger.error(f"Skipping unreadable compliance spool file {path}: {e}")
+                os.rename(claimed, f"{path}.corrupt")
+                continue
+
+            sent = 0
+            try:
+                while sent < len(events):
+                    if not await self._send_with_retry(events[sent:sent + self.batch_size]):
+                        break
+                    sent = min(sent + self.batch_size, len(events))
+            finally:
+                # The unsent tail goes back to the spool for the next successful
+                # flush, also when the replay is cancelled mid-flight
+                if sent < len(events):
+                    self._write_spool(path, events[sent:])
+                os.remove(claimed)
+                self.replayed += sent
+            if sent < len(events):
+                return
+
+    def _recover_claims(self):
+        """Return spool files claimed by processes that are gone (or by this pid) to the spool"""
+        for name in os.listdir(self.spool_dir):
+            if not name.endswith(".replaying"):
+                continue
+            original, pid = name[:-len(".replaying")].rsplit(".", 1)
+            if not pid.isdigit() or (int(pid) != os.getpid() and _process_alive(int(pid))):
+                continue
+            try:
+                os.rename(os.path.join(self.spool_dir, name), os.path.join(self.spool_dir, original))
+                logger.info(f"Returned interrupted compliance replay {original} to the spool")
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,119 @@
+"""
+Chunked dataset reading for the Azora AI Spotter.
+
+Datasets live under DATA_DIR as CSV, Parquet or NDJSON files of
+transactions (id, amount, sender, recipient, timestamp, currency, country).
+They are streamed in fixed-size chunks so memory use does not depend on the
+size of the file. Columns named feature_* are used as precomputed feature
+vectors, like Transaction.features.
+"""
+
+import os
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from spotter_encoding import EntityEncoder
+from spotter_features import TransactionColumns, build_feature_matrix
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from spotter_velocity import VelocityStore
+
+DATASET_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+}
+
+TRANSACTION_FIELDS = ["id", "amount", "sender", "recipient", "timestamp", "currency", "country"]
+
+
+def resolve_dataset(data_dir: str, source: str) -> str:
+    """Absolute path of a dataset under data_dir, rejecting paths outside it"""
+    root = os.path.realpath(data_dir)
+    path = os.path.realpath(os.path.join(root, source))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"Dataset '{source}' is outside DATA_DIR")
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Dataset '{source}' not found in DATA_DIR")
+    dataset_format(path)
+    return path
+
+
+def dataset_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in DATASET_FORMATS:
+        raise ValueError(f"Unsupported dataset format '{extension}', expected one of {sorted(DATASET_FORMATS)}")
+    return DATASET_FORMATS[extension]
+
+
+def iter_chunks(path: str, chunk_rows: int = 50000) -> Iterator[Tuple["pd.DataFrame", float]]:
+    """Yield (chunk, fraction of the dataset read so far)"""
+    import pandas as pd
+
+    fmt = dataset_format(path)
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet datasets require pyarrow to be installed")
+        parquet = pq.ParquetFile(path)
+        total = max(parquet.metadata.num_rows, 1)
+        done = 0
+        for batch in parquet.iter_batches(batch_size=chunk_rows):
+            done += batch.num_rows
+            yield batch.to_pandas(), min(done / total, 1.0)
+        return
+
+    size = max(os.path.getsize(path), 1)
+    with open(path, "rb") as f:
+        if fmt == "csv":
+            reader = pd.read_csv(f, chunksize=chunk_rows, dtype={"id": str, "sender": str, "recipient": str})
+        else:
+            reader = pd.read_json(
+                f, lines=True, chunksize=chunk_rows, convert_dates=False,
+                dtype={"id": str, "sender": str, "recipient": str}
+            )
+        with reader:
+            for chunk in reader:
+                yield chunk, min(f.tell() / size, 1.0)
+
+
+def feature_columns(frame: "pd.DataFrame") -> List[str]:
+    return [column for column in frame.columns if str(column).startswith("feature_")]
+
+
+def frame_to_columns(frame: "pd.DataFrame") -> TransactionColumns:
+    """Transaction columns of a dataset chunk"""
+    missing = [field for field in TRANSACTION_FIELDS if field not in frame.columns]
+    if missing:
+        raise ValueError(f"Dataset is missing columns: {', '.join(missing)}")
+    n = len(frame)
+    category = frame["category"] if "category" in frame.columns else [None] * n
+    return TransactionColumns(
+        ids=frame["id"].astype(str).tolist(),
+        amount=frame["amount"].to_numpy(dtype=np.float64),
+        timestamp=frame["timestamp"].astype(str).to_numpy(dtype=str),
+        sender=frame["sender"].astype(str).to_numpy(dtype=object),
+        recipient=frame["recipient"].astype(str).to_numpy(dtype=object),
+        currency=frame["currency"].astype(str).to_numpy(dtype=object),
+        country=frame["country"].astype(str).to_numpy(dtype=object),
+        category=list(category),
+        overrides=[None] * n,
+    )
+
+
+def frame_features(
+    frame: "pd.DataFrame", encoder: EntityEncoder, velocity: Optional["VelocityStore"] = None
+) -> Tuple[List[str], np.ndarray]:
+    """Transaction ids and feature matrix of a dataset chunk"""
+    precomputed = feature_columns(frame)
+    if precomputed:
+        ids = frame["id"].astype(str).tolist() if "id" in frame.columns else [str(i) for i in frame.index]
+        return ids, frame[precomputed].to_numpy(dtype=np.float64)
+    columns = frame_to_columns(frame)
+    return columns.ids, build_feature_matrix(columns, encoder, velocity)
@@ -0,0 +1,203 @@
+"""
+Drift monitoring for the Azora AI Spotter.
+
+An IsolationForest keeps scoring when the transaction mix shifts; it just
+gets quietly worse. DriftMonitor compares what the served model sees with
+what it was trained on, without keeping any transactions. Training builds a
+baseline from the fitted sample: for every input feature and for the
+anomaly score, bin edges at its quantiles, the share of the sample in each
+bin, and its mean and standard deviation. Live traffic is counted into the
+same bins, with decayed sums for the moments. Counts halve every halflife
+seconds, so the sketches describe recent traffic, and memory stays at a
+few numbers per bin and feature whatever the volume.
+
+Drift is reported per feature as the population stability index (PSI) of
+the live bin shares against the baseline ones, and as the largest gap
+between the two cumulative distributions (a binned Kolmogorov-Smirnov
+statistic). Updating the sketches costs one searchsorted and one bincount
+per feature over at most sample_rows rows of a batch.
+"""
+
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Quantile bins per feature in a baseline
+DEFAULT_BINS = 20
+# Floor on bin shares so empty bins keep PSI finite
+_SHARE_FLOOR = 1e-4
+# Live rows (after decay) needed before a feature is flagged as drifted
+MIN_DRIFT_ROWS = 1000.0
+
+
+def _column_baseline(name: str, values: np.ndarray, bins: int) -> Dict[str, Any]:
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return {"name": name, "edges": [], "shares": [1.0], "mean": 0.0, "std": 0.0}
+    # Repeated quantiles collapse, so point masses such as zero counts get one bin
+    edges = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1]))
+    counts = np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1)
+    return {
+        "name": name,
+        "edges": edges.tolist(),
+        "shares": (counts / len(values)).tolist(),
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+    }
+
+
+def build_baseline(
+    features: np.ndarray, scores: np.ndarray, names: Sequence[str], bins: int = DEFAULT_BINS
+) -> Dict[str, Any]:
+    """Drift baseline of a training sample and its decision_function scores, as a JSON document"""
+    return {
+        "rows": len(features),
+        "bins": bins,
+        "features": [_column_baseline(name, features[:, i], bins) for i, name in enumerate(names)],
+        "score": _column_baseline("anomaly_score", np.asarray(scores, dtype=np.float64), bins),
+    }
+
+
+class _Sketch:
+    """Decayed bin counts and moments of one column against its baseline"""
+
+    __slots__ = ("name", "edges", "baseline", "counts", "sum", "squares")
+
+    def __init__(self, baseline: Dict[str, Any]):
+        self.name = baseline["name"]
+        self.edges = np.asarray(baseline["edges"], dtype=np.float64)
+        self.baseline = baseline
+        self.counts = np.zeros(len(self.edges) + 1)
+        self.sum = 0.0
+        self.squares = 0.0
+
+    def add(self, values: np.ndarray, weight: float):
+        values = values[np.isfinite(values)]
+        bins = np.searchsorted(self.edges, values, side="right")
+        self.counts += np.bincount(bins, minlength=len(self.counts)) * weight
+        self.sum += float(values.sum()) * weight
+        self.squares += float(np.dot(values, values)) * weight
+
+    def scale(self, factor: float):
+        self.counts *= factor
+        self.sum *= factor
+        self.squares *= factor
+
+    def stats(self, psi_alert: float) -> Dict[str, Any]:
+        rows = float(self.counts.sum())
+        baseline = self.baseline
+        document = {
+            "name": self.name,
+            "rows": rows,
+            "mean": None,
+            "std": None,
+            "baseline_mean": baseline["mean"],
+            "baseline_std": baseline["std"],
+            "psi": None,
+            "ks": None,
+            "drifted": False,
+        }
+        if rows <= 0:
+            return document
+        mean = self.sum / rows
+        live = np.maximum(self.counts / rows, _SHARE_FLOOR)
+        expected = np.maximum(np.asarray(baseline["shares"]), _SHARE_FLOOR)
+        psi = float(np.sum((live - expected) * np.log(live / expected)))
+        document.update(
+            mean=mean,
+            std=math.sqrt(max(self.squares / rows - mean * mean, 0.0)),
+            psi=psi,
+            ks=float(np.abs(np.cumsum(self.counts / rows) - np.cumsum(baseline["shares"])).max()),
+            drifted=rows >= MIN_DRIFT_ROWS and psi >= psi_alert,
+        )
+        return document
+
+
+class DriftMonitor:
+    """Fixed-size sketches of the served model's inputs and scores, compared with its training baseline"""
+
+    def __init__(self, halflife: float = 3600.0, sample_rows: int = 4096, psi_alert: float = 0.2, seed: int = 0):
+        self.halflife = halflife
+        self.sample_rows = max(1, sample_rows)
+        self.psi_alert = psi_alert
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self.reset(None, None)
+
+    @classmethod
+    def from_env(cls) -> Optional["DriftMonitor"]:
+        """The configured monitor unless SPOTTER_DRIFT is disabled"""
+        if os.environ.get("SPOTTER_DRIFT", "true").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            halflife=float(os.environ.get("SPOTTER_DRIFT_HALFLIFE_SECONDS", "3600")),
+            sample_rows=int(os.environ.get("SPOTTER_DRIFT_SAMPLE_ROWS", "4096")),
+            psi_alert=float(os.environ.get("SPOTTER_DRIFT_PSI_ALERT", "0.2")),
+        )
+
+    def reset(self, model_version: Optional[str], baseline: Optional[Dict[str, Any]]):
+        """Start over for a newly served model version and its baseline (None if it has none)"""
+        with self._lock:
+            self.model_version = model_version
+            self.baseline = baseline
+            self._features: List[_Sketch] = [_Sketch(column) for column in baseline["features"]] if baseline else []
+            self._score = _Sketch(baseline["score"]) if baseline else None
+            self._updated = time.monotonic()
+            self.rows = 0
+            self.mismatched_rows = 0
+
+    def observe(self, features: np.ndarray, scores: np.ndarray, model_version: str):
+        """Count a scored batch into the sketches; batches scored by another version are ignored"""
+        if model_version != self.model_version or self.baseline is None or len(scores) == 0:
+            return
+        n = len(scores)
+        weight = 1.0
+        if n > self.sample_rows:
+            # A uniform sample stands in for the batch, each row counted n / k times
+            rows = self._rng.integers(0, n, self.sample_rows)
+            features, scores = features[rows], scores[rows]
+            weight = n / self.sample_rows
+        with self._lock:
+            if model_version != self.model_version:
+                return
+            now = time.monotonic()
+            factor = 0.5 ** ((now - self._updated) / self.halflife) if self.halflife > 0 else 1.0
+            self._updated = now
+            for sketch in self._features + [self._score]:
+                sketch.scale(factor)
+            self._score.add(np.asarray(scores, dtype=np.float64), weight)
+            self.rows += n
+            # Batches of precomputed features may not have the baseline's layout
+            if features.ndim != 2 or features.shape[1] != len(self._features):
+                self.mismatched_rows += n
+                return
+            for column, sketch in enumerate(self._features):
+                sketch.add(features[:, column], weight)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-feature and score drift of recent traffic against the baseline, most drifted first"""
+        with self._lock:
+            baseline = self.baseline
+            score = self._score.stats(self.psi_alert) if self._score is not None else None
+            features = [sketch.stats(self.psi_alert) for sketch in self._features]
+            rows, mismatched = self.rows, self.mismatched_rows
+        features.sort(key=lambda document: -1.0 if document["psi"] is None else -document["psi"])
+        return {
+            "model_version": self.model_version,
+            "baseline": baseline is not None,
+            "baseline_rows": baseline["rows"] if baseline else 0,
+            "halflife_seconds": self.halflife,
+            "sample_rows": self.sample_rows,
+            "psi_alert": self.psi_alert,
+            "rows_observed": rows,
+            # Rows whose features did not match the baseline layout; only their scores were counted
+            "mismatched_rows": mismatched,
+            "drifted": [document["name"] for document in features if document["drifted"]]
+            + (["anomaly_score"] if score is not None and score["drifted"] else []),
+            "score": score,
+            "features": features,
+        }
@@ -0,0 +1,136 @@
+"""
+Stable entity encoding for the Azora AI Spotter.
+
+Entity names (senders, recipients, countries, currencies) are encoded with a
+BLAKE2 digest instead of Python's per-process salted hash(), so every
+worker and every restart produces the same features for the same input.
+Hot entities are kept in a per-kind LRU that is snapshotted to DATA_DIR and
+reloaded at startup.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ENTITY_KINDS = ("sender", "recipient", "country", "currency")
+
+# Codes are stored as integers in [0, ENCODING_BUCKETS) and exposed as
+# code / ENCODING_BUCKETS, matching the range of the original features.
+ENCODING_BUCKETS = 1000
+
+
+def stable_code(value: str) -> int:
+    """Deterministic bucket for an entity name"""
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % ENCODING_BUCKETS
+
+
+class EntityEncoder:
+    """Per-kind LRU of entity codes with hit/miss accounting"""
+
+    def __init__(self, capacity: int = 100000, snapshot_path: Optional[str] = None):
+        self.capacity = capacity
+        self.snapshot_path = snapshot_path
+        self._tables: Dict[str, "OrderedDict[str, int]"] = {kind: OrderedDict() for kind in ENTITY_KINDS}
+        self._hits = {kind: 0 for kind in ENTITY_KINDS}
+        self._misses = {kind: 0 for kind in ENTITY_KINDS}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, data_dir: str) -> "EntityEncoder":
+        return cls(
+            capacity=int(os.environ.get("SPOTTER_ENTITY_CACHE_SIZE", "100000")),
+            snapshot_path=os.path.join(data_dir, "entity_encoding.npz"),
+        )
+
+    def _lookup(self, kind: str, value: str) -> int:
+        table = self._tables[kind]
+        code = table.get(value)
+        if code is not None:
+            table.move_to_end(value)
+            self._hits[kind] += 1
+            return code
+
+        self._misses[kind] += 1
+        code = stable_code(value)
+        table[value] = code
+        if len(table) > self.capacity:
+            table.popitem(last=False)
+        return code
+
+    def encode_one(self, kind: str, value: str) -> float:
+        """Encoded feature value for a single entity"""
+        with self._lock:
+            return self._lookup(kind, value) / ENCODING_BUCKETS
+
+    def encode(self, kind: str, values: np.ndarray) -> np.ndarray:
+        """Encoded feature values for a column of entities.
+
+        Each distinct entity in the column is looked up once, so hit and miss
+        counts are per distinct entity per batch.
+        """
+        items = values.tolist()
+        with self._lock:
+            codes = {value: self._lookup(kind, value) / ENCODING_BUCKETS for value in set(items)}
+        return np.fromiter(map(codes.__getitem__, items), dtype=np.float64, count=len(items))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Cache size and hit/miss rates per entity kind"""
+        report = {}
+        for kind in ENTITY_KINDS:
+            lookups = self._hits[kind] + self._misses[kind]
+            report[kind] = {
+                "size": len(self._tables[kind]),
+                "hits": self._hits[kind],
+                "misses": self._misses[kind],
+                "hit_rate": self._hits[kind] / lookups if lookups else 0.0,
+                "miss_rate": self._misses[kind] / lookups if lookups else 0.0,
+            }
+        return report
+
+    def snapshot(self):
+        """Write the hot entities of every kind to snapshot_path atomically"""
+        if not self.snapshot_path:
+            return
+        arrays = {}
+        with self._lock:
+            for kind, table in self._tables.items():
+                arrays[f"{kind}_keys"] = np.array(list(table.keys()), dtype=str)
+                arrays[f"{kind}_codes"] = np.fromiter(table.values(), dtype=np.uint16, count=len(table))
+
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, self.snapshot_path)
+        logger.info(f"Saved entity encoding snapshot to {self.snapshot_path}")
+
+    def load(self) -> bool:
+        """Warm the tables from snapshot_path; returns False if there is none"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with np.load(self.snapshot_path) as snapshot:
+                with self._lock:
+                    for kind in ENTITY_KINDS:
+                        if f"{kind}_keys" not in snapshot:
+                            continue
+                        self._warm(kind, snapshot[f"{kind}_keys"].tolist(), snapshot[f"{kind}_codes"].tolist())
+        except Exception as e:
+            logger.error(f"Failed to load entity encoding snapshot: {e}")
+            return False
+        logger.info(f"Loaded entity encoding snapshot from {self.snapshot_path}")
+        return True
+
+    def _warm(self, kind: str, keys: Iterable[str], codes: Iterable[int]):
+        table = self._tables[kind]
+        for key, code in zip(keys, codes):
+            table[key] = int(code)
+        while len(table) > self.capacity:
+            table.popitem(last=False)
@@ -0,0 +1,375 @@
+"""
+Compute execution layer for the Azora AI Spotter.
+
+Model scoring and clustering are CPU-bound, so running them on the uvicorn
+event loop stalls every other request. ComputePool sends them to a process
+or thread pool whose workers keep the current models loaded, and serves
+small batches inline where dispatch would cost more than the work itself.
+Batches up to compiled_max_rows are scored with the compiled array form of
+the IsolationForest, which avoids sklearn's per-call overhead; with
+cascade_trees set, score_cascade uses it to let clearly normal rows exit
+after a few trees, and explain computes per-feature contributions from it.
+Large batches can be clustered with grid_dbscan, which applies the DBSCAN
+model's parameters through a grid index in bounded memory. Rows routed to a
+segment model are scored with that model from a SegmentModels LRU; process
+workers hold an LRU of their own.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional, Tuple
+
+import numpy as np
+
+from spotter_iforest import compile_isolation_forest
+from spotter_patterns import grid_dbscan
+from spotter_segments import SegmentModels
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_MODES = ("process", "thread", "inline")
+
+# Models held by each process-pool worker
+_worker_models = {"anomaly": None, "compiled": None, "compiled_max_rows": 0, "clustering": None, "segments": None}
+
+
+def _init_worker(anomaly_model, compiled_model, compiled_max_rows, clustering_model, segment_models=None):
+    """Process-pool initializer: keep the models resident and warm them up"""
+    _worker_models["anomaly"] = anomaly_model
+    _worker_models["compiled"] = compiled_model
+    _worker_models["compiled_max_rows"] = compiled_max_rows
+    _worker_models["clustering"] = clustering_model
+    _worker_models["segments"] = segment_models
+    if anomaly_model is not None and hasattr(anomaly_model, "estimators_"):
+        try:
+            anomaly_model.decision_function(np.zeros((1, anomaly_model.n_features_in_)))
+        except Exception as e:
+            logger.warning(f"Worker warm-up failed: {e}")
+
+
+def score_with(model, feature_matrix: np.ndarray) -> np.ndarray:
+    """Anomaly scores for a feature matrix (-1 to 1, lower is more anomalous)"""
+    return model.decision_function(feature_matrix)
+
+
+def cluster_with(model, feature_matrix: np.ndarray) -> np.ndarray:
+    """Cluster labels for a feature matrix.
+
+    The model is cloned so concurrent calls never share fitted state.
+    """
+    from sklearn.base import clone
+
+    return clone(model).fit_predict(feature_matrix)
+
+
+def cluster_grid_with(model, feature_matrix: np.ndarray, max_pairs: int) -> np.ndarray:
+    """DBSCAN labels from the grid-indexed large-batch clusterer, with the model's eps/min_samples"""
+    return grid_dbscan(feature_matrix, model.eps, model.min_samples, max_pairs)
+
+
+def _worker_cluster_grid(feature_matrix: np.ndarray, max_pairs: int) -> np.ndarray:
+    return cluster_grid_with(_worker_models["clustering"], feature_matrix, max_pairs)
+
+
+def cascade_with(model, feature_matrix: np.ndarray, trees: int, z: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Cascade scores and early-exit mask from a compiled IsolationForest"""
+    return model.cascade_decision_function(feature_matrix, trees, z)
+
+
+def _worker_cascade(feature_matrix: np.ndarray, trees: int, z: float) -> Tuple[np.ndarray, np.ndarray]:
+    return cascade_with(_worker_models["compiled"], feature_matrix, trees, z)
+
+
+def explain_with(model, feature_matrix: np.ndarray) -> np.ndarray:
+    """Per-feature contribution shares from a compiled IsolationForest"""
+    return model.feature_contributions(feature_matrix)
+
+
+def _worker_explain(feature_matrix: np.ndarray) -> np.ndarray:
+    return explain_with(_worker_models["compiled"], feature_matrix)
+
+
+def segment_score_with(models: SegmentModels, feature_matrix: np.ndarray, segment: str, version: str) -> np.ndarray:
+    """Anomaly scores from a segment's model"""
+    return models.get(segment, version).decision_function(feature_matrix)
+
+
+def _worker_segment_score(feature_matrix: np.ndarray, segment: str, version: str) -> np.ndarray:
+    return segment_score_with(_worker_models["segments"], feature_matrix, segment, version)
+
+
+def segment_explain_with(models: SegmentModels, feature_matrix: np.ndarray, segment: str, version: str) -> np.ndarray:
+    """Per-feature contribution shares from a segment's model"""
+    return models.get(segment, version).feature_contributions(feature_matrix)
+
+
+def _worker_segment_explain(feature_matrix: np.ndarray, segment: str, version: str) -> np.ndarray:
+    return segment_explain_with(_worker_models["segments"], feature_matrix, segment, version)
+
+
+def _worker_score(feature_matrix: np.ndarray) -> np.ndarray:
+    compiled = _worker_models["compiled"]
+    if compiled is not None and len(feature_matrix) <= _worker_models["compiled_max_rows"]:
+        return score_with(compiled, feature_matrix)
+    return score_with(_worker_models["anomaly"], feature_matrix)
+
+
+def _worker_cluster(feature_matrix: np.ndarray) -> np.ndarray:
+    return cluster_with(_worker_models["clustering"], feature_matrix)
+
+
+def warm_up_with(anomaly_model, compiled_model, clustering_model, anomaly_features, pattern_features):
+    """Run each model once; models that cannot run yet (e.g. unfitted) are skipped.
+
+    A fitted anomaly model, or its compiled form, that fails to score raises,
+    since every request would fail the same way.
+    """
+    fitted = hasattr(anomaly_model, "estimators_")
+    calls = [
+        ("anomaly", fitted, lambda: score_with(anomaly_model, anomaly_features)),
+        ("compiled", compiled_model is not None, lambda: score_with(compiled_model, anomaly_features)),
+        ("clustering", False, lambda: cluster_with(clustering_model, pattern_features)),
+    ]
+    for name, required, call in calls:
+        try:
+            call()
+        except Exception as e:
+            if required:
+                raise RuntimeError(f"Warm-up of the {name} model failed: {e}") from e
+            logger.debug(f"Skipped warm-up of the {name} model: {e}")
+
+
+def _worker_warm_up(anomaly_features: np.ndarray, pattern_features: np.ndarray):
+    warm_up_with(
+        _worker_models["anomaly"],
+        _worker_models["compiled"],
+        _worker_models["clustering"],
+        anomaly_features,
+        pattern_features,
+    )
+
+
+class ComputePool:
+    """Runs scoring and clustering off the event loop"""
+
+    def __init__(
+        self,
+        mode: str = "thread",
+        max_workers: Optional[int] = None,
+        inline_rows: int = 256,
+        timeout: Optional[float] = 30.0,
+        compiled_max_rows: int = 2048,
+        cascade_trees: int = 0,
+        cascade_z: float = 3.0,
+        segment_models: Optional[SegmentModels] = None,
+    ):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown executor mode '{mode}', expected one of {EXECUTOR_MODES}")
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.inline_rows = inline_rows
+        self.timeout = timeout
+        self.compiled_max_rows = compiled_max_rows
+        self.cascade_trees = cascade_trees
+        self.cascade_z = cascade_z
+        self.segment_models = segment_models
+        self.anomaly_model = None
+        self.compiled_anomaly_model = None
+        self.clustering_model = None
+        self._executor: Optional[Executor] = None
+
+    @classmethod
+    def from_env(cls, segment_models: Optional[SegmentModels] = None) -> "ComputePool":
+        workers = os.environ.get("SPOTTER_WORKERS")
+        timeout = float(os.environ.get("SPOTTER_COMPUTE_TIMEOUT", "30"))
+        return cls(
+            mode=os.environ.get("SPOTTER_EXECUTOR", "thread"),
+            max_workers=int(workers) if workers else None,
+            inline_rows=int(os.environ.get("SPOTTER_INLINE_ROWS", "256")),
+            timeout=timeout if timeout > 0 else None,
+            compiled_max_rows=int(os.environ.get("SPOTTER_COMPILED_MAX_ROWS", "2048")),
+            cascade_trees=int(os.environ.get("SPOTTER_CASCADE_TREES", "0")),
+            cascade_z=float(os.environ.get("SPOTTER_CASCADE_Z", "3.0")),
+            segment_models=segment_models,
+        )
+
+    async def update_models(self, anomaly_model, clustering_model):
+        """Install new models; process workers are restarted with them loaded.
+
+        Compiling the anomaly model and replacing the process pool run off
+        the event loop. An unchanged anomaly model keeps its compiled form,
+        so a new clustering model alone is not recompiled. Tasks already
+        running on the previous process pool finish there.
+        """
+        if anomaly_model is self.anomaly_model:
+            compiled_model = self.compiled_anomaly_model
+        else:
+            compiled_model = await asyncio.to_thread(self._compile, anomaly_model)
+        self.anomaly_model = anomaly_model
+        self.clustering_model = clustering_model
+        self.compiled_anomaly_model = compiled_model
+        await asyncio.to_thread(self._replace_executor)
+        logger.info(f"Compute pool ready: mode={self.mode}, workers={self.max_workers}")
+
+    @staticmethod
+    def _compile(anomaly_model):
+        # Always compiled: feature contributions need the node tables too
+        try:
+            return compile_isolation_forest(anomaly_model)
+        except Exception as e:
+            logger.warning(f"Could not compile the anomaly model, using sklearn scoring: {e}")
+            return None
+
+    def _replace_executor(self):
+        if self.mode == "thread" and self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="spotter-compute"
+            )
+        elif self.mode == "process":
+            previous = self._executor
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(
+                    self.anomaly_model,
+                    self.compiled_anomaly_model,
+                    self.compiled_max_rows,
+                    self.clustering_model,
+                    self.segment_models,
+                ),
+            )
+            if previous is not None:
+                previous.shutdown(wait=False)
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+    async def score(self, feature_matrix: np.ndarray, timeout: Optional[float] = None) -> np.ndarray:
+        """Anomaly scores for a feature matrix"""
+        model = self.anomaly_model
+        if self.compiled_anomaly_model is not None and len(feature_matrix) <= self.compiled_max_rows:
+            model = self.compiled_anomaly_model
+        return await self._run(score_with, _worker_score, model, feature_matrix, timeout)
+
+    async def score_segment(
+        self, segment: str, version: str, feature_matrix: np.ndarray, timeout: Optional[float] = None
+    ) -> np.ndarray:
+        """Anomaly scores from a segment's model"""
+        await self._load_segment(segment, version, len(feature_matrix))
+        return await self._run(
+            partial(segment_score_with, segment=segment, version=version),
+            partial(_worker_segment_score, segment=segment, version=version),
+            self.segment_models,
+            feature_matrix,
+            timeout,
+        )
+
+    async def explain_segment(
+        self, segment: str, version: str, feature_matrix: np.ndarray, timeout: Optional[float] = None
+    ) -> np.ndarray:
+        """(rows, features) contribution shares from a segment's model"""
+        await self._load_segment(segment, version, len(feature_matrix))
+        return await self._run(
+            partial(segment_explain_with, segment=segment, version=version),
+            partial(_worker_segment_explain, segment=segment, version=version),
+            self.segment_models,
+            feature_matrix,
+            timeout,
+        )
+
+    async def _load_segment(self, segment: str, version: str, rows: int):
+        """Load a segment model off the event loop if this process is about to use it"""
+        if self.mode == "process" and self._executor is not None and rows > self.inline_rows:
+            return
+        if not self.segment_models.resident(segment, version):
+            await asyncio.to_thread(self.segment_models.get, segment, version)
+
+    @property
+    def cascade_enabled(self) -> bool:
+        return self.cascade_trees > 0 and self.compiled_anomaly_model is not None
+
+    async def score_cascade(
+        self, feature_matrix: np.ndarray, timeout: Optional[float] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Anomaly scores and early-exit mask, scoring clearly normal rows with fewer trees"""
+        return await self._run(
+            partial(cascade_with, trees=self.cascade_trees, z=self.cascade_z),
+            partial(_worker_cascade, trees=self.cascade_trees, z=self.cascade_z),
+            self.compiled_anomaly_model,
+            feature_matrix,
+            timeout,
+        )
+
+    @property
+    def explain_enabled(self) -> bool:
+        return self.compiled_anomaly_model is not None
+
+    async def explain(self, feature_matrix: np.ndarray, timeout: Optional[float] = None) -> np.ndarray:
+        """(rows, features) contribution shares for the rows of a feature matrix"""
+        return await self._run(explain_with, _worker_explain, self.compiled_anomaly_model, feature_matrix, timeout)
+
+    async def cluster(self, feature_matrix: np.ndarray, timeout: Optional[float] = None) -> np.ndarray:
+        """Cluster labels for a feature matrix"""
+        return await self._run(cluster_with, _worker_cluster, self.clustering_model, feature_matrix, timeout)
+
+    async def cluster_grid(
+        self, feature_matrix: np.ndarray, max_pairs: int, timeout: Optional[float] = None
+    ) -> np.ndarray:
+        """Cluster labels of a large batch from the grid-indexed clusterer"""
+        return await self._run(
+            partial(cluster_grid_with, max_pairs=max_pairs),
+            partial(_worker_cluster_grid, max_pairs=max_pairs),
+            self.clustering_model,
+            feature_matrix,
+            timeout,
+        )
+
+    async def warm_up(self, anomaly_features: np.ndarray, pattern_features: np.ndarray):
+        """Run every model on a synthetic batch before serving.
+
+        In process mode one warm-up task per worker is submitted at once, so
+        all workers are spawned with their models loaded up front instead of
+        on the first requests.
+        """
+        if self.mode == "process" and self._executor is not None:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(
+                loop.run_in_executor(self._executor, _worker_warm_up, anomaly_features, pattern_features)
+                for _ in range(self.max_workers)
+            ))
+        await asyncio.to_thread(
+            warm_up_with,
+            self.anomaly_model,
+            self.compiled_anomaly_model,
+            self.clustering_model,
+            anomaly_features,
+            pattern_features,
+        )
+
+    async def _run(
+        self,
+        local_fn: Callable[[Any, np.ndarray], Any],
+        worker_fn: Callable[[np.ndarray], Any],
+        model,
+        feature_matrix: np.ndarray,
+        timeout: Optional[float],
+    ):
+        if self.mode == "inline" or self._executor is None or len(feature_matrix) <= self.inline_rows:
+            return local_fn(model, feature_matrix)
+
+        loop = asyncio.get_running_loop()
+        if self.mode == "process":
+            future = loop.run_in_executor(self._executor, worker_fn, feature_matrix)
+        else:
+            future = loop.run_in_executor(self._executor, local_fn, model, feature_matrix)
+
+        # wait_for cancels the executor future on timeout or when the request
+        # itself is cancelled, which drops the job if it has not started yet.
+        return await asyncio.wait_for(future, timeout=timeout if timeout is not None else self.timeout)
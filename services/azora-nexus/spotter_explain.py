@@ -0,0 +1,68 @@
+"""
+Per-feature explanations for the Azora AI Spotter.
+
+AnomalyResult.features_contribution holds each feature's share of why a
+transaction scored as it did, computed from the compiled IsolationForest
+tables for every tree at once (CompiledIsolationForest.feature_contributions).
+Explanations are requested per batch with ?explain=anomalies (flagged rows)
+or ?explain=<risk level> (rows at that level or more severe). Only the
+selected rows are walked again, at most max_rows of them, most anomalous
+first, so batches that do not ask for explanations are scored exactly as
+before.
+"""
+
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from spotter_features import FEATURE_NAMES, RISK_LABELS
+
+EXPLAIN_ANOMALIES = "anomalies"
+# Accepted ?explain= values: flagged rows, or a risk level and everything above it
+EXPLAIN_MODES = (EXPLAIN_ANOMALIES,) + tuple(RISK_LABELS.tolist())
+
+
+def explain_max_rows_from_env() -> int:
+    """Most rows explained per batch (SPOTTER_EXPLAIN_MAX_ROWS)"""
+    return int(os.environ.get("SPOTTER_EXPLAIN_MAX_ROWS", "256"))
+
+
+def validate_explain(explain: Optional[str]) -> Optional[str]:
+    """Normalized ?explain= value; raises ValueError for unknown modes"""
+    if explain is None or not explain.strip():
+        return None
+    mode = explain.strip().lower()
+    if mode not in EXPLAIN_MODES:
+        raise ValueError(f"Unknown explain mode '{explain}', expected one of {EXPLAIN_MODES}")
+    return mode
+
+
+def select_rows(scores: np.ndarray, levels: np.ndarray, mode: str, max_rows: int) -> np.ndarray:
+    """Row indices to explain, keeping the max_rows lowest scores"""
+    if mode == EXPLAIN_ANOMALIES:
+        selected = scores < 0
+    else:
+        # RISK_LABELS runs from most to least severe
+        severity = {label: rank for rank, label in enumerate(RISK_LABELS.tolist())}
+        selected = np.isin(levels, RISK_LABELS[:severity[mode] + 1])
+    rows = np.flatnonzero(selected)
+    if len(rows) > max_rows:
+        rows = rows[np.argsort(scores[rows], kind="stable")[:max_rows]]
+        rows.sort()
+    return rows
+
+
+def feature_names(n_features: int, names: Sequence[str] = FEATURE_NAMES) -> List[str]:
+    """Names used as features_contribution keys"""
+    if n_features == len(names):
+        return list(names)
+    return [f"feature_{i}" for i in range(n_features)]
+
+
+def contribution_dicts(
+    rows: np.ndarray, shares: np.ndarray, names: Sequence[str] = FEATURE_NAMES
+) -> Dict[int, Dict[str, float]]:
+    """Row index -> {feature name: share} for the explained rows"""
+    names = feature_names(shares.shape[1], names)
+    return {row: dict(zip(names, values)) for row, values in zip(rows.tolist(), shares.tolist())}
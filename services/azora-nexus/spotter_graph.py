@@ -0,0 +1,501 @@
+"""
+Transaction graph for the Azora AI Spotter.
+
+Pattern analysis clusters feature vectors and never sees who paid whom,
+which is where mule rings and fan-in/fan-out schemes show up.
+TransactionGraph keeps every sender -> recipient transfer of the retention
+period as a directed edge between integer node ids; each account name is
+interned once. Merged edges are stored CSR-style: per node, an offset into
+arrays of recipient, time and amount sorted by sender (12 bytes per edge).
+New batches are appended to buffer chunks, and a periodic merge folds them
+in with one stable sort: the merged arrays are already one sorted run, so
+only the buffered edges really need sorting. The merge also drops edges
+past the retention period, measured back from the latest event time seen
+(which a future-dated transaction can only move to max_skew past the wall
+clock), and, beyond max_edges, the oldest ones, and
+renumbers nodes once enough accounts have no edges left. Memory is thus
+bounded by max_edges.
+
+Queries look at the edges inside a time window: accounts paying or paid by
+many distinct counterparties, the directed cycles up to max_cycle_length
+moving the most money (found largest transfer first, within a step budget)
+and dense subgraphs, the connected components of the k-core of the
+undirected graph.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from spotter_features import TransactionColumns
+from spotter_velocity import epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+# Renumber nodes once this share of the interned accounts has no edges left
+RECLAIM_SHARE = 0.25
+# Pairs added and path steps a cycle search may take before it reports truncated results
+CYCLE_STEP_BUDGET = 200000
+# Accounts listed per dense subgraph, highest degree first
+MAX_LISTED_ACCOUNTS = 100
+
+_Chunk = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def _time_column(seconds: np.ndarray) -> np.ndarray:
+    """Whole epoch seconds as uint32, enough for window queries"""
+    return np.clip(np.floor(seconds), 0, np.iinfo(np.uint32).max).astype(np.uint32)
+
+
+class TransactionGraph:
+    """Sender -> recipient edges in CSR arrays with append buffers and windowed pattern queries"""
+
+    def __init__(
+        self,
+        retention: float = 86400.0,
+        max_edges: int = 20000000,
+        buffer_edges: int = 1000000,
+        merge_interval: float = 10.0,
+        max_skew: float = 300.0,
+        snapshot_path: Optional[str] = None,
+    ):
+        self.retention = retention
+        self.max_edges = max_edges
+        self.buffer_edges = buffer_edges
+        self.merge_interval = merge_interval
+        self.max_skew = max_skew
+        self.snapshot_path = snapshot_path
+
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        # Merged edges; arrays are replaced by merges, never modified in place
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._dst = np.empty(0, dtype=np.int32)
+        self._time = np.empty(0, dtype=np.uint32)
+        self._amount = np.empty(0, dtype=np.float32)
+        self._pending: List[_Chunk] = []
+        self._pending_edges = 0
+        # Latest event time seen; retention is measured back from it
+        self.clock = -np.inf
+        self._last_merge = time.monotonic()
+
+        self._lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+        self._merges = 0
+        self._merge_seconds = 0.0
+        self._expired = 0
+        self._renumbered = 0
+
+    @classmethod
+    def from_env(cls, data_dir: str) -> Optional["TransactionGraph"]:
+        """The configured graph if SPOTTER_GRAPH is enabled, otherwise None"""
+        if os.environ.get("SPOTTER_GRAPH", "false").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            retention=float(os.environ.get("SPOTTER_GRAPH_RETENTION_SECONDS", "86400")),
+            max_edges=int(os.environ.get("SPOTTER_GRAPH_MAX_EDGES", "20000000")),
+            buffer_edges=int(os.environ.get("SPOTTER_GRAPH_BUFFER_EDGES", "1000000")),
+            merge_interval=float(os.environ.get("SPOTTER_GRAPH_MERGE_SECONDS", "10")),
+            max_skew=float(os.environ.get("SPOTTER_GRAPH_MAX_SKEW_SECONDS", "300")),
+            snapshot_path=os.path.join(data_dir, "transaction_graph.npz"),
+        )
+
+    def add(self, columns: TransactionColumns):
+        """Append the sender -> recipient edges of a batch"""
+        n = len(columns)
+        if n == 0:
+            return
+        times = epoch_seconds(columns.timestamp)
+        amounts = np.nan_to_num(columns.amount).astype(np.float32)
+        unique, inverse = np.unique(
+            np.concatenate([columns.sender, columns.recipient]).astype(str), return_inverse=True
+        )
+        with self._lock:
+            ids = self._intern(unique.tolist())[inverse.reshape(-1)]
+            self._pending.append((ids[:n], ids[n:], _time_column(times), amounts))
+            self._pending_edges += n
+            self.clock = max(self.clock, self._clamp(float(times.max())))
+            overflowing = self._pending_edges >= 4 * self.buffer_edges
+        if overflowing:
+            # Merges are not keeping up; hold the caller rather than the memory
+            self.merge()
+
+    def _clamp(self, event_time: float) -> float:
+        """Event time no further ahead of the wall clock than max_skew"""
+        return min(event_time, time.time() + self.max_skew)
+
+    def _intern(self, keys: List[str]) -> np.ndarray:
+        get = self._ids.get
+        ids = np.fromiter((get(key, -1) for key in keys), dtype=np.int32, count=len(keys))
+        for i in np.flatnonzero(ids < 0).tolist():
+            ids[i] = self._ids[keys[i]] = len(self._names)
+            self._names.append(keys[i])
+        return ids
+
+    @property
+    def merge_due(self) -> bool:
+        return self._pending_edges >= self.buffer_edges or (
+            self._pending_edges > 0 and time.monotonic() - self._last_merge >= self.merge_interval
+        )
+
+    def merge(self):
+        """Fold buffered edges into the CSR arrays, expiring old edges"""
+        with self._merge_lock:
+            start = time.perf_counter()
+            with self._lock:
+                chunks, self._pending = self._pending, []
+                self._pending_edges = 0
+                indptr, dst, times, amounts = self._indptr, self._dst, self._time, self._amount
+                nodes = len(self._names)
+                cutoff = self.clock - self.retention
+
+            src = np.concatenate(
+                [np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))]
+                + [chunk[0] for chunk in chunks]
+            )
+            dst = np.concatenate([dst] + [chunk[1] for chunk in chunks])
+            times = np.concatenate([times] + [chunk[2] for chunk in chunks])
+            amounts = np.concatenate([amounts] + [chunk[3] for chunk in chunks])
+
+            keep = times >= cutoff if np.isfinite(cutoff) else np.ones(len(times), dtype=bool)
+            if keep.sum() > self.max_edges:
+                kept = np.flatnonzero(keep)
+                newest = kept[np.argpartition(times[kept], len(kept) - self.max_edges)[-self.max_edges:]]
+                keep = np.zeros(len(times), dtype=bool)
+                keep[newest] = True
+            expired = len(keep) - int(keep.sum())
+            if expired:
+                src, dst, times, amounts = src[keep], dst[keep], times[keep], amounts[keep]
+
+            # Merged edges form one sorted run ahead of the buffered ones
+            order = np.argsort(src, kind="stable")
+            indptr = np.zeros(nodes + 1, dtype=np.int64)
+            np.cumsum(np.bincount(src, minlength=nodes), out=indptr[1:])
+
+            with self._lock:
+                self._indptr, self._dst, self._time, self._amount = indptr, dst[order], times[order], amounts[order]
+                self._expired += expired
+                self._reclaim()
+                self._last_merge = time.monotonic()
+            self._merges += 1
+            self._merge_seconds += time.perf_counter() - start
+
+    def _reclaim(self):
+        """Renumber nodes without edges away once they are a large share of all nodes"""
+        nodes = len(self._names)
+        used = np.zeros(nodes, dtype=bool)
+        used[:len(self._indptr) - 1] = np.diff(self._indptr) > 0
+        used[self._dst] = True
+        for src, dst, _, _ in self._pending:
+            used[src] = True
+            used[dst] = True
+        dead = nodes - int(used.sum())
+        if dead < max(1, RECLAIM_SHARE * nodes):
+            return
+
+        live = np.flatnonzero(used)
+        mapping = np.full(nodes, -1, dtype=np.int32)
+        mapping[live] = np.arange(len(live), dtype=np.int32)
+        merged = live[live < len(self._indptr) - 1]
+        indptr = np.zeros(len(live) + 1, dtype=np.int64)
+        counts = np.zeros(len(live), dtype=np.int64)
+        counts[mapping[merged]] = np.diff(self._indptr)[merged]
+        np.cumsum(counts, out=indptr[1:])
+        self._indptr = indptr
+        self._dst = mapping[self._dst]
+        self._pending = [(mapping[src], mapping[dst], times, amounts) for src, dst, times, amounts in self._pending]
+        self._names = [self._names[i] for i in live.tolist()]
+        self._ids = {name: i for i, name in enumerate(self._names)}
+        self._renumbered += dead
+
+    def _window_edges(self, since: float, until: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]:
+        """Sources, targets and amounts of the edges with since <= time <= until, and the node names"""
+        with self._lock:
+            indptr, dst, times, amounts = self._indptr, self._dst, self._time, self._amount
+            chunks = list(self._pending)
+            names = self._names
+        src = np.concatenate(
+            [np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))] + [c[0] for c in chunks]
+        )
+        dst = np.concatenate([dst] + [c[1] for c in chunks])
+        times = np.concatenate([times] + [c[2] for c in chunks])
+        amounts = np.concatenate([amounts] + [c[3] for c in chunks])
+        inside = (times >= since) & (times <= until)
+        return src[inside], dst[inside], amounts[inside].astype(np.float64), names
+
+    def query(
+        self,
+        window: Optional[float] = None,
+        until: Optional[float] = None,
+        min_counterparties: int = 10,
+        max_cycle_length: int = 4,
+        min_degree: int = 3,
+        limit: int = 20,
+    ) -> Dict[str, Any]:
+        """Fan-out and fan-in accounts, cycles and dense subgraphs of the edges in a time window.
+
+        The window ends at until (default: the latest transaction seen) and
+        spans window seconds (default: the retention period).
+        """
+        if until is None:
+            until = self.clock if np.isfinite(self.clock) else time.time()
+        since = until - (window if window is not None else self.retention)
+        src, dst, amounts, names = self._window_edges(since, until)
+        nodes = len(names)
+
+        # One entry per (sender, recipient) pair, self-transfers left out
+        distinct = src != dst
+        pair_src, pair_dst, pair_amount, pair_count = self._pairs(
+            src[distinct], dst[distinct], amounts[distinct], nodes
+        )
+
+        cycles, truncated = self._cycles(
+            pair_src, pair_dst, pair_amount, pair_count, nodes, max_cycle_length, limit
+        )
+        return {
+            "since": since,
+            "until": until,
+            "transactions": len(src),
+            "accounts": self._count_accounts(src, dst, nodes),
+            "fan_out": self._fan(src, amounts, pair_src, names, min_counterparties, limit),
+            "fan_in": self._fan(dst, amounts, pair_dst, names, min_counterparties, limit),
+            "cycles": [
+                {"accounts": [names[node] for node in path], "length": len(path), "transactions": count,
+                 "amount": amount}
+                for path, count, amount in cycles
+            ],
+            "cycles_truncated": truncated,
+            "dense_subgraphs": self._dense(pair_src, pair_dst, pair_amount, names, min_degree, limit),
+        }
+
+    @staticmethod
+    def _pairs(
+        src: np.ndarray, dst: np.ndarray, weights: np.ndarray, nodes: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Distinct (src, dst) pairs with their summed weights and edge counts.
+
+        Building a sparse matrix sums duplicates per row, which is several
+        times faster than np.unique over packed 64-bit keys.
+        """
+        from scipy.sparse import csr_matrix
+
+        shape = (nodes, nodes)
+        totals = csr_matrix((weights.astype(np.float64), (src, dst)), shape=shape)
+        counts = csr_matrix((np.ones(len(src), dtype=np.int64), (src, dst)), shape=shape)
+        totals.sum_duplicates()
+        counts.sum_duplicates()
+        pair_src = np.repeat(np.arange(nodes, dtype=np.int32), np.diff(totals.indptr))
+        return pair_src, totals.indices.astype(np.int32), totals.data, counts.data
+
+    @staticmethod
+    def _count_accounts(src: np.ndarray, dst: np.ndarray, nodes: int) -> int:
+        seen = np.zeros(nodes, dtype=bool)
+        seen[src] = True
+        seen[dst] = True
+        return int(seen.sum())
+
+    @staticmethod
+    def _fan(
+        ends: np.ndarray, amounts: np.ndarray, pair_ends: np.ndarray, names: List[str],
+        min_counterparties: int, limit: int
+    ) -> List[Dict[str, Any]]:
+        """Accounts with at least min_counterparties distinct counterparties, most first"""
+        nodes = len(names)
+        counterparties = np.bincount(pair_ends, minlength=nodes)
+        candidates = np.flatnonzero(counterparties >= max(1, min_counterparties))
+        top = candidates[np.argsort(-counterparties[candidates], kind="stable")[:limit]]
+        transactions = np.bincount(ends, minlength=nodes)
+        totals = np.bincount(ends, weights=amounts, minlength=nodes)
+        return [
+            {"account": names[node], "counterparties": int(counterparties[node]),
+             "transactions": int(transactions[node]), "amount": float(totals[node])}
+            for node in top.tolist()
+        ]
+
+    @staticmethod
+    def _cycles(
+        pair_src: np.ndarray, pair_dst: np.ndarray, pair_amount: np.ndarray, pair_count: np.ndarray,
+        nodes: int, max_length: int, limit: int
+    ) -> Tuple[List[Tuple[List[int], int, float]], bool]:
+        """The limit directed cycles of 2..max_length accounts moving the most money.
+
+        A cycle's amount is the smallest pair total along it: what can have
+        gone all the way round. Pairs are added largest first, and adding
+        u -> v closes every cycle through a path v -> ... -> u of pairs
+        already added, whose amount is therefore u -> v's. Cycles come out
+        in order of amount, each exactly once, and the search only explores
+        the part of the graph moving more money than the cycles it reports.
+        Only pairs inside a strongly connected component can lie on a cycle.
+        Returns the cycles and whether the step budget ran out first.
+        """
+        if len(pair_src) == 0:
+            return [], False
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import connected_components
+
+        adjacency = csr_matrix((np.ones(len(pair_src), dtype=np.int8), (pair_src, pair_dst)), shape=(nodes, nodes))
+        _, labels = connected_components(adjacency, directed=True, connection="strong")
+        sizes = np.bincount(labels)
+        inside = np.flatnonzero((labels[pair_src] == labels[pair_dst]) & (sizes[labels[pair_src]] > 1))
+        # Every pair added costs at least one step, so later ones are never reached
+        if len(inside) > CYCLE_STEP_BUDGET:
+            inside = inside[np.argpartition(-pair_amount[inside], CYCLE_STEP_BUDGET)[:CYCLE_STEP_BUDGET]]
+        inside = inside[np.argsort(-pair_amount[inside], kind="stable")]
+        src, dst = pair_src[inside].tolist(), pair_dst[inside].tolist()
+        amount, count = pair_amount[inside].tolist(), pair_count[inside].tolist()
+
+        added: Dict[int, List[int]] = {}
+        found: List[Tuple[List[int], int, float]] = []
+        steps = 0
+        for edge in range(len(src)):
+            u, v = src[edge], dst[edge]
+            steps += 1
+            if v in added:
+                # Depth-first over simple paths v -> ... -> u of at most max_length - 1 pairs
+                path, path_edges, on_path = [v], [], {v}
+                pending = [iter(added[v])]
+                while pending and len(found) < limit and steps < CYCLE_STEP_BUDGET:
+                    step = next(pending[-1], None)
+                    if step is None:
+                        pending.pop()
+                        on_path.discard(path.pop())
+                        if path_edges:
+                            path_edges.pop()
+                        continue
+                    steps += 1
+                    target = dst[step]
+                    if target == u:
+                        edges = [edge] + path_edges + [step]
+                        found.append(([u] + path, sum(count[e] for e in edges), amount[edge]))
+                    elif target not in on_path and len(path) < max_length - 1 and target in added:
+                        path.append(target)
+                        path_edges.append(step)
+                        on_path.add(target)
+                        pending.append(iter(added[target]))
+            if len(found) >= limit:
+                return found, False
+            if steps >= CYCLE_STEP_BUDGET:
+                return found, True
+            added.setdefault(u, []).append(edge)
+        return found, False
+
+    @staticmethod
+    def _dense(
+        pair_src: np.ndarray, pair_dst: np.ndarray, pair_amount: np.ndarray, names: List[str],
+        min_degree: int, limit: int
+    ) -> List[Dict[str, Any]]:
+        """Connected components of the min_degree-core of the undirected graph, largest first"""
+        nodes = len(names)
+        u, v, amount, _ = TransactionGraph._pairs(
+            np.minimum(pair_src, pair_dst), np.maximum(pair_src, pair_dst), pair_amount, nodes
+        )
+
+        # Peel accounts with fewer than min_degree neighbours until none are left
+        while len(u):
+            degree = np.bincount(u, minlength=nodes) + np.bincount(v, minlength=nodes)
+            weak = degree < min_degree
+            keep = ~(weak[u] | weak[v])
+            if keep.all():
+                break
+            u, v, amount = u[keep], v[keep], amount[keep]
+        if not len(u):
+            return []
+
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import connected_components
+
+        adjacency = csr_matrix((np.ones(len(u), dtype=np.int8), (u, v)), shape=(nodes, nodes))
+        _, labels = connected_components(adjacency, directed=False)
+        degree = np.bincount(u, minlength=nodes) + np.bincount(v, minlength=nodes)
+        members = np.flatnonzero(degree > 0)
+        member_labels = labels[members]
+        edge_labels = labels[u]
+        sizes = np.bincount(member_labels, minlength=labels.max() + 1)
+        edges = np.bincount(edge_labels, minlength=len(sizes))
+        totals = np.bincount(edge_labels, weights=amount, minlength=len(sizes))
+
+        subgraphs = []
+        for label in np.argsort(-edges, kind="stable")[:limit].tolist():
+            if edges[label] == 0:
+                break
+            size = int(sizes[label])
+            component = members[member_labels == label]
+            listed = component[np.argsort(-degree[component], kind="stable")[:MAX_LISTED_ACCOUNTS]]
+            subgraphs.append({
+                "accounts": [names[node] for node in listed.tolist()],
+                "size": size,
+                "edges": int(edges[label]),
+                "density": 2.0 * int(edges[label]) / (size * (size - 1)),
+                "amount": float(totals[label]),
+            })
+        return subgraphs
+
+    def stats(self) -> Dict[str, Any]:
+        """Graph size, memory of the edge arrays and merge counters"""
+        with self._lock:
+            merged = len(self._dst)
+            pending = self._pending_edges
+            edge_bytes = (
+                self._indptr.nbytes + self._dst.nbytes + self._time.nbytes + self._amount.nbytes
+                + sum(array.nbytes for chunk in self._pending for array in chunk)
+            )
+            nodes = len(self._names)
+        return {
+            "retention_seconds": self.retention,
+            "max_edges": self.max_edges,
+            "buffer_edges": self.buffer_edges,
+            "nodes": nodes,
+            "edges": merged,
+            "buffered_edges": pending,
+            "edge_bytes": edge_bytes,
+            "clock": self.clock if np.isfinite(self.clock) else None,
+            "merges": self._merges,
+            "mean_merge_ms": self._merge_seconds / self._merges * 1000 if self._merges else 0.0,
+            "expired_edges": self._expired,
+            "reclaimed_nodes": self._renumbered,
+        }
+
+    def snapshot(self):
+        """Merge pending edges and write the graph to snapshot_path atomically"""
+        if not self.snapshot_path:
+            return
+        self.merge()
+        with self._lock:
+            arrays = {
+                "names": np.array(self._names, dtype=str),
+                "indptr": self._indptr,
+                "dst": self._dst,
+                "time": self._time,
+                "amount": self._amount,
+                "clock": np.array(self.clock),
+            }
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, self.snapshot_path)
+        logger.info(f"Saved transaction graph snapshot to {self.snapshot_path}")
+
+    def load(self) -> bool:
+        """Restore the graph from snapshot_path; returns False if there is none"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with np.load(self.snapshot_path) as snapshot:
+                names = snapshot["names"].tolist()
+                with self._lock:
+                    self._names = names
+                    self._ids = {name: i for i, name in enumerate(names)}
+                    self._indptr = snapshot["indptr"]
+                    self._dst = snapshot["dst"]
+                    self._time = snapshot["time"]
+                    self._amount = snapshot["amount"]
+                    self.clock = self._clamp(float(snapshot["clock"]))
+        except Exception as e:
+            logger.error(f"Failed to load transaction graph snapshot: {e}")
+            return False
+        logger.info(f"Loaded transaction graph snapshot from {self.snapshot_path}")
+        return True
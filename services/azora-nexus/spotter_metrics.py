@@ -0,0 +1,258 @@
+"""
+Request instrumentation for the Azora AI Spotter.
+
+A small in-process metrics registry rendered in the Prometheus text format
+at /metrics: per-stage latency histograms (parse, queue, cache, features, graph,
+route, score, drift, explain, cluster, build, serialize), batch sizes, in-flight requests and
+model-call durations.
+Observations are a bisect and two additions, cheap enough to stay on in
+production. Metrics are kept per process; with several uvicorn workers each
+worker reports its own series.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+ROW_BUCKETS = (1, 10, 64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label combination"""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        series = self._series.get(label_values)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(label_values, [0] * (len(self.buckets) + 1) + [0.0])
+        # Non-cumulative counts; render() accumulates them
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, series in sorted(self._series.items()):
+            series = list(series)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                labels = _label_text(self.labels + ("le",), label_values + (le,))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _label_text(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {series[-1]!r}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Counter:
+    """Monotonic counter with one series per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *label_values: str):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for label_values, value in sorted(self._values.items()):
+            yield f"{self.name}{_label_text(self.labels, label_values)} {value!r}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, *label_values: str):
+        self.inc(-amount, *label_values)
+
+
+class RequestTimings:
+    """Stage left open by a handler, closed when the response starts"""
+
+    __slots__ = ("endpoint", "pending_stage", "pending_start")
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.pending_stage: Optional[str] = None
+        self.pending_start = 0.0
+
+
+_current_request: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    "spotter_request_timings", default=None
+)
+
+
+class Metrics:
+    """The spotter's metric families and the helpers that record them"""
+
+    def __init__(self):
+        self.request_duration = Histogram(
+            "spotter_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+        )
+        self.in_flight = Gauge("spotter_requests_in_flight", "HTTP requests being processed")
+        self.stage_duration = Histogram(
+            "spotter_stage_duration_seconds", "Latency of each processing stage", ("endpoint", "stage")
+        )
+        self.batch_rows = Histogram(
+            "spotter_batch_rows", "Transactions per analysed batch", ("endpoint",), buckets=ROW_BUCKETS
+        )
+        self.model_call_duration = Histogram(
+            "spotter_model_call_seconds",
+            "Duration of model calls, including executor dispatch",
+            ("model", "operation", "version"),
+        )
+        self.cascade_rows = Counter(
+            "spotter_cascade_rows_total", "Rows scored in cascade mode, by outcome", ("outcome",)
+        )
+        self.result_cache_rows = Counter(
+            "spotter_result_cache_rows_total", "Rows looked up in the result cache, by outcome", ("outcome",)
+        )
+        self.admission_shed = Counter(
+            "spotter_admission_shed_total", "Analyze requests rejected by admission control, by reason", ("reason",)
+        )
+        self.segment_rows = Counter(
+            "spotter_segment_rows_total", "Rows scored with segmented routing on, by the model that scored them", ("model",)
+        )
+        self.families = [
+            self.request_duration,
+            self.in_flight,
+            self.stage_duration,
+            self.batch_rows,
+            self.model_call_duration,
+            self.cascade_rows,
+            self.result_cache_rows,
+            self.admission_shed,
+            self.segment_rows,
+        ]
+
+    def render(self) -> str:
+        lines = []
+        for family in self.families:
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+    def observe_batch(self, rows: int):
+        self.batch_rows.observe(rows, self._endpoint())
+
+    def _endpoint(self) -> str:
+        timings = _current_request.get()
+        return timings.endpoint if timings is not None else "other"
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block as one stage of the current request"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_duration.observe(time.perf_counter() - start, self._endpoint(), name)
+
+    def open_stage(self, name: str):
+        """Start a stage that ends when the response starts being sent.
+
+        Used for serialization FastAPI performs after the handler returns.
+        """
+        timings = _current_request.get()
+        if timings is not None:
+            timings.pending_stage = name
+            timings.pending_start = time.perf_counter()
+
+    @contextmanager
+    def model_call(self, model: str, operation: str, version: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.model_call_duration.observe(time.perf_counter() - start, model, operation, version)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency, status and in-flight count"""
+
+    def __init__(self, app, metrics: Metrics, skip_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.metrics = metrics
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            # Stages of a stream are labelled with its path; the connection itself is not a request
+            token = _current_request.set(RequestTimings(scope["path"]))
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _current_request.reset(token)
+            return
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.metrics
+        timings = RequestTimings(scope["path"])
+        token = _current_request.set(timings)
+        status = ["500"]
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+                if timings.pending_stage is not None:
+                    metrics.stage_duration.observe(
+                        time.perf_counter() - timings.pending_start,
+                        timings.endpoint,
+                        timings.pending_stage,
+                    )
+                    timings.pending_stage = None
+            await send(message)
+
+        metrics.in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            metrics.in_flight.dec()
+            _current_request.reset(token)
+            route = scope.get("route")
+            metrics.request_duration.observe(
+                time.perf_counter() - start,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status[0],
+            )
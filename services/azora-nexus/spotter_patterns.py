@@ -0,0 +1,633 @@
+"""
+Sliding-window pattern engine for the Azora AI Spotter.
+
+PatternWindow keeps the feature vectors of recently analysed transactions
+and clusters them incrementally with DBSCAN semantics (eps, min_samples):
+each batch of new points is placed in eps-sized grid cells, its
+neighbourhoods are found at once through the alive points sorted by cell,
+and neighbour counts and core-point groups are updated in place. Points
+leave the window, also a batch at a time, when they are older than max_age
+or the window is full. Groups can therefore span several requests without
+re-clustering the window on every call.
+
+grid_dbscan clusters one large batch with the same semantics: points are
+bucketed into eps-sized cells, eps-neighbourhoods are found by comparing
+each point only with the 3^d cells around it, in chunks of at most
+max_pairs candidate pairs, and core points are joined with a sparse
+connected-components pass. Labels match sklearn's DBSCAN, including the
+numbering of clusters and the cluster a border point joins.
+"""
+
+import itertools
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Above this many features the 3^d neighbouring cells outnumber the points
+# worth checking, so neighbours are found by a scan of the window instead.
+MAX_GRID_FEATURES = 6
+
+# Candidate pairs compared at once by grid_dbscan; bounds its working memory
+DEFAULT_MAX_PAIRS = 1_000_000
+
+
+def group_risk(size: int, density: float) -> float:
+    """Risk score of a pattern group from its size and density"""
+    risk_score = 0.0
+    if size > 20:  # Large clusters might be suspicious
+        risk_score += 0.2
+    if density < 0.1:  # Very tight clusters might be suspicious
+        risk_score += 0.3
+    return risk_score
+
+
+def summarize_groups(features: np.ndarray, labels: np.ndarray, min_size: int = 2) -> List[Dict]:
+    """Centroid, density and risk of every labelled group in one pass.
+
+    Rows with a negative label are noise. Groups smaller than min_size are
+    dropped. Each entry holds the row indices of its members. Rows are
+    sorted by label once and every statistic is a segmented reduction over
+    the sorted rows.
+    """
+    rows = np.flatnonzero(labels >= 0)
+    if not len(rows):
+        return []
+    rows = rows[np.argsort(labels[rows], kind="stable")]
+    sorted_labels = labels[rows]
+    starts = np.flatnonzero(np.r_[True, sorted_labels[1:] != sorted_labels[:-1]])
+    sizes = np.diff(np.r_[starts, len(rows)])
+
+    members_features = features[rows]
+    centroids = np.add.reduceat(members_features, starts, axis=0) / sizes[:, None]
+    distances = np.linalg.norm(members_features - np.repeat(centroids, sizes, axis=0), axis=1)
+    densities = np.add.reduceat(distances, starts) / sizes
+    members = np.split(rows, starts[1:])
+
+    groups = []
+    for k, label in enumerate(sorted_labels[starts].tolist()):
+        if sizes[k] < min_size:
+            continue
+        density = float(densities[k])
+        groups.append({
+            "group_id": int(label),
+            "indices": members[k],
+            "centroid": {f"feature_{i}": float(v) for i, v in enumerate(centroids[k].tolist())},
+            "density": density,
+            "risk_score": group_risk(int(sizes[k]), density),
+        })
+    return groups
+
+
+def batch_groups(ids: Sequence[str], features: np.ndarray, labels: np.ndarray) -> List[Dict]:
+    """Pattern groups of a clustered batch, with the transaction ids of their members"""
+    groups = summarize_groups(features, labels)
+    ids = np.asarray(ids, dtype=object)
+    for group in groups:
+        group["transactions"] = ids[group.pop("indices")].tolist()
+    return groups
+
+
+def grid_clusterable(model, n_features: int) -> bool:
+    """Whether grid_dbscan can stand in for a clustering model on this many features"""
+    return (
+        hasattr(model, "eps")
+        and hasattr(model, "min_samples")
+        and getattr(model, "metric", "euclidean") == "euclidean"
+        and 0 < n_features <= MAX_GRID_FEATURES
+    )
+
+
+class _CellIndex:
+    """Points sorted by eps-sized grid cell, with each cell's neighbouring cells"""
+
+    def __init__(self, features: np.ndarray, eps: float):
+        cells = np.floor(features / eps).astype(np.int64)
+        unique_cells, cell_of = np.unique(cells, axis=0, return_inverse=True)
+        cell_of = cell_of.reshape(-1)
+        self.order = np.argsort(cell_of, kind="stable")
+        # One contiguous array per feature: gathering from 1-D columns is far
+        # cheaper than gathering rows of a 2-D matrix
+        self.columns = [np.ascontiguousarray(features[self.order, k]) for k in range(features.shape[1])]
+        self.cell = cell_of[self.order]
+        self.counts = np.bincount(cell_of, minlength=len(unique_cells))
+        self.starts = np.cumsum(self.counts) - self.counts
+        self.neighbor_cells = self._neighbor_cells(unique_cells)
+        self.candidates = np.zeros(len(unique_cells), dtype=np.int64)
+        for neighbors in self.neighbor_cells.T:
+            self.candidates += np.where(neighbors >= 0, self.counts[neighbors], 0)
+
+    @staticmethod
+    def _neighbor_cells(cells: np.ndarray) -> np.ndarray:
+        """(cells, 3^d) index of each neighbouring cell, -1 where it is empty.
+
+        Cells are hashed with a linear function, so the hash of a cell plus an
+        offset is the sum of both hashes; matches are confirmed on coordinates.
+        """
+        offsets = np.array(list(itertools.product((-1, 0, 1), repeat=cells.shape[1])), dtype=np.int64)
+        rng = np.random.default_rng(0)
+        multipliers = rng.integers(1, 2**63, cells.shape[1], dtype=np.uint64) | np.uint64(1)
+        with np.errstate(over="ignore"):
+            cell_hash = (cells.astype(np.uint64) * multipliers).sum(axis=1)
+            offset_hash = (offsets.astype(np.uint64) * multipliers).sum(axis=1)
+        by_hash = np.argsort(cell_hash)
+        sorted_hash = cell_hash[by_hash]
+
+        neighbors = np.full((len(cells), len(offsets)), -1, dtype=np.int32)
+        for k, offset in enumerate(offsets):
+            with np.errstate(over="ignore"):
+                wanted = cell_hash + offset_hash[k]
+            position = np.minimum(np.searchsorted(sorted_hash, wanted), len(cells) - 1)
+            hit = np.flatnonzero(sorted_hash[position] == wanted)
+            found = by_hash[position[hit]]
+            exact = (cells[found] == cells[hit] + offset).all(axis=1)
+            neighbors[hit[exact], k] = found[exact]
+        return neighbors
+
+    def pairs(self, queries: np.ndarray, eps: float, max_pairs: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """(query, neighbour) sorted positions within eps, in chunks of at most max_pairs candidates"""
+        if not len(queries):
+            return
+        candidates = np.cumsum(self.candidates[self.cell[queries]])
+        limit = eps * eps
+
+        begin = 0
+        while begin < len(queries):
+            done = candidates[begin - 1] if begin else 0
+            end = max(int(np.searchsorted(candidates, done + max_pairs, side="right")), begin + 1)
+            neighbor_cells = self.neighbor_cells[self.cell[queries[begin:end]]].ravel()
+            segments = np.flatnonzero(neighbor_cells >= 0)
+            seg_lengths = self.counts[neighbor_cells[segments]]
+            seg_starts = self.starts[neighbor_cells[segments]]
+
+            # Concatenate the point ranges of every (query, neighbouring cell)
+            total = int(seg_lengths.sum())
+            seg_offsets = np.cumsum(seg_lengths) - seg_lengths
+            others = np.repeat(seg_starts - seg_offsets, seg_lengths) + np.arange(total)
+            query = np.repeat(queries[begin:end][segments // self.neighbor_cells.shape[1]], seg_lengths)
+
+            distances = np.zeros(total)
+            for column in self.columns:
+                delta = column[query]
+                delta -= column[others]
+                delta *= delta
+                distances += delta
+            close = distances <= limit
+            yield query[close], others[close]
+            begin = end
+
+
+def _components(n: int, heads: List[np.ndarray], tails: List[np.ndarray]) -> np.ndarray:
+    """Connected component of each of n nodes given lists of edge endpoints"""
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    heads, tails = np.concatenate(heads or [np.empty(0, dtype=np.int64)]), np.concatenate(tails or [np.empty(0, dtype=np.int64)])
+    graph = coo_matrix((np.ones(len(heads)), (heads, tails)), shape=(n, n))
+    return connected_components(graph, directed=False)[1]
+
+
+def _representatives(component: np.ndarray) -> np.ndarray:
+    """First node of each node's component"""
+    first = np.full(component.max() + 1, len(component))
+    np.minimum.at(first, component, np.arange(len(component)))
+    return first[component]
+
+
+def grid_dbscan(
+    features: np.ndarray, eps: float, min_samples: int, max_pairs: int = DEFAULT_MAX_PAIRS
+) -> np.ndarray:
+    """DBSCAN labels of a batch (-1 for noise) through a grid index with eps-sized cells"""
+    n = len(features)
+    labels = np.full(n, -1, dtype=np.int64)
+    if n == 0:
+        return labels
+    index = _CellIndex(np.asarray(features, dtype=np.float64), eps)
+
+    # Queries run in sorted order, so when a chunk is done the neighbourhood
+    # sizes (which include the point itself, as in sklearn) of every point up
+    # to it are final. An edge between two core points is kept when the later
+    # of them is queried; each chunk's edges are reduced to a spanning forest
+    # (every node to its component's first node) before being kept.
+    counts = np.zeros(n, dtype=np.int64)
+    core = np.zeros(n, dtype=bool)
+    heads, tails = [], []
+    kept = 0
+    for query, other in index.pairs(np.arange(n), eps, max_pairs):
+        low, high = int(query[0]), int(query[-1]) + 1
+        counts[low:high] = np.bincount(query - low, minlength=high - low)
+        core[low:high] = counts[low:high] >= min_samples
+
+        keep = core[query] & core[other] & (query != other)
+        query, other = query[keep], other[keep]
+        if not len(query):
+            continue
+        nodes, local = np.unique(np.r_[query, other], return_inverse=True)
+        component = _components(len(nodes), [local[:len(query)]], [local[len(query):]])
+        heads.append(nodes)
+        tails.append(nodes[_representatives(component)])
+        kept += len(nodes)
+        if kept > 2 * n:
+            # Keep the forest itself bounded: reduce it to one edge per node
+            heads, tails = [np.arange(n)], [_representatives(_components(n, heads, tails))]
+            kept = n
+    if not core.any():
+        return labels
+
+    component = _components(n, heads, tails)
+
+    # sklearn numbers clusters by their lowest-index core point
+    original = index.order
+    first_core = np.full(component.max() + 1, n)
+    np.minimum.at(first_core, component[core], original[core])
+    clustered = np.flatnonzero(first_core < n)
+    cluster_label = np.full(len(first_core), -1, dtype=np.int64)
+    cluster_label[clustered[np.argsort(first_core[clustered])]] = np.arange(len(clustered))
+
+    sorted_labels = np.where(core, cluster_label[component], -1)
+    # Border points join the lowest-numbered cluster among their core neighbours,
+    # the first cluster sklearn's expansion reaches them from
+    border = np.flatnonzero(~core & (counts > 1))
+    best = np.full(n, np.iinfo(np.int64).max)
+    for query, other in index.pairs(border, eps, max_pairs):
+        reached = core[other]
+        np.minimum.at(best, query[reached], sorted_labels[other[reached]])
+    joined = border[best[border] < np.iinfo(np.int64).max]
+    sorted_labels[joined] = best[joined]
+
+    labels[original] = sorted_labels
+    return labels
+
+
+class PatternWindow:
+    """Time- and size-bounded window of points clustered incrementally"""
+
+    def __init__(
+        self,
+        eps: float = 0.5,
+        min_samples: int = 5,
+        max_points: int = 100000,
+        max_age: float = 3600.0,
+        rebuild_fraction: float = 0.1,
+        max_pairs: int = DEFAULT_MAX_PAIRS,
+    ):
+        self.eps = eps
+        self.min_samples = min_samples
+        self.max_points = max_points
+        self.max_age = max_age
+        self.rebuild_fraction = rebuild_fraction
+        self.max_pairs = max_pairs
+
+        self.n_features: Optional[int] = None
+        self._lock = threading.Lock()
+        # Cells are hashed with a linear function, so the hash of a
+        # neighbouring cell is the cell's hash plus that of the offset
+        self._multipliers = np.empty(0, dtype=np.uint64)
+        self._offsets = np.empty(0, dtype=np.uint64)
+
+        # Ring buffer of points, oldest at _start; alive points hold the last
+        # _size sequence numbers handed out, in slot order
+        self._features = np.empty((0, 0))
+        self._hash = np.empty(0, dtype=np.uint64)
+        self._added_at = np.empty(0)
+        self._seq = np.empty(0, dtype=np.int64)
+        self._counts = np.empty(0, dtype=np.int64)
+        self._core = np.empty(0, dtype=bool)
+        self._ids = np.empty(0, dtype=object)
+        self._start = 0
+        self._size = 0
+        self._next_seq = 0
+
+        # Alive slots sorted by cell hash, kept sorted as points come and go,
+        # and the hash, first position and size of every cell, derived from
+        # it on first use after the window changes
+        self._order = np.empty(0, dtype=np.int64)
+        self._index: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
+        # Group of each core point, named by the sequence number of one of its
+        # points, and the sequence numbers of each group's points. Groups only
+        # merge; demoted and expired core points leave them stale until the
+        # next rebuild.
+        self._group = np.empty(0, dtype=np.int64)
+        self._members: Dict[int, List[int]] = {}
+        self._stale = 0
+
+        self.inserted = 0
+        self.expired = 0
+        self.rebuilds = 0
+
+    @classmethod
+    def from_env(cls) -> "PatternWindow":
+        return cls(
+            max_points=int(os.environ.get("SPOTTER_PATTERN_WINDOW_MAX_POINTS", "100000")),
+            max_age=float(os.environ.get("SPOTTER_PATTERN_WINDOW_SECONDS", "3600")),
+        )
+
+    def configure(self, eps: float, min_samples: int):
+        """Adopt clustering parameters, emptying the window if they change"""
+        with self._lock:
+            if (eps, min_samples) == (self.eps, self.min_samples):
+                return
+            self.eps = eps
+            self.min_samples = min_samples
+            self.n_features = None
+            self._index = None
+            self._members = {}
+            self._start = self._size = self._stale = 0
+
+    def _allocate(self, n_features: int):
+        self.n_features = n_features
+        rng = np.random.default_rng(0)
+        self._multipliers = rng.integers(1, 2**63, n_features, dtype=np.uint64) | np.uint64(1)
+        if n_features <= MAX_GRID_FEATURES:
+            offsets = np.array(list(itertools.product((-1, 0, 1), repeat=n_features)), dtype=np.int64)
+            self._offsets = self._cell_hash(offsets)
+        else:
+            self._offsets = np.empty(0, dtype=np.uint64)
+        self._features = np.zeros((self.max_points, n_features))
+        self._hash = np.zeros(self.max_points, dtype=np.uint64)
+        self._order = np.empty(0, dtype=np.int64)
+        self._index = None
+        self._added_at = np.zeros(self.max_points)
+        self._seq = np.full(self.max_points, -1, dtype=np.int64)
+        self._counts = np.zeros(self.max_points, dtype=np.int64)
+        self._core = np.zeros(self.max_points, dtype=bool)
+        self._ids = np.full(self.max_points, None, dtype=object)
+        self._group = np.full(self.max_points, -1, dtype=np.int64)
+
+    def _alive_slots(self) -> np.ndarray:
+        """Slots of the alive points, oldest first"""
+        return (self._start + np.arange(self._size)) % self.max_points
+
+    def _age_rank(self, slots: np.ndarray) -> np.ndarray:
+        """Position of alive slots from the oldest point"""
+        return (slots - self._start) % self.max_points
+
+    def _slots_of(self, seqs: np.ndarray) -> np.ndarray:
+        """Slots of alive sequence numbers"""
+        return (self._start + seqs - (self._next_seq - self._size)) % self.max_points
+
+    def _cell_hash(self, cells: np.ndarray) -> np.ndarray:
+        with np.errstate(over="ignore"):
+            return (cells.astype(np.uint64) * self._multipliers).sum(axis=1)
+
+    def _sorted_cells(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        if self._index is None:
+            order = self._order
+            hashes = self._hash[order]
+            starts = np.flatnonzero(np.r_[True, hashes[1:] != hashes[:-1]]) if len(order) else order
+            counts = np.diff(np.r_[starts, len(order)])
+            self._index = (order, hashes[starts], starts, counts)
+        return self._index
+
+    def _neighbor_pairs(self, slots: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(slot, neighbour) pairs of alive points within eps of each of slots, excluding themselves.
+
+        The 3^d cells around every slot are looked up in the sorted cell
+        index at once; candidates are compared at most max_pairs at a time.
+        A hash collision only adds candidates.
+        """
+        heads, tails = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+        if not len(slots):
+            return heads[0], tails[0]
+        if len(self._offsets):
+            step = max(1, self.max_pairs // len(self._offsets))
+            for begin in range(0, len(slots), step):
+                self._grid_pairs(slots[begin:begin + step], heads, tails)
+        else:
+            alive = self._alive_slots()
+            step = max(1, self.max_pairs // len(alive))
+            for begin in range(0, len(slots), step):
+                block = slots[begin:begin + step]
+                self._close(np.repeat(block, len(alive)), np.tile(alive, len(block)), heads, tails)
+        return np.concatenate(heads), np.concatenate(tails)
+
+    def _grid_pairs(self, slots: np.ndarray, heads: List[np.ndarray], tails: List[np.ndarray]):
+        order, hashes, starts, counts = self._sorted_cells()
+        with np.errstate(over="ignore"):
+            wanted = (self._hash[slots][:, None] + self._offsets).ravel()
+        position = np.minimum(np.searchsorted(hashes, wanted), len(hashes) - 1)
+        hit = np.flatnonzero(hashes[position] == wanted)
+        queries = slots[hit // len(self._offsets)]
+        seg_starts, seg_lengths = starts[position[hit]], counts[position[hit]]
+
+        # Concatenate the point ranges of every (slot, neighbouring cell)
+        candidates = np.cumsum(seg_lengths)
+        begin = 0
+        while begin < len(queries):
+            done = candidates[begin - 1] if begin else 0
+            end = max(int(np.searchsorted(candidates, done + self.max_pairs, side="right")), begin + 1)
+            lengths = seg_lengths[begin:end]
+            offsets = np.cumsum(lengths) - lengths
+            others = order[np.repeat(seg_starts[begin:end] - offsets, lengths) + np.arange(int(lengths.sum()))]
+            self._close(np.repeat(queries[begin:end], lengths), others, heads, tails)
+            begin = end
+
+    def _close(self, query: np.ndarray, others: np.ndarray, heads: List[np.ndarray], tails: List[np.ndarray]):
+        """Keep the candidate pairs of distinct points within eps"""
+        delta = self._features[query] - self._features[others]
+        close = (np.einsum("ij,ij->i", delta, delta) <= self.eps * self.eps) & (query != others)
+        heads.append(query[close])
+        tails.append(others[close])
+
+    def _connect(self, cores: np.ndarray, heads: np.ndarray, tails: np.ndarray):
+        """Give core points without a group one, merging the groups joined by heads -> tails edges"""
+        nodes = np.unique(np.r_[cores, heads, tails])
+        component = _components(
+            len(nodes), [np.searchsorted(nodes, heads)], [np.searchsorted(nodes, tails)]
+        )
+        order = np.argsort(component, kind="stable")
+        bounds = np.flatnonzero(np.diff(component[order])) + 1
+        for slots in np.split(nodes[order], bounds):
+            groups = self._group[slots]
+            self._merge(set(groups[groups >= 0].tolist()), slots[groups < 0])
+
+    def _merge(self, names: set, joining: np.ndarray):
+        """Fold groups into the largest of them, or a new one, together with points joining it"""
+        if names:
+            name = max(names, key=lambda group: len(self._members[group]))
+        else:
+            name = int(self._seq[joining[0]])
+            self._members[name] = []
+        members = self._members[name]
+        oldest = self._next_seq - self._size
+        for other in names - {name}:
+            seqs = np.array(self._members.pop(other), dtype=np.int64)
+            seqs = seqs[seqs >= oldest]
+            slots = self._slots_of(seqs)
+            # Points that left the group since are not moved with it
+            moved = self._group[slots] == other
+            self._group[slots[moved]] = name
+            members.extend(seqs[moved].tolist())
+        self._group[joining] = name
+        members.extend(self._seq[joining].tolist())
+
+    def _remove(self, slots: np.ndarray):
+        """Remove the oldest points, updating the counts of their neighbours"""
+        _, neighbors = self._neighbor_pairs(slots)
+        # The leaving points are the oldest len(slots) ones
+        neighbors = neighbors[self._age_rank(neighbors) >= len(slots)]
+        np.subtract.at(self._counts, neighbors, 1)
+        neighbors = np.unique(neighbors)
+        demoted = neighbors[self._core[neighbors] & (self._counts[neighbors] < self.min_samples)]
+        self._core[demoted] = False
+        self._group[demoted] = -1
+        self._stale += len(demoted) + int(self._core[slots].sum())
+
+        self._core[slots] = False
+        self._counts[slots] = 0
+        self._seq[slots] = -1
+        self._ids[slots] = None
+        self._group[slots] = -1
+        self._order = self._order[self._age_rank(self._order) >= len(slots)]
+        self._start = (self._start + len(slots)) % self.max_points
+        self._size -= len(slots)
+        self._index = None
+        self.expired += len(slots)
+
+    def _expire(self, now: float, incoming: int):
+        if not self._size:
+            return
+        cutoff = now - self.max_age
+        count = 0
+        if self._added_at[self._start] < cutoff:
+            # Points leave oldest first, as far as the first one still in time
+            old = self._added_at[self._alive_slots()] < cutoff
+            count = len(old) if old.all() else int(np.argmin(old))
+        count = min(max(count, self._size + incoming - self.max_points), self._size)
+        if count > 0:
+            self._remove((self._start + np.arange(count)) % self.max_points)
+
+    def add(self, ids: Sequence[str], features: np.ndarray, now: Optional[float] = None):
+        """Insert a batch of points, expiring old ones first.
+
+        The batch is placed, counted and connected as a whole: one
+        neighbour search covers all of it, and groups are merged once per
+        connected set of new core points.
+        """
+        if len(features) == 0:
+            return
+        if features.ndim != 2:
+            raise ValueError("Pattern window needs a 2-D feature matrix")
+        with self._lock:
+            if self.n_features is None:
+                self._allocate(features.shape[1])
+            elif features.shape[1] != self.n_features:
+                raise ValueError(
+                    f"Pattern window holds {self.n_features} features, got {features.shape[1]}"
+                )
+
+            now = time.time() if now is None else now
+            if len(features) > self.max_points:
+                ids, features = ids[-self.max_points:], features[-self.max_points:]
+            self._expire(now, len(features))
+
+            n = len(features)
+            slots = (self._start + self._size + np.arange(n)) % self.max_points
+            self._features[slots] = features
+            self._hash[slots] = self._cell_hash(np.floor(features / self.eps).astype(np.int64))
+            self._added_at[slots] = now
+            self._seq[slots] = self._next_seq + np.arange(n)
+            self._ids[slots] = list(ids)
+            self._size += n
+            self._next_seq += n
+            arrivals = slots[np.argsort(self._hash[slots], kind="stable")]
+            at = np.searchsorted(self._hash[self._order], self._hash[arrivals], side="right")
+            self._order = np.insert(self._order, at, arrivals)
+            self._index = None
+
+            # Pairs among the new points appear once from each side
+            heads, tails = self._neighbor_pairs(slots)
+            self._counts[slots] = 1
+            np.add.at(self._counts, heads, 1)
+            np.add.at(self._counts, tails[self._age_rank(tails) < self._size - n], 1)
+
+            touched = np.union1d(slots, tails)
+            promoted = touched[~self._core[touched] & (self._counts[touched] >= self.min_samples)]
+            self._core[promoted] = True
+            if len(promoted):
+                # Every new core-core edge has a new core point at one end
+                keep = self._core[heads] & self._core[tails]
+                heads, tails = heads[keep], tails[keep]
+                earlier = promoted[self._age_rank(promoted) < self._size - n]
+                if len(earlier):
+                    more_heads, more_tails = self._neighbor_pairs(earlier)
+                    keep = self._core[more_tails]
+                    heads, tails = np.r_[heads, more_heads[keep]], np.r_[tails, more_tails[keep]]
+                self._connect(promoted, heads, tails)
+
+            self.inserted += n
+            self._maybe_rebuild()
+
+    def _rebuild(self):
+        """Regroup all core points from their neighbourhoods"""
+        self._group[:] = -1
+        self._members = {}
+        cores = self._alive_slots()
+        cores = cores[self._core[cores]]
+        if len(cores):
+            heads, tails = self._neighbor_pairs(cores)
+            keep = self._core[tails]
+            self._connect(cores, heads[keep], tails[keep])
+        self._stale = 0
+        self.rebuilds += 1
+
+    def _maybe_rebuild(self):
+        if self._stale and self._stale > self.rebuild_fraction * max(int(self._core.sum()), 1):
+            self._rebuild()
+
+    def _labels(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Alive slots and their group labels (-1 for noise)"""
+        self._maybe_rebuild()
+
+        slots = self._alive_slots()
+        core = self._core[slots]
+        labels = np.where(core, self._group[slots], -1)
+        # Border points join the lowest-named group among their core neighbours.
+        # Neighbourhoods are symmetric, so they are searched from whichever of
+        # the core and border points are fewer.
+        border = slots[~core & (self._counts[slots] > 1)]
+        cores = slots[core]
+        if len(border) and len(cores):
+            if len(cores) < len(border):
+                tails, heads = self._neighbor_pairs(cores)
+            else:
+                heads, tails = self._neighbor_pairs(border)
+            reached = self._core[tails] & ~self._core[heads]
+            unset = np.iinfo(np.int64).max
+            best = np.full(self.max_points, unset)
+            np.minimum.at(best, heads[reached], self._group[tails[reached]])
+            joined = border[best[border] < unset]
+            labels[self._age_rank(joined)] = best[joined]
+        return slots, labels
+
+    def groups(self, ids: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Current groups, optionally only those containing one of ids"""
+        with self._lock:
+            if not self._size:
+                return []
+            slots, labels = self._labels()
+            groups = summarize_groups(self._features[slots], labels)
+            for group in groups:
+                group["transactions"] = self._ids[slots[group.pop("indices")]].tolist()
+
+        if ids is not None:
+            wanted = set(ids)
+            groups = [g for g in groups if wanted.intersection(g["transactions"])]
+        return groups
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            oldest = float(self._added_at[self._start]) if self._size else None
+            return {
+                "points": self._size,
+                "max_points": self.max_points,
+                "max_age_seconds": self.max_age,
+                "core_points": int(self._core.sum()),
+                "grid_cells": len(self._sorted_cells()[1]) if self._size else 0,
+                "oldest_point_age_seconds": time.time() - oldest if oldest is not None else 0.0,
+                "inserted": self.inserted,
+                "expired": self.expired,
+                "rebuilds": self.rebuilds,
+            }
@@ -0,0 +1,112 @@
+"""
+Sampling profiler for the Azora AI Spotter.
+
+A background thread snapshots the stack of every other thread at a fixed
+interval and counts identical stacks. Nothing is installed on the hot path,
+so it can be switched on in production for a bounded time; the result is
+reported in the collapsed-stack format read by flamegraph tools
+("frame;frame;frame count" per line).
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """Periodic whole-process stack sampler, started and stopped at runtime"""
+
+    def __init__(self, enabled: bool = False, max_seconds: float = 300.0):
+        self.enabled = enabled
+        self.max_seconds = max_seconds
+        self.interval = 0.01
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "SamplingProfiler":
+        return cls(
+            enabled=os.environ.get("SPOTTER_PROFILER", "false").lower() in ("1", "true", "yes"),
+            max_seconds=float(os.environ.get("SPOTTER_PROFILER_MAX_SECONDS", "300")),
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float = 0.01, duration: Optional[float] = None):
+        """Begin sampling, discarding the previous profile"""
+        if not self.enabled:
+            raise PermissionError("Profiling is disabled (set SPOTTER_PROFILER=true)")
+        if self.running:
+            raise RuntimeError("Profiler is already running")
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        duration = min(duration or self.max_seconds, self.max_seconds)
+
+        self.interval = interval
+        with self._lock:
+            self.samples = Counter()
+            self.sample_count = 0
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(duration,), name="spotter-profiler", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Sampling profiler started: interval={interval * 1000:.1f}ms, duration={duration}s")
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, duration: float):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + duration
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stacks.append(";".join(reversed(stack)))
+            with self._lock:
+                self.samples.update(stacks)
+                self.sample_count += 1
+        self.stopped_at = time.time()
+        logger.info(f"Sampling profiler stopped after {self.sample_count} samples")
+
+    def collapsed(self) -> str:
+        """The current profile in collapsed-stack format, hottest stacks first"""
+        with self._lock:
+            ranked = self.samples.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in ranked)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "samples": self.sample_count,
+            "distinct_stacks": len(self.samples),
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+        }
@@ -0,0 +1,181 @@
+"""
+Versioned model registry for the Azora AI Spotter.
+
+Every model artifact is published once as an immutable version under
+MODEL_DIR/<model_name>/versions/ and a CURRENT file names the version being
+served. Publishing and activation are atomic renames, so a crash never
+leaves a half-written model behind and every worker that polls CURRENT
+converges on the same version. Loading memory-maps only the plain NumPy
+arrays stored in an artifact; tree models copy their node arrays into
+their own buffers, and process workers receive pickled copies, so every
+worker holds its own copy of a model.
+"""
+
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+# Reported as model_version while a built-in default model is served
+DEFAULT_MODEL_VERSION = "default"
+
+# Registry names of the models behind each model_type
+MODEL_NAMES = {
+    "anomaly_detection": "anomaly_model",
+    "clustering": "clustering_model",
+}
+
+
+class ModelRegistry:
+    """Immutable model versions with an atomic CURRENT pointer per model"""
+
+    def __init__(self, root: str, keep_versions: int = 5):
+        self.root = root
+        self.keep_versions = keep_versions
+
+    @classmethod
+    def from_env(cls, model_dir: str) -> "ModelRegistry":
+        return cls(model_dir, keep_versions=int(os.environ.get("SPOTTER_MODEL_KEEP_VERSIONS", "5")))
+
+    def _versions_dir(self, name: str) -> str:
+        return os.path.join(self.root, name, "versions")
+
+    def artifact_path(self, name: str, version: str) -> str:
+        return os.path.join(self._versions_dir(name), f"{version}.joblib")
+
+    def _metadata_path(self, name: str, version: str) -> str:
+        return os.path.join(self._versions_dir(name), f"{version}.json")
+
+    def baseline_path(self, name: str, version: str) -> str:
+        """Drift baseline of a version's training sample (see spotter_drift)"""
+        return os.path.join(self._versions_dir(name), f"{version}.baseline.json")
+
+    def compiled_path(self, name: str, version: str) -> str:
+        """Node tables of a version's compiled IsolationForest, written on first load (see spotter_segments)"""
+        return os.path.join(self._versions_dir(name), f"{version}.compiled.npz")
+
+    def current_version(self, name: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, name, "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def publish(
+        self,
+        name: str,
+        artifact_path: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        baseline_path: Optional[str] = None,
+    ) -> str:
+        """Move a finished artifact, and its drift baseline if any, into the registry as a new version"""
+        os.makedirs(self._versions_dir(name), exist_ok=True)
+        version = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+        document = {
+            "version": version,
+            "model_name": name,
+            "published_at": time.time(),
+            "drift_baseline": baseline_path is not None,
+            **(metadata or {}),
+        }
+        metadata_path = self._metadata_path(name, version)
+        with open(f"{metadata_path}.tmp", "w") as f:
+            json.dump(document, f, default=str)
+        os.replace(f"{metadata_path}.tmp", metadata_path)
+
+        if baseline_path is not None:
+            os.replace(baseline_path, self.baseline_path(name, version))
+        os.replace(artifact_path, self.artifact_path(name, version))
+        logger.info(f"Published {name} version {version}")
+        return version
+
+    def publish_model(
+        self,
+        name: str,
+        model,
+        metadata: Optional[Dict[str, Any]] = None,
+        baseline: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Dump a model object, and its drift baseline if given, and publish it"""
+        os.makedirs(self._versions_dir(name), exist_ok=True)
+        staging = os.path.join(self._versions_dir(name), f".staging-{uuid.uuid4().hex}.joblib")
+        # Uncompressed so arrays can be memory-mapped on load
+        joblib.dump(model, staging)
+        baseline_path = None
+        if baseline is not None:
+            baseline_path = f"{staging}.baseline.json"
+            with open(baseline_path, "w") as f:
+                json.dump(baseline, f)
+        return self.publish(name, staging, metadata, baseline_path)
+
+    def activate(self, name: str, version: str):
+        """Point CURRENT at a published version"""
+        if not os.path.exists(self.artifact_path(name, version)):
+            raise FileNotFoundError(f"{name} version {version} is not in the registry")
+        pointer = os.path.join(self.root, name, "CURRENT")
+        with open(f"{pointer}.{os.getpid()}.tmp", "w") as f:
+            f.write(version)
+        os.replace(f"{pointer}.{os.getpid()}.tmp", pointer)
+        logger.info(f"Activated {name} version {version}")
+        self.prune(name)
+
+    def load(self, name: str, version: str):
+        return joblib.load(self.artifact_path(name, version), mmap_mode="r")
+
+    def load_baseline(self, name: str, version: str) -> Optional[Dict[str, Any]]:
+        """A version's drift baseline, or None if it was published without one"""
+        try:
+            with open(self.baseline_path(name, version)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def versions(self, name: str) -> List[Dict[str, Any]]:
+        """Metadata of every published version, newest first"""
+        directory = self._versions_dir(name)
+        if not os.path.isdir(directory):
+            return []
+        current = self.current_version(name)
+        documents = []
+        for filename in os.listdir(directory):
+            # Metadata only: not drift baselines or files still being staged
+            if not filename.endswith(".json") or filename.endswith(".baseline.json") or filename.startswith("."):
+                continue
+            with open(os.path.join(directory, filename)) as f:
+                document = json.load(f)
+            document["current"] = document["version"] == current
+            documents.append(document)
+        return sorted(documents, key=lambda d: d["published_at"], reverse=True)
+
+    def prune(self, name: str):
+        """Drop the oldest versions beyond keep_versions, never the current one"""
+        current = self.current_version(name)
+        stale = [d["version"] for d in self.versions(name) if d["version"] != current][self.keep_versions - 1:]
+        for version in stale:
+            for path in (
+                self.artifact_path(name, version),
+                self._metadata_path(name, version),
+                self.baseline_path(name, version),
+                self.compiled_path(name, version),
+            ):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def import_legacy(self, name: str) -> Optional[str]:
+        """Adopt a pre-registry MODEL_DIR/<name>.joblib as the first version"""
+        legacy_path = os.path.join(self.root, f"{name}.joblib")
+        if self.current_version(name) is not None or not os.path.exists(legacy_path):
+            return None
+        model = joblib.load(legacy_path)
+        version = self.publish_model(name, model, {"source": legacy_path})
+        self.activate(name, version)
+        return version
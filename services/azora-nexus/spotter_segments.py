@@ -0,0 +1,287 @@
+"""
+Per-segment anomaly models for the Azora AI Spotter.
+
+One global IsolationForest has to cover markets whose amounts, hours and
+counterparties look nothing alike. A segment model is an anomaly model
+trained on the transactions of one segment only, e.g. country=ZA or
+country=NG,currency=NGN, and published in the registry as
+anomaly_model@<segment>. SegmentRouter knows which segments have a model
+under the configured fields and splits a batch by segment: each field is
+factorized with np.unique, the codes are combined into one integer per
+row and rows are grouped by it, so only the distinct segments of a batch
+are handled in Python. Rows whose segment has no model go to the global
+model.
+
+Segment models are loaded on first use and kept, compiled to node tables,
+in a SegmentModels LRU bounded by a number of models and a number of bytes,
+so a mix of hundreds of segments is served from a fixed amount of memory.
+The node tables are also written next to the artifact, so reloading an
+evicted model reads one .npz file instead of unpickling every tree. With
+the process executor each worker keeps its own LRU and loads models from
+MODEL_DIR itself.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from spotter_iforest import CompiledIsolationForest, compile_isolation_forest
+from spotter_registry import MODEL_NAMES, ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+# Transaction fields a segment can be defined by, in the order names list them
+SEGMENT_FIELDS = ("country", "currency", "category")
+SEGMENT_MODEL_PREFIX = f"{MODEL_NAMES['anomaly_detection']}@"
+# Segment values become directory names under MODEL_DIR
+_SEGMENT_VALUE = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]*$")
+# Node tables and parameters of a CompiledIsolationForest, as stored in its .npz file
+_COMPILED_ARRAYS = ("feature", "threshold", "children", "leaf_value", "node_samples", "roots")
+_COMPILED_SCALARS = ("max_depth", "n_features_in_", "denominator", "offset_")
+
+
+def segment_name(values: Dict[str, Any]) -> str:
+    """Canonical name of a segment, e.g. "country=ZA,currency=ZAR"; raises ValueError if invalid"""
+    unknown = sorted(set(values) - set(SEGMENT_FIELDS))
+    if unknown or not values:
+        raise ValueError(f"Segments are defined by {SEGMENT_FIELDS}, got {sorted(values)}")
+    parts = []
+    for field in SEGMENT_FIELDS:
+        if field in values:
+            value = str(values[field])
+            if not _SEGMENT_VALUE.match(value):
+                raise ValueError(f"Invalid segment value '{value}' for {field}")
+            parts.append(f"{field}={value}")
+    return ",".join(parts)
+
+
+def parse_segment(name: str) -> Dict[str, str]:
+    """Field values of a canonical segment name"""
+    return dict(part.split("=", 1) for part in name.split(","))
+
+
+def segment_model_name(segment: str) -> str:
+    """Registry name of a segment's anomaly model"""
+    return f"{SEGMENT_MODEL_PREFIX}{segment}"
+
+
+def segment_fields_from_env() -> Tuple[str, ...]:
+    """Fields of SPOTTER_SEGMENT_BY in canonical order; empty when routing is off"""
+    fields = [part.strip().lower() for part in os.environ.get("SPOTTER_SEGMENT_BY", "").split(",") if part.strip()]
+    unknown = sorted(set(fields) - set(SEGMENT_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown SPOTTER_SEGMENT_BY fields {unknown}, expected some of {SEGMENT_FIELDS}")
+    return tuple(field for field in SEGMENT_FIELDS if field in fields)
+
+
+class SegmentModels:
+    """LRU of compiled segment models within a model count and a byte budget"""
+
+    def __init__(self, root: str, max_models: int = 32, max_bytes: int = 256 * 2**20):
+        self.root = root
+        self.max_models = max(1, max_models)
+        self.max_bytes = max_bytes
+        self._registry = ModelRegistry(root)
+        self._models: "OrderedDict[Tuple[str, str], CompiledIsolationForest]" = OrderedDict()
+        self._sizes: Dict[Tuple[str, str], int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self._load_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, model_dir: str) -> "SegmentModels":
+        return cls(
+            model_dir,
+            max_models=int(os.environ.get("SPOTTER_SEGMENT_MAX_MODELS", "32")),
+            max_bytes=int(float(os.environ.get("SPOTTER_SEGMENT_MEMORY_MB", "256")) * 2**20),
+        )
+
+    def __reduce__(self):
+        # Process-pool workers get the same budget with an empty cache of their own
+        return (SegmentModels, (self.root, self.max_models, self.max_bytes))
+
+    def resident(self, segment: str, version: str) -> bool:
+        return (segment, version) in self._models
+
+    def get(self, segment: str, version: str) -> CompiledIsolationForest:
+        """A segment model version, loaded and compiled on first use"""
+        key = (segment, version)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return model
+
+        # Loaded outside the lock so hits on other segments never wait for it;
+        # concurrent misses on one segment may both load it, and one copy is kept
+        start = time.perf_counter()
+        model = self._load(segment_model_name(segment), version)
+        size = sum(value.nbytes for value in vars(model).values() if isinstance(value, np.ndarray))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.loads += 1
+            self._load_seconds += elapsed
+            if key in self._models:
+                return self._models[key]
+            self._models[key] = model
+            self._sizes[key] = size
+            self._bytes += size
+            # The model just loaded stays even if it alone exceeds the budget
+            while len(self._models) > 1 and (len(self._models) > self.max_models or self._bytes > self.max_bytes):
+                evicted, _ = self._models.popitem(last=False)
+                self._bytes -= self._sizes.pop(evicted)
+                self.evictions += 1
+        return model
+
+    def _load(self, name: str, version: str) -> CompiledIsolationForest:
+        """A version's compiled node tables, compiling and storing them on first load"""
+        path = self._registry.compiled_path(name, version)
+        try:
+            with np.load(path) as tables:
+                return CompiledIsolationForest(
+                    *(tables[key] for key in _COMPILED_ARRAYS),
+                    max_depth=int(tables["max_depth"]),
+                    n_features_in=int(tables["n_features_in_"]),
+                    denominator=float(tables["denominator"]),
+                    offset=float(tables["offset_"]),
+                )
+        except FileNotFoundError:
+            pass
+
+        model = compile_isolation_forest(self._registry.load(name, version))
+        if model is None:
+            raise ValueError(f"{name} version {version} is not an IsolationForest")
+        tables = {key: getattr(model, key) for key in _COMPILED_ARRAYS + _COMPILED_SCALARS}
+        try:
+            with open(f"{path}.{os.getpid()}.tmp", "wb") as f:
+                np.savez(f, **tables)
+            os.replace(f"{path}.{os.getpid()}.tmp", path)
+        except OSError as e:
+            logger.warning(f"Could not store compiled {name} version {version}: {e}")
+        return model
+
+    def stats(self) -> Dict[str, Any]:
+        """Resident models and bytes against the budget, and cache counters"""
+        with self._lock:
+            resident = [f"{segment}@{version}" for segment, version in self._models]
+            used = self._bytes
+        return {
+            "max_models": self.max_models,
+            "max_bytes": self.max_bytes,
+            "resident_models": len(resident),
+            "resident_bytes": used,
+            "resident": resident,
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "mean_load_ms": self._load_seconds / self.loads * 1000 if self.loads else 0.0,
+        }
+
+
+class SegmentRouter:
+    """Which segments have a model, and the rows of a batch that go to each"""
+
+    def __init__(self, registry: ModelRegistry, fields: Sequence[str]):
+        self.registry = registry
+        self.fields = tuple(field for field in SEGMENT_FIELDS if field in fields)
+        # Segment name -> current version of its model
+        self.models: Dict[str, str] = {}
+        # Digest of the routing table, identical on every worker serving the same
+        # segment model versions, so cached scores of another table are not reused
+        self.digest = "none"
+        self.segment_rows = 0
+        self.global_rows = 0
+
+    @classmethod
+    def from_env(cls, registry: ModelRegistry) -> Optional["SegmentRouter"]:
+        """The configured router if SPOTTER_SEGMENT_BY names any fields, otherwise None"""
+        fields = segment_fields_from_env()
+        if not fields:
+            return None
+        return cls(registry, fields)
+
+    def refresh(self) -> bool:
+        """Re-read the segment models in the registry; True if the routing table changed"""
+        models = {}
+        try:
+            entries = os.listdir(self.registry.root)
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            if not entry.startswith(SEGMENT_MODEL_PREFIX):
+                continue
+            segment = entry[len(SEGMENT_MODEL_PREFIX):]
+            try:
+                fields = tuple(parse_segment(segment))
+            except ValueError:
+                continue
+            # Models of segments defined by other fields are ignored
+            if fields != self.fields:
+                continue
+            version = self.registry.current_version(entry)
+            if version is not None:
+                models[segment] = version
+        if models == self.models:
+            return False
+        self.models = models
+        table = ",".join(f"{segment}@{version}" for segment, version in sorted(models.items()))
+        self.digest = hashlib.sha1(table.encode()).hexdigest()[:12] if models else "none"
+        logger.info(f"Routing {len(models)} segments by {','.join(self.fields)} to their own models")
+        return True
+
+    def route(
+        self, values: Dict[str, Sequence], count: bool = True
+    ) -> Tuple[List[Tuple[str, str, np.ndarray]], np.ndarray]:
+        """(segment, version, rows) of every segment in the batch with a model, and the rows left to the global model"""
+        models = self.models
+        n = len(values[self.fields[0]])
+        # Mixed-radix code of each row's field values
+        codes = np.zeros(n, dtype=np.int64)
+        uniques = []
+        for field in self.fields:
+            unique, inverse = np.unique(np.asarray(values[field], dtype=str), return_inverse=True)
+            codes = codes * len(unique) + inverse.reshape(-1)
+            uniques.append(unique)
+        combinations, inverse = np.unique(codes, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(inverse, minlength=len(combinations)))])
+
+        groups, rest = [], []
+        for index, code in enumerate(combinations.tolist()):
+            parts = []
+            for field, unique in zip(reversed(self.fields), reversed(uniques)):
+                code, position = divmod(code, len(unique))
+                parts.append(f"{field}={unique[position]}")
+            segment = ",".join(reversed(parts))
+            rows = order[bounds[index]:bounds[index + 1]]
+            version = models.get(segment)
+            if version is None:
+                rest.append(rows)
+            else:
+                groups.append((segment, version, rows))
+        global_rows = np.sort(np.concatenate(rest)) if rest else np.empty(0, dtype=np.int64)
+        if count:
+            self.segment_rows += n - len(global_rows)
+            self.global_rows += len(global_rows)
+        return groups, global_rows
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "fields": list(self.fields),
+            "digest": self.digest,
+            "segments": dict(sorted(self.models.items())),
+            "segment_rows": self.segment_rows,
+            "global_rows": self.global_rows,
+        }
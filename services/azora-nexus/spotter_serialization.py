@@ -0,0 +1,105 @@
+"""
+Fast response serialization for the Azora AI Spotter.
+
+Large batches spend more time building and re-validating one AnomalyResult
+model per row than scoring them. These helpers write the same JSON schema
+straight from the score arrays, formatting each row from a template with
+C-accelerated string escaping and no per-row model objects.
+"""
+
+import json
+import os
+from json.encoder import encode_basestring
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+FAST_RESPONSE_HEADER = "x-response-mode"
+
+_RESULT_TEMPLATE = (
+    '{"transaction_id":%s,"is_anomaly":%s,"anomaly_score":%s,'
+    '"risk_level":"%s","features_contribution":%s}'
+)
+
+
+def fast_endpoints_from_env() -> frozenset:
+    """Endpoints ("anomalies", "patterns") that serialize fast by default"""
+    value = os.environ.get("SPOTTER_FAST_RESPONSES", "")
+    if value.strip().lower() == "all":
+        return frozenset({"anomalies", "patterns"})
+    return frozenset(part.strip().lower() for part in value.split(",") if part.strip())
+
+
+def use_fast_response(endpoint: str, headers, fast_endpoints: frozenset) -> bool:
+    """X-Response-Mode: fast|standard overrides the per-endpoint default"""
+    mode = headers.get(FAST_RESPONSE_HEADER, "").strip().lower()
+    if mode == "fast":
+        return True
+    if mode == "standard":
+        return False
+    return endpoint in fast_endpoints
+
+
+def _float_repr(values: np.ndarray) -> List[str]:
+    text = list(map(repr, values.tolist()))
+    # JSON has no NaN/Infinity; Pydantic writes them as null
+    for i in np.flatnonzero(~np.isfinite(values)).tolist():
+        text[i] = "null"
+    return text
+
+
+def anomaly_response_json(
+    transaction_ids: Sequence[str],
+    scores: np.ndarray,
+    anomaly_flags: np.ndarray,
+    levels: np.ndarray,
+    batch_id: str,
+    processing_time: float,
+    model_version: str,
+    anomalies_found: int,
+    early_exits: Optional[int] = None,
+    contributions: Optional[Dict[int, Dict[str, float]]] = None,
+    cache_hit_ratio: Optional[float] = None,
+) -> bytes:
+    """AnomalyResponse JSON built directly from the score arrays"""
+    flags = np.where(anomaly_flags, "true", "false").tolist()
+    explained = ["null"] * len(flags)
+    for row, contribution in (contributions or {}).items():
+        explained[row] = json.dumps(contribution, separators=(",", ":"))
+    rows = ",".join(map(
+        _RESULT_TEMPLATE.__mod__,
+        zip(map(encode_basestring, transaction_ids), flags, _float_repr(scores), levels.tolist(), explained),
+    ))
+    return (
+        f'{{"results":[{rows}],"batch_id":{encode_basestring(batch_id)},'
+        f'"processing_time":{processing_time!r},"model_version":{encode_basestring(model_version)},'
+        f'"anomalies_found":{int(anomalies_found)},'
+        f'"early_exits":{"null" if early_exits is None else int(early_exits)},'
+        f'"cache_hit_ratio":{"null" if cache_hit_ratio is None else repr(float(cache_hit_ratio))}}}'
+    ).encode("utf-8")
+
+
+def pattern_response_json(
+    groups: List[Dict[str, Any]],
+    processing_time: float,
+    model_version: str,
+) -> bytes:
+    """PatternResponse JSON from plain group dictionaries"""
+    return json.dumps(
+        {
+            "groups": [
+                {
+                    "group_id": group["group_id"],
+                    "transactions": group["transactions"],
+                    "centroid": group["centroid"],
+                    "density": group["density"],
+                    "risk_score": group["risk_score"],
+                }
+                for group in groups
+            ],
+            "total_groups": len(groups),
+            "processing_time": processing_time,
+            "model_version": model_version,
+        },
+        separators=(",", ":"),
+    ).encode("utf-8")
@@ -0,0 +1,88 @@
+"""
+Startup tracking for the Azora AI Spotter.
+
+An autoscaled pod should take traffic once it can answer quickly, not as
+soon as uvicorn listens. The service therefore answers /health (liveness)
+right away while models load and warm up in the background, and /ready
+(readiness) answers 503 until that has finished and again once shutdown has
+begun. StartupTracker times each phase from process start and logs the
+breakdown when the service becomes ready. A phase that raises is recorded
+as failed and the service never becomes ready, so /ready keeps answering
+503 with the error.
+"""
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def process_start_time() -> float:
+    """Wall-clock time the current process started, or now if it cannot be read"""
+    try:
+        with open("/proc/self/stat") as f:
+            # starttime is field 22; fields are counted after the "(comm)" one
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+class StartupTracker:
+    """Phase timings from process start to readiness, and the readiness state"""
+
+    def __init__(self, started_at: Optional[float] = None):
+        self.started_at = started_at if started_at is not None else process_start_time()
+        self.phases: Dict[str, float] = {}
+        self.ready_at: Optional[float] = None
+        self.draining = False
+        self.failed_phase: Optional[str] = None
+        self.error: Optional[str] = None
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block as one startup phase"""
+        start = time.time()
+        try:
+            yield
+        except Exception as e:
+            self.mark_failed(name, e)
+            raise
+        finally:
+            self.record(name, time.time() - start)
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None and not self.draining
+
+    def mark_ready(self):
+        self.ready_at = time.time()
+        breakdown = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases.items())
+        logger.info(f"Ready {self.ready_at - self.started_at:.2f}s after process start ({breakdown})")
+
+    def mark_failed(self, phase: str, error: BaseException):
+        if self.failed_phase is None:
+            self.failed_phase = phase
+            self.error = f"{type(error).__name__}: {error}"
+            logger.error(f"Startup failed in phase {phase}: {self.error}")
+
+    def mark_draining(self):
+        self.draining = True
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "draining": self.draining,
+            "failed_phase": self.failed_phase,
+            "error": self.error,
+            "startup_seconds": self.ready_at - self.started_at if self.ready_at is not None else None,
+            "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+        }
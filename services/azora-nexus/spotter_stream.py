@@ -0,0 +1,256 @@
+"""
+WebSocket ingest streams for the Azora AI Spotter.
+
+A gateway that posts every few transactions to /api/analyze/anomalies pays
+for routing, request parsing and often a connection each time. An ingest
+stream keeps one WebSocket open instead: the client sends transactions as
+they arrive, the server gathers them into batches of up to batch_rows (or
+whatever arrived within the batching window), scores each batch and sends
+its results back in order.
+
+Both directions are credit-based and counted in rows. The server grants the
+client credit to send transactions and hands it back only once their results
+have been sent, so the rows held for one stream never exceed
+max_pending_rows. The client grants the server credit to send results, so a
+consumer that falls behind holds back results, and with them new input,
+instead of filling the socket's write buffer.
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from spotter_features import risk_levels
+from spotter_serialization import anomaly_response_json
+
+# Transactions and result credit carried by one client message
+ReceiveFn = Callable[[], Awaitable[Tuple[List[Any], int]]]
+SendFn = Callable[[str], Awaitable[None]]
+# (batch_id, transactions) -> ids, scores, model version, early exits, cache hit ratio
+ScoreFn = Callable[
+    [str, List[Any]],
+    Awaitable[Tuple[List[str], np.ndarray, str, Optional[int], Optional[float]]],
+]
+
+
+class StreamProtocolError(Exception):
+    """A client broke the stream protocol, e.g. by sending more rows than it was granted"""
+
+
+class _ScoredBatch:
+    """Results of one batch, sent in as many frames as the client's credit requires"""
+
+    __slots__ = ("batch_id", "ids", "scores", "levels", "model_version", "early_exits",
+                 "cache_hit_ratio", "processing_time", "offset")
+
+    def __init__(self, batch_id, ids, scores, model_version, early_exits, cache_hit_ratio, processing_time):
+        self.batch_id = batch_id
+        self.ids = ids
+        self.scores = scores
+        self.levels = risk_levels(scores)
+        self.model_version = model_version
+        self.early_exits = early_exits
+        self.cache_hit_ratio = cache_hit_ratio
+        self.processing_time = processing_time
+        self.offset = 0
+
+    @property
+    def remaining(self) -> int:
+        return len(self.ids) - self.offset
+
+    def frame(self, rows: int) -> str:
+        """AnomalyResponse JSON of the next rows results"""
+        start, stop = self.offset, self.offset + rows
+        self.offset = stop
+        scores = self.scores[start:stop]
+        flags = scores < 0
+        # Early exits and cache hits describe the whole batch; report them once
+        first = start == 0
+        return anomaly_response_json(
+            self.ids[start:stop],
+            scores,
+            flags,
+            self.levels[start:stop],
+            self.batch_id,
+            self.processing_time,
+            self.model_version,
+            int(flags.sum()),
+            self.early_exits if first else None,
+            None,
+            self.cache_hit_ratio if first else None,
+        ).decode("utf-8")
+
+
+class IngestStream:
+    """One client connection: reads transactions, scores them in batches, sends results against credit"""
+
+    def __init__(self, streams: "IngestStreams", receive: ReceiveFn, send: SendFn, score: ScoreFn):
+        self.stream_id = f"stream-{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        self._streams = streams
+        self._receive = receive
+        self._send = send
+        self._score = score
+
+        self._incoming: List[Any] = []
+        self._outgoing: Deque[_ScoredBatch] = deque()
+        # Rows received whose results have not been sent yet
+        self.pending_rows = 0
+        # Rows the client may still send, and rows sent back but not yet re-granted
+        self._granted = streams.max_pending_rows
+        self._returned = 0
+        # Result rows the client is ready to receive
+        self._credit = 0
+        self._arrived = asyncio.Event()
+        self._sendable = asyncio.Event()
+        self._stalled = False
+        self._batches = 0
+
+    async def run(self):
+        """Serve the stream until the client disconnects or a task fails"""
+        await self._send(json.dumps({"credit": self._granted}))
+        tasks = [
+            asyncio.ensure_future(self._read()),
+            asyncio.ensure_future(self._batch()),
+            asyncio.ensure_future(self._write()),
+        ]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _read(self):
+        # Always reading keeps credit grants flowing; input is bounded by the server's own grants
+        while True:
+            transactions, credit = await self._receive()
+            if credit:
+                self._credit += credit
+                self._sendable.set()
+            if not transactions:
+                continue
+            rows = len(transactions)
+            if rows > self._granted:
+                raise StreamProtocolError(f"Sent {rows} transactions with credit for {self._granted}")
+            self._granted -= rows
+            self._incoming.extend(transactions)
+            self.pending_rows += rows
+            self._streams.rows_received += rows
+            self._arrived.set()
+
+    async def _batch(self):
+        streams = self._streams
+        while True:
+            await self._arrived.wait()
+            if len(self._incoming) < streams.batch_rows:
+                # Let the rest of a burst arrive before scoring a small batch
+                await asyncio.sleep(streams.window)
+            transactions = self._incoming[:streams.batch_rows]
+            del self._incoming[:streams.batch_rows]
+            if not self._incoming:
+                self._arrived.clear()
+
+            self._batches += 1
+            batch_id = f"{self.stream_id}-{self._batches}"
+            start = time.time()
+            ids, scores, model_version, early_exits, cache_hit_ratio = await self._score(batch_id, transactions)
+            self._outgoing.append(_ScoredBatch(
+                batch_id, ids, scores, model_version, early_exits, cache_hit_ratio, time.time() - start
+            ))
+            streams.batches += 1
+            streams.batched_rows += len(transactions)
+            self._sendable.set()
+
+    async def _write(self):
+        streams = self._streams
+        while True:
+            await self._sendable.wait()
+            if not self._outgoing or self._credit <= 0:
+                if self._outgoing and not self._stalled:
+                    self._stalled = True
+                    streams.credit_stalls += 1
+                self._sendable.clear()
+                continue
+            self._stalled = False
+
+            results = self._outgoing[0]
+            rows = min(self._credit, results.remaining)
+            await self._send(results.frame(rows))
+            if not results.remaining:
+                self._outgoing.popleft()
+            self._credit -= rows
+            self.pending_rows -= rows
+            self._returned += rows
+            streams.rows_sent += rows
+
+            # Re-grant in large steps rather than after every frame; the client
+            # still holds at least half its window in the meantime
+            if self._returned >= streams.max_pending_rows // 2:
+                await self._send(json.dumps({"credit": self._returned}))
+                self._granted += self._returned
+                self._returned = 0
+
+
+class IngestStreams:
+    """Settings and counters shared by every open ingest stream"""
+
+    def __init__(self, batch_rows: int = 512, window: float = 0.005, max_pending_rows: int = 10000):
+        self.batch_rows = max(1, batch_rows)
+        self.window = window
+        self.max_pending_rows = max(self.batch_rows, max_pending_rows)
+
+        self._open: Set[IngestStream] = set()
+        self.opened = 0
+        self.protocol_errors = 0
+        self.rows_received = 0
+        self.rows_sent = 0
+        self.batches = 0
+        self.batched_rows = 0
+        self.credit_stalls = 0
+
+    @classmethod
+    def from_env(cls) -> "IngestStreams":
+        return cls(
+            batch_rows=int(os.environ.get("SPOTTER_STREAM_BATCH_ROWS", "512")),
+            window=float(os.environ.get("SPOTTER_STREAM_WINDOW_MS", "5")) / 1000,
+            max_pending_rows=int(os.environ.get("SPOTTER_STREAM_MAX_PENDING_ROWS", "10000")),
+        )
+
+    async def serve(self, receive: ReceiveFn, send: SendFn, score: ScoreFn):
+        """Run one stream over the given connection callbacks"""
+        stream = IngestStream(self, receive, send, score)
+        self._open.add(stream)
+        self.opened += 1
+        try:
+            await stream.run()
+        except StreamProtocolError:
+            self.protocol_errors += 1
+            raise
+        finally:
+            self._open.discard(stream)
+
+    def stats(self) -> Dict[str, Any]:
+        """Open streams, rows held for them and batching counters"""
+        return {
+            "batch_rows": self.batch_rows,
+            "window_ms": self.window * 1000,
+            "max_pending_rows": self.max_pending_rows,
+            "open_streams": len(self._open),
+            "pending_rows": sum(stream.pending_rows for stream in self._open),
+            "streams_opened": self.opened,
+            "protocol_errors": self.protocol_errors,
+            "rows_received": self.rows_received,
+            "rows_sent": self.rows_sent,
+            "batches": self.batches,
+            "mean_batch_rows": self.batched_rows / self.batches if self.batches else 0.0,
+            # Times results were ready but the client had granted no credit
+            "credit_stalls": self.credit_stalls,
+        }
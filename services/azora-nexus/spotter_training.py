@@ -0,0 +1,348 @@
+"""
+Model training subsystem for the Azora AI Spotter.
+
+Training jobs stream a dataset from DATA_DIR in chunks, build features with
+the batch feature engine and fit the model in a separate process, so the
+serving process never blocks. The child reports progress over a queue and
+TrainingJobs records state, durations, row counts and peak memory for every
+job, persisted as JSON under DATA_DIR so any worker can answer status
+queries.
+
+IsolationForest only ever fits each tree on a small subsample, so the
+anomaly model is fitted on a bounded uniform reservoir sample of the stream
+rather than on the whole dataset. The same sample and its scores give the
+drift baseline published alongside an anomaly model (see spotter_drift).
+An anomaly job with a segment parameter, e.g. {"country": "ZA"}, fits a
+segment model (see spotter_segments) on the rows of that segment only.
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import resource
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from spotter_registry import MODEL_NAMES
+from spotter_segments import parse_segment, segment_name
+from spotter_velocity import parse_windows
+
+logger = logging.getLogger(__name__)
+
+MODEL_TYPES = tuple(MODEL_NAMES)
+
+
+@dataclass
+class TrainingJob:
+    job_id: str
+    model_type: str
+    data_source: str
+    parameters: Dict[str, Any]
+    segment: Optional[str] = None
+    status: str = "queued"
+    progress: float = 0.0
+    rows: int = 0
+    sample_rows: int = 0
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    peak_memory_mb: Optional[float] = None
+    model_path: Optional[str] = None
+    baseline_path: Optional[str] = None
+    model_version: Optional[str] = None
+    error: Optional[str] = None
+
+    def to_status(self) -> Dict[str, Any]:
+        """Status document served by /api/models/status/{job_id}"""
+        status = asdict(self)
+        end = self.finished_at or time.time()
+        status["queued_seconds"] = (self.started_at or end) - self.created_at
+        status["running_seconds"] = end - self.started_at if self.started_at else 0.0
+        status["progress"] = round(self.progress * 100, 1)
+        return status
+
+
+class Reservoir:
+    """Uniform fixed-size sample of a stream of feature rows"""
+
+    def __init__(self, capacity: int, seed: int = 42):
+        self.capacity = capacity
+        self.rng = np.random.default_rng(seed)
+        self.sample: Optional[np.ndarray] = None
+        self.filled = 0
+        self.seen = 0
+
+    def add(self, rows: np.ndarray):
+        if len(rows) == 0:
+            return
+        if self.sample is None:
+            self.sample = np.empty((self.capacity, rows.shape[1]))
+        elif rows.shape[1] != self.sample.shape[1]:
+            raise ValueError(f"Feature width changed from {self.sample.shape[1]} to {rows.shape[1]}")
+
+        take = min(self.capacity - self.filled, len(rows))
+        if take:
+            self.sample[self.filled:self.filled + take] = rows[:take]
+            self.filled += take
+        rest = rows[take:]
+        if len(rest):
+            # Row i of the stream replaces a random slot with probability k/i
+            positions = self.seen + take + np.arange(1, len(rest) + 1)
+            accepted = self.rng.random(len(rest)) < self.capacity / positions
+            slots = self.rng.integers(0, self.capacity, int(accepted.sum()))
+            self.sample[slots] = rest[accepted]
+        self.seen += len(rows)
+
+    def values(self) -> np.ndarray:
+        if self.sample is None:
+            return np.empty((0, 0))
+        return self.sample[:self.filled]
+
+
+def _peak_memory_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_training(spec: Dict[str, Any], progress: "multiprocessing.Queue"):
+    """Child-process entry point: stream, fit and save one model"""
+    import joblib
+
+    from spotter_datasets import frame_features, iter_chunks
+    from spotter_drift import build_baseline
+    from spotter_encoding import EntityEncoder
+    from spotter_explain import feature_names
+    from spotter_features import model_feature_names
+    from spotter_velocity import VelocityStore
+
+    try:
+        parameters = spec["parameters"]
+        encoder = EntityEncoder(capacity=int(parameters.get("entity_cache_size", 100000)))
+        reservoir = Reservoir(int(parameters.get("sample_rows", 100000)), seed=int(parameters.get("random_state", 42)))
+
+        # Replaying the dataset through a fresh store gives the model the
+        # velocity features it will see when serving with the same windows
+        velocity = None
+        if spec.get("velocity_windows"):
+            velocity = VelocityStore(
+                spec["velocity_windows"],
+                capacity=int(parameters.get("velocity_capacity", 1000000)),
+            )
+
+        segment = parse_segment(spec["segment"]) if spec.get("segment") else {}
+        for chunk, fraction in iter_chunks(spec["path"], int(parameters.get("chunk_rows", 50000))):
+            # Velocity counters see every row; only the segment's rows are sampled
+            _, features = frame_features(chunk, encoder, velocity)
+            if segment:
+                missing = sorted(set(segment) - set(chunk.columns))
+                if missing:
+                    raise ValueError(f"Dataset has no {', '.join(missing)} column to select segment {spec['segment']}")
+                mask = np.ones(len(chunk), dtype=bool)
+                for name, value in segment.items():
+                    mask &= chunk[name].astype(str).to_numpy() == value
+                features = features[mask]
+            reservoir.add(features)
+            progress.put({"event": "progress", "progress": fraction * 0.9, "rows": reservoir.seen})
+
+        sample = reservoir.values()
+        if len(sample) == 0:
+            raise ValueError(f"Dataset contains no rows of segment {spec['segment']}" if segment else "Dataset contains no rows")
+
+        baseline = None
+        if spec["model_type"] == "anomaly_detection":
+            from sklearn.ensemble import IsolationForest
+
+            model = IsolationForest(
+                n_estimators=int(parameters.get("n_estimators", 100)),
+                max_samples=parameters.get("max_samples", "auto"),
+                contamination=parameters.get("contamination", 0.01),
+                random_state=int(parameters.get("random_state", 42)),
+                n_jobs=parameters.get("n_jobs"),
+            )
+            model.fit(sample)
+            names = feature_names(sample.shape[1], model_feature_names(velocity))
+            baseline = build_baseline(sample, model.decision_function(sample), names)
+        else:
+            from sklearn.cluster import DBSCAN
+
+            # DBSCAN has no reusable fit; fitting the sample validates the
+            # parameters against real data before the model goes live.
+            model = DBSCAN(
+                eps=float(parameters.get("eps", 0.5)),
+                min_samples=int(parameters.get("min_samples", 5)),
+            )
+            model.fit(sample)
+            model = DBSCAN(eps=model.eps, min_samples=model.min_samples)
+
+        tmp_path = f"{spec['model_path']}.{os.getpid()}.tmp"
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, spec["model_path"])
+        baseline_path = None
+        if baseline is not None:
+            baseline_path = f"{spec['model_path']}.baseline.json"
+            with open(f"{baseline_path}.{os.getpid()}.tmp", "w") as f:
+                json.dump(baseline, f)
+            os.replace(f"{baseline_path}.{os.getpid()}.tmp", baseline_path)
+
+        progress.put({
+            "event": "completed",
+            "rows": reservoir.seen,
+            "sample_rows": len(sample),
+            "baseline_path": baseline_path,
+            "peak_memory_mb": _peak_memory_mb(),
+        })
+    except Exception as e:
+        progress.put({"event": "failed", "error": f"{type(e).__name__}: {e}", "peak_memory_mb": _peak_memory_mb()})
+
+
+class TrainingJobs:
+    """Registry and runner of training jobs"""
+
+    def __init__(
+        self, jobs_dir: str, model_dir: str, max_concurrent: int = 1, velocity_windows: Sequence[float] = ()
+    ):
+        self.jobs_dir = jobs_dir
+        self.model_dir = model_dir
+        self.velocity_windows = list(velocity_windows)
+        self.jobs: Dict[str, TrainingJob] = {}
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._tasks = set()
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, data_dir: str, model_dir: str) -> "TrainingJobs":
+        return cls(
+            jobs_dir=os.path.join(data_dir, "training_jobs"),
+            model_dir=model_dir,
+            max_concurrent=int(os.environ.get("SPOTTER_TRAINING_CONCURRENCY", "1")),
+            velocity_windows=parse_windows(os.environ.get("SPOTTER_VELOCITY_WINDOWS", "")),
+        )
+
+    def save(self, job: TrainingJob):
+        path = os.path.join(self.jobs_dir, f"{job.job_id}.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(asdict(job), f, default=str)
+        os.replace(f"{path}.tmp", path)
+
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+        """A job from this process, or from the shared job directory"""
+        if job_id in self.jobs:
+            return self.jobs[job_id]
+        path = os.path.join(self.jobs_dir, f"{os.path.basename(job_id)}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return TrainingJob(**json.load(f))
+
+    def submit(
+        self,
+        model_type: str,
+        data_source: str,
+        dataset_path: str,
+        parameters: Dict[str, Any],
+        on_complete: Callable[[TrainingJob], Awaitable[None]],
+    ) -> TrainingJob:
+        """Register a job and start it in the background"""
+        if model_type not in MODEL_TYPES:
+            raise ValueError(f"Unknown model type '{model_type}', expected one of {MODEL_TYPES}")
+        segment = None
+        if parameters.get("segment") is not None:
+            if model_type != "anomaly_detection" or not isinstance(parameters["segment"], dict):
+                raise ValueError("segment must be an object of field values on an anomaly_detection job")
+            segment = segment_name(parameters["segment"])
+        job = TrainingJob(
+            job_id=f"training-{int(time.time())}-{uuid.uuid4().hex[:8]}",
+            model_type=model_type,
+            data_source=data_source,
+            parameters=parameters,
+            segment=segment,
+        )
+        self.jobs[job.job_id] = job
+        self.save(job)
+
+        task = asyncio.create_task(self._run(job, dataset_path, on_complete))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: TrainingJob, dataset_path: str, on_complete):
+        async with self._slots:
+            job.status = "running"
+            job.started_at = time.time()
+            self.save(job)
+
+            spec = {
+                "model_type": job.model_type,
+                "path": dataset_path,
+                "parameters": job.parameters,
+                # Staging artifact, published to the model registry on completion
+                "model_path": os.path.join(self.model_dir, f".{MODEL_NAMES[job.model_type]}.{job.job_id}.joblib"),
+                "velocity_windows": self._velocity_windows(job),
+                "segment": job.segment,
+            }
+
+            context = multiprocessing.get_context("spawn")
+            progress = context.Queue()
+            process = context.Process(target=run_training, args=(spec, progress), name=f"spotter-{job.job_id}")
+            process.start()
+            logger.info(f"Started training job {job.job_id} (pid {process.pid})")
+
+            result = await self._follow(job, process, progress)
+            await asyncio.to_thread(process.join)
+
+            job.finished_at = time.time()
+            job.peak_memory_mb = result.get("peak_memory_mb")
+            if result.get("event") == "completed":
+                job.rows = result["rows"]
+                job.sample_rows = result["sample_rows"]
+                job.progress = 1.0
+                job.model_path = spec["model_path"]
+                job.baseline_path = result.get("baseline_path")
+                job.status = "completed"
+                logger.info(f"Completed training job {job.job_id}: {job.rows} rows")
+            else:
+                job.status = "failed"
+                job.error = result.get("error") or f"Training process exited with code {process.exitcode}"
+                logger.error(f"Training job {job.job_id} failed: {job.error}")
+            self.save(job)
+
+        if job.status == "completed":
+            try:
+                await on_complete(job)
+            except Exception as e:
+                logger.error(f"Error activating model from training job {job.job_id}: {e}")
+
+    def _velocity_windows(self, job: TrainingJob) -> List[float]:
+        """Velocity windows of an anomaly training job: its velocity_windows parameter, else the serving ones"""
+        if job.model_type != "anomaly_detection":
+            return []
+        windows = job.parameters.get("velocity_windows", self.velocity_windows)
+        if isinstance(windows, str):
+            return parse_windows(windows)
+        return [float(window) for window in windows]
+
+    async def _follow(self, job: TrainingJob, process, progress) -> Dict[str, Any]:
+        """Apply progress messages until the child reports a result or dies"""
+        while True:
+            try:
+                message = await asyncio.to_thread(progress.get, True, 0.5)
+            except queue.Empty:
+                if process.is_alive():
+                    continue
+                try:
+                    message = progress.get_nowait()
+                except queue.Empty:
+                    return {"event": "failed"}
+
+            if message["event"] != "progress":
+                return message
+            job.progress = message["progress"]
+            job.rows = message["rows"]
+            self.save(job)
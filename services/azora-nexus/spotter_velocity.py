@@ -0,0 +1,387 @@
+"""
+Per-entity velocity features for the Azora AI Spotter.
+
+extract_features only sees the current transaction. VelocityStore keeps
+exponentially decaying counters per sender, recipient and country, so the
+model can also see behaviour such as "this sender made 40 payments in the
+last 5 minutes". For every window w (seconds) and entity it holds a decayed
+transaction count, a decayed amount sum and a decayed count of new
+counterparties, each event weighted by exp(-age / w). That approximates a
+rolling window of length w while needing only the last value and its time,
+so updating an entity is O(1).
+
+Batches are processed in bulk: events are grouped per entity, ordered by
+time and summed with one cumulative log-add-exp pass per window, the stored
+state of each entity entering as a weighted event at its last update time.
+Timestamps are event time, so replaying a dataset in training produces the
+same features as live traffic. Entities idle for longer than idle_seconds,
+or the least recently active ones once a table is full, are evicted, and
+the whole state is snapshotted to DATA_DIR and reloaded at startup.
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from spotter_features import TransactionColumns
+
+logger = logging.getLogger(__name__)
+
+VELOCITY_KINDS = ("sender", "recipient", "country")
+
+# Decayed quantities kept per entity and window
+_COUNT, _AMOUNT, _DISTINCT = range(3)
+
+# Gap (in log space) that keeps earlier entities out of a group's sums
+_GROUP_MARGIN = 100.0
+
+
+def parse_windows(value: str) -> List[float]:
+    """Window lengths in seconds from a comma-separated list"""
+    return [float(part) for part in value.split(",") if part.strip()]
+
+
+def window_label(seconds: float) -> str:
+    if seconds % 3600 == 0:
+        return f"{int(seconds // 3600)}h"
+    if seconds % 60 == 0:
+        return f"{int(seconds // 60)}m"
+    return f"{seconds:g}s"
+
+
+def epoch_seconds(timestamps: np.ndarray) -> np.ndarray:
+    """Unix time of an array of ISO-8601 strings (naive times are UTC)"""
+    try:
+        return np.char.rstrip(timestamps.astype(str), "Z").astype("datetime64[ms]").astype(np.int64) / 1000.0
+    except ValueError:
+        pass
+    seconds = np.empty(len(timestamps), dtype=np.float64)
+    for i, value in enumerate(timestamps.tolist()):
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        seconds[i] = parsed.timestamp()
+    return seconds
+
+
+def _decayed_sums(groups: np.ndarray, times: np.ndarray, weights: np.ndarray, windows: np.ndarray) -> np.ndarray:
+    """For events sorted by (group, time), sum w_j * exp(-(t_i - t_j) / window) over earlier events j of the group.
+
+    weights is (events, quantities, windows); so is the result. Each group is
+    pushed _GROUP_MARGIN beyond the span of the previous ones in log space, so
+    one accumulate call serves all groups without overflow.
+    """
+    sums = np.empty_like(weights)
+    if not len(times):
+        return sums
+    relative = times - times.min()
+    span = relative.max()
+    with np.errstate(divide="ignore"):
+        log_weights = np.log(weights)
+    for k, window in enumerate(windows.tolist()):
+        position = relative / window + groups * (span / window + _GROUP_MARGIN)
+        totals = np.logaddexp.accumulate(position[:, None] + log_weights[:, :, k], axis=0)
+        sums[:, :, k] = np.exp(totals - position[:, None])
+    return sums
+
+
+class _EntityTable:
+    """Slots of decayed state for one kind of key, with LRU and idle eviction"""
+
+    def __init__(self, capacity: int, state_shape: Tuple[int, ...]):
+        self.capacity = capacity
+        self.state_shape = state_shape
+        self.slots: Dict[str, int] = {}
+        self.keys: List[Optional[str]] = []
+        self.free: List[int] = []
+        self.last = np.empty(0, dtype=np.float64)
+        self.state = np.empty((0,) + state_shape, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def lookup(self, keys: Sequence[str]) -> np.ndarray:
+        get = self.slots.get
+        return np.fromiter((get(key, -1) for key in keys), dtype=np.intp, count=len(keys))
+
+    def allocate(self, keys: Sequence[str], protected: Optional[np.ndarray] = None) -> np.ndarray:
+        """Slots for keys not yet in the table, evicting the least recently active if full.
+
+        Slots in protected (those the caller still holds for its batch) are
+        never evicted, so they cannot be handed to a new key.
+        """
+        overflow = len(self.slots) + len(keys) - self.capacity
+        if overflow > 0:
+            self.evict_oldest(max(overflow, self.capacity // 10), protected)
+
+        reused = min(len(self.free), len(keys))
+        slots = [self.free.pop() for _ in range(reused)]
+        grow = len(keys) - reused
+        if grow:
+            start = len(self.keys)
+            size = max(start + grow, min(2 * len(self.keys), self.capacity))
+            self.last = np.resize(self.last, size)
+            self.state = np.resize(self.state, (size,) + self.state_shape)
+            self.free.extend(range(size - 1, start + grow - 1, -1))
+            self.keys.extend([None] * (size - start))
+            slots.extend(range(start, start + grow))
+
+        for key, slot in zip(keys, slots):
+            self.slots[key] = slot
+            self.keys[slot] = key
+        slots = np.array(slots, dtype=np.intp)
+        self.state[slots] = 0.0
+        return slots
+
+    def _release(self, slots: np.ndarray):
+        for slot in slots.tolist():
+            del self.slots[self.keys[slot]]
+            self.keys[slot] = None
+            self.free.append(slot)
+
+    def _used(self) -> np.ndarray:
+        return np.fromiter(self.slots.values(), dtype=np.intp, count=len(self.slots))
+
+    def evict_idle(self, before: float) -> int:
+        used = self._used()
+        idle = used[self.last[used] < before]
+        self._release(idle)
+        return len(idle)
+
+    def evict_oldest(self, count: int, protected: Optional[np.ndarray] = None):
+        used = self._used()
+        if protected is not None and len(protected):
+            used = used[~np.isin(used, protected)]
+        if count >= len(used):
+            self._release(used)
+        elif count > 0:
+            self._release(used[np.argpartition(self.last[used], count)[:count]])
+
+    def snapshot(self, prefix: str) -> Dict[str, np.ndarray]:
+        used = self._used()
+        return {
+            f"{prefix}_keys": np.array([self.keys[slot] for slot in used.tolist()], dtype=str),
+            f"{prefix}_last": self.last[used],
+            f"{prefix}_state": self.state[used],
+        }
+
+    def restore(self, keys: List[str], last: np.ndarray, state: np.ndarray):
+        keep = slice(max(0, len(keys) - self.capacity), None)
+        slots = self.allocate(keys[keep])
+        self.last[slots] = last[keep]
+        self.state[slots] = state[keep]
+
+
+class VelocityStore:
+    """Decayed per-entity counters and the velocity features built from them"""
+
+    def __init__(
+        self,
+        windows: Sequence[float],
+        capacity: int = 100000,
+        idle_seconds: Optional[float] = None,
+        snapshot_path: Optional[str] = None,
+    ):
+        if not windows or min(windows) <= 0:
+            raise ValueError("Velocity windows must be positive")
+        self.windows = np.array(sorted(windows), dtype=np.float64)
+        self.capacity = capacity
+        self.idle_seconds = idle_seconds if idle_seconds is not None else 10 * float(self.windows.max())
+        self.snapshot_path = snapshot_path
+        state_shape = (3, len(self.windows))
+        self._tables = {kind: _EntityTable(capacity, state_shape) for kind in VELOCITY_KINDS}
+        # Last time each sender -> recipient pair was seen, for new-counterparty counts
+        self._pairs = _EntityTable(capacity, ())
+        # Latest event time seen; drives idle eviction
+        self.clock = -np.inf
+        self._last_sweep = -np.inf
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, data_dir: str) -> Optional["VelocityStore"]:
+        """The configured store, or None when SPOTTER_VELOCITY_WINDOWS is empty"""
+        windows = parse_windows(os.environ.get("SPOTTER_VELOCITY_WINDOWS", ""))
+        if not windows:
+            return None
+        idle = os.environ.get("SPOTTER_VELOCITY_IDLE_SECONDS")
+        return cls(
+            windows=windows,
+            capacity=int(os.environ.get("SPOTTER_VELOCITY_CAPACITY", "100000")),
+            idle_seconds=float(idle) if idle else None,
+            snapshot_path=os.path.join(data_dir, "velocity_state.npz"),
+        )
+
+    @property
+    def feature_names(self) -> List[str]:
+        names = []
+        for window in self.windows.tolist():
+            label = window_label(window)
+            names.extend([
+                f"sender_count_{label}",
+                f"sender_amount_{label}",
+                f"sender_recipients_{label}",
+                f"recipient_count_{label}",
+                f"recipient_senders_{label}",
+                f"country_count_{label}",
+            ])
+        return names
+
+    def update(self, columns: TransactionColumns, commit: bool = True) -> np.ndarray:
+        """(rows, len(feature_names)) velocity features of a batch.
+
+        Each row's counters include the row itself and every earlier event of
+        the same entity. With commit=False the stored state is only read,
+        e.g. to recompute features of transactions already counted.
+        """
+        n = len(columns)
+        if n == 0:
+            return np.empty((0, len(self.feature_names)), dtype=np.float64)
+        times = epoch_seconds(columns.timestamp)
+        amounts = np.maximum(np.nan_to_num(columns.amount), 0.0)
+
+        with self._lock:
+            new_pairs = self._new_pairs(columns.sender, columns.recipient, times, commit)
+            weights = np.empty((n, 3, len(self.windows)), dtype=np.float64)
+            weights[:, _COUNT] = 1.0
+            weights[:, _AMOUNT] = amounts[:, None]
+            weights[:, _DISTINCT] = new_pairs
+            sender = self._accumulate("sender", columns.sender, times, weights, commit)
+            recipient = self._accumulate("recipient", columns.recipient, times, weights, commit)
+            weights[:, _DISTINCT] = 0.0
+            country = self._accumulate("country", columns.country, times, weights, commit)
+            if commit:
+                self.clock = max(self.clock, float(times.max()))
+                if self.clock - self._last_sweep >= self.windows.min():
+                    self._sweep()
+
+        columns_out = []
+        for k in range(len(self.windows)):
+            columns_out.extend([
+                sender[:, _COUNT, k],
+                sender[:, _AMOUNT, k],
+                sender[:, _DISTINCT, k],
+                recipient[:, _COUNT, k],
+                recipient[:, _DISTINCT, k],
+                country[:, _COUNT, k],
+            ])
+        return np.column_stack(columns_out)
+
+    def _new_pairs(self, senders: np.ndarray, recipients: np.ndarray, times: np.ndarray, commit: bool) -> np.ndarray:
+        """(rows, windows) whether each row's pair was unseen for longer than the window"""
+        keys = np.array([f"{s}\x1f{r}" for s, r in zip(senders.tolist(), recipients.tolist())], dtype=object)
+        unique, inverse = np.unique(keys, return_inverse=True)
+        slots = self._pairs.lookup(unique.tolist())
+        known = slots >= 0
+        prior = np.full(len(unique), -np.inf)
+        prior[known] = self._pairs.last[slots[known]]
+
+        order = np.lexsort((times, inverse))
+        ordered_groups = inverse[order]
+        ordered_times = times[order]
+        first = np.r_[True, ordered_groups[1:] != ordered_groups[:-1]]
+        previous = np.r_[-np.inf, ordered_times[:-1]]
+        previous[first] = prior[ordered_groups[first]]
+        new = np.empty((len(times), len(self.windows)), dtype=np.float64)
+        new[order] = (ordered_times - previous)[:, None] > self.windows[None, :]
+
+        if commit:
+            latest = np.full(len(unique), -np.inf)
+            np.maximum.at(latest, inverse, times)
+            missing = np.flatnonzero(slots < 0)
+            slots[missing] = self._pairs.allocate(unique[missing].tolist(), protected=slots[slots >= 0])
+            self._pairs.last[slots] = np.maximum(prior, latest)
+        return new
+
+    def _accumulate(
+        self, kind: str, values: np.ndarray, times: np.ndarray, weights: np.ndarray, commit: bool
+    ) -> np.ndarray:
+        """(rows, 3, windows) decayed sums of one entity kind, updating its table"""
+        table = self._tables[kind]
+        unique, inverse = np.unique(values.astype(str), return_inverse=True)
+        slots = table.lookup(unique.tolist())
+        known = np.flatnonzero(slots >= 0)
+
+        # Stored state enters as one weighted event at its last update time,
+        # ordered before batch events at the same instant
+        groups = np.concatenate([known, inverse])
+        event_times = np.concatenate([table.last[slots[known]], times])
+        event_weights = np.concatenate([table.state[slots[known]], weights])
+        from_batch = np.r_[np.zeros(len(known)), np.ones(len(times))]
+        order = np.lexsort((from_batch, event_times, groups))
+
+        ordered_groups = groups[order]
+        sums = _decayed_sums(ordered_groups, event_times[order], event_weights[order], self.windows)
+        result = np.empty_like(sums)
+        result[order] = sums
+
+        if commit:
+            final = np.r_[ordered_groups[1:] != ordered_groups[:-1], True]
+            final_groups = ordered_groups[final]
+            missing = np.flatnonzero(slots < 0)
+            slots[missing] = table.allocate(unique[missing].tolist(), protected=slots[known])
+            table.state[slots[final_groups]] = sums[final]
+            table.last[slots[final_groups]] = event_times[order][final]
+        return result[len(known):]
+
+    def _sweep(self):
+        """Drop entities idle past idle_seconds and pairs older than every window"""
+        self._last_sweep = self.clock
+        evicted = sum(table.evict_idle(self.clock - self.idle_seconds) for table in self._tables.values())
+        self._pairs.evict_idle(self.clock - float(self.windows.max()))
+        if evicted:
+            logger.debug(f"Evicted {evicted} idle velocity entities")
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "windows": self.windows.tolist(),
+            "features": self.feature_names,
+            "capacity": self.capacity,
+            "idle_seconds": self.idle_seconds,
+            "clock": self.clock if np.isfinite(self.clock) else None,
+            "entities": {kind: len(table) for kind, table in self._tables.items()},
+            "pairs": len(self._pairs),
+        }
+
+    def snapshot(self):
+        """Write the state of every entity to snapshot_path atomically"""
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            arrays = {"windows": self.windows, "clock": np.array(self.clock)}
+            for kind, table in self._tables.items():
+                arrays.update(table.snapshot(kind))
+            arrays.update(self._pairs.snapshot("pairs"))
+
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, self.snapshot_path)
+        logger.info(f"Saved velocity state snapshot to {self.snapshot_path}")
+
+    def load(self) -> bool:
+        """Restore the state from snapshot_path; returns False if there is none"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with np.load(self.snapshot_path) as snapshot:
+                if not np.array_equal(snapshot["windows"], self.windows):
+                    logger.warning("Velocity snapshot was taken with other windows, starting empty")
+                    return False
+                with self._lock:
+                    for kind, table in self._tables.items():
+                        table.restore(
+                            snapshot[f"{kind}_keys"].tolist(), snapshot[f"{kind}_last"], snapshot[f"{kind}_state"]
+                        )
+                    self._pairs.restore(
+                        snapshot["pairs_keys"].tolist(), snapshot["pairs_last"], snapshot["pairs_state"]
+                    )
+                    self.clock = float(snapshot["clock"])
+        except Exception as e:
+            logger.error(f"Failed to load velocity state snapshot: {e}")
+            return False
+        logger.info(f"Loaded velocity state snapshot from {self.snapshot_path}")
+        return True
@@ -0,0 +1,101 @@
+"""Compliance shipping while the compliance service is down, back, or hanging"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from spotter_compliance import ComplianceShipper
+
+
+class Service(httpx.AsyncBaseTransport):
+    """Compliance service stub recording the events it accepted"""
+
+    def __init__(self):
+        self.up = False
+        self.events = []
+
+    async def handle_async_request(self, request):
+        if not self.up:
+            raise httpx.ConnectError("connection refused", request=request)
+        self.events.extend(json.loads(request.content)["events"])
+        return httpx.Response(200)
+
+
+class HangingConnect(httpx.AsyncBaseTransport):
+    """Never connects, and reports a cancel as a connection error"""
+
+    async def handle_async_request(self, request):
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            raise httpx.ConnectError("connect cancelled", request=request)
+
+
+def spooled_events(spool_dir):
+    events = []
+    for name in sorted(os.listdir(spool_dir)):
+        assert name.endswith(".ndjson"), name
+        with open(os.path.join(spool_dir, name)) as f:
+            events.extend(json.loads(line) for line in f)
+    return events
+
+
+def test_spooled_events_are_replayed_once_the_service_is_back(tmp_path):
+    service = Service()
+
+    async def run():
+        shipper = ComplianceShipper("http://compliance", str(tmp_path), flush_interval=0.05,
+                                    max_retries=1, backoff=0.01, transport=service)
+        shipper.start()
+        for index in range(3):
+            shipper.submit("score", {"index": index})
+        await asyncio.sleep(0.3)
+        assert [event["data"]["index"] for event in spooled_events(tmp_path)] == [0, 1, 2]
+
+        service.up = True
+        shipper.submit("score", {"index": 3})
+        await asyncio.sleep(0.3)
+        await shipper.stop(timeout=1.0)
+        return shipper
+
+    shipper = asyncio.run(run())
+    assert sorted(event["data"]["index"] for event in service.events) == [0, 1, 2, 3]
+    assert os.listdir(tmp_path) == []
+    assert shipper.replayed == 3
+
+
+def test_stop_while_the_service_is_down_spools_pending_events(tmp_path):
+    async def run():
+        shipper = ComplianceShipper("http://compliance", str(tmp_path), flush_interval=10.0,
+                                    max_retries=5, backoff=1.0, transport=Service())
+        shipper.start()
+        for index in range(5):
+            shipper.submit("score", {"index": index})
+        await asyncio.sleep(0.05)
+        start = time.monotonic()
+        await shipper.stop(timeout=0.5)
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) < 1.0
+    assert sorted(event["data"]["index"] for event in spooled_events(tmp_path)) == [0, 1, 2, 3, 4]
+
+
+def test_stop_returns_when_a_cancelled_connect_is_reported_as_an_error(tmp_path):
+    async def run():
+        shipper = ComplianceShipper("http://compliance", str(tmp_path), flush_interval=0.01,
+                                    max_retries=0, transport=HangingConnect())
+        shipper.start()
+        shipper.submit("score", {"index": 0})
+        await asyncio.sleep(0.1)
+        start = time.monotonic()
+        await asyncio.wait_for(shipper.stop(timeout=0.5), 5.0)
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) < 1.5
+    assert [event["data"]["index"] for event in spooled_events(tmp_path)] == [0]
@@ -0,0 +1,48 @@
+"""Velocity store behaviour when its entity tables are full"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from spotter_features import TransactionColumns
+from spotter_velocity import VelocityStore
+
+
+def columns(senders, recipients, timestamp):
+    n = len(senders)
+    return TransactionColumns(
+        ids=[f"tx-{i}" for i in range(n)],
+        amount=np.full(n, 10.0),
+        timestamp=np.array([timestamp] * n),
+        sender=np.array(senders, dtype=object),
+        recipient=np.array(recipients, dtype=object),
+        currency=np.array(["ZAR"] * n, dtype=object),
+        country=np.array(["ZA"] * n, dtype=object),
+        category=[None] * n,
+        overrides=[None] * n,
+    )
+
+
+def test_new_key_in_full_table_starts_from_zero():
+    store = VelocityStore([3600], capacity=3)
+    names = store.feature_names
+    sender_count = names.index("sender_count_1h")
+    sender_recipients = names.index("sender_recipients_1h")
+    store.update(columns(["A", "B", "C"], ["X", "Y", "Z"], "2025-10-01T10:00:00Z"))
+
+    # "A" is the oldest entry; the new sender "0" must not take over its slot
+    features = store.update(columns(["A", "0"], ["X", "W"], "2025-10-01T10:00:01Z"))
+    assert np.isclose(features[0, sender_count], 2.0, atol=0.01)
+    assert np.isclose(features[1, sender_count], 1.0)
+    assert np.isclose(features[1, sender_recipients], 1.0)
+
+    table = store._tables["sender"]
+    assert table.slots["A"] != table.slots["0"]
+    assert len(set(table.slots.values())) == len(table.slots)
+    # Both kept their own counters
+    features = store.update(columns(["A", "0"], ["X", "W"], "2025-10-01T10:00:02Z"), commit=False)
+    assert np.isclose(features[0, sender_count], 3.0, atol=0.01)
+    assert np.isclose(features[1, sender_count], 2.0, atol=0.01)